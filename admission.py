@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Admission control for the HTTP server
+Caps concurrent SSE sessions, in-flight tool calls (with a bounded wait queue),
+the request rate per client and the size of request bodies, rejecting what is
+over the limit right away with 413/429/503 (and a Retry-After hint when waiting helps)
+"""
+
+import asyncio
+import json
+import math
+import threading
+import time
+from collections import deque
+
+from starlette.responses import PlainTextResponse
+
+from context_store import _env_number
+
+# Limits per server process; 0 disables a limit. Each can be overridden with the
+# environment variable named in the comment
+DEFAULT_MAX_SESSIONS = 1000      # MCP_MAX_SESSIONS: open SSE sessions
+DEFAULT_MAX_TOOL_CALLS = 64      # MCP_MAX_TOOL_CALLS: tool calls running at once
+DEFAULT_QUEUE_SIZE = 256         # MCP_QUEUE_SIZE: tool calls waiting for a slot
+DEFAULT_QUEUE_TIMEOUT = 10.0     # MCP_QUEUE_TIMEOUT: seconds a tool call may wait
+DEFAULT_RATE_LIMIT = 0.0         # MCP_RATE_LIMIT: requests per second per client
+DEFAULT_MAX_BODY_BYTES = 1 << 20  # MCP_MAX_BODY_BYTES: size of a POSTed message
+# MCP_RATE_BURST: requests a client may send at once (default: twice the rate)
+
+# Retry-After (seconds) sent when the server is full rather than the client too fast
+BUSY_RETRY_AFTER = 1
+
+# Idle clients are forgotten once this many are tracked
+MAX_TRACKED_CLIENTS = 10000
+
+# Scope key under which an admitted tool call's slot travels to call_tool
+SLOT_KEY = "mcp.admission_slot"
+
+
+class Rejected(Exception):
+    """
+    A request over a limit: answer with `status` and, unless `retry_after` is None
+    (retrying the same request cannot succeed), a Retry-After of that many seconds
+    """
+
+    def __init__(self, status: int, reason: str, retry_after: float | None = None):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after)) if retry_after is not None else None
+
+
+class Slot:
+    """
+    One in-flight tool call. Released exactly once: by the server's tool call
+    handler when the call ends, or by the middleware when the request is answered
+    without reaching it. Dropping an unreleased slot (a message lost with its
+    session) releases it as a last resort.
+    """
+    __slots__ = ("_admission", "_loop")
+
+    def __init__(self, admission: "Admission", loop):
+        self._admission = admission
+        self._loop = loop
+
+    def release(self):
+        admission, self._admission = self._admission, None
+        if admission is None:
+            return
+        if self._loop is None or self._loop.is_closed():
+            admission._release()
+        else:
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is self._loop:
+                admission._release()
+            else:
+                self._loop.call_soon_threadsafe(admission._release)
+
+    def __del__(self):
+        self.release()
+
+
+class Admission:
+    """
+    The limits and their current usage. Tool call slots are handed to waiters in
+    arrival order; a waiter that cannot join the queue (full) or is not served
+    within `queue_timeout` is rejected with 503. Sessions are never queued, as
+    they are held for as long as the client stays connected.
+    """
+
+    def __init__(self, max_sessions: int | None = None, max_tool_calls: int | None = None,
+                 queue_size: int | None = None, queue_timeout: float | None = None,
+                 rate: float | None = None, burst: float | None = None,
+                 max_body_bytes: int | None = None):
+        self.max_sessions = max_sessions if max_sessions is not None else \
+            _env_number("MCP_MAX_SESSIONS", DEFAULT_MAX_SESSIONS, int)
+        self.max_tool_calls = max_tool_calls if max_tool_calls is not None else \
+            _env_number("MCP_MAX_TOOL_CALLS", DEFAULT_MAX_TOOL_CALLS, int)
+        self.queue_size = queue_size if queue_size is not None else \
+            _env_number("MCP_QUEUE_SIZE", DEFAULT_QUEUE_SIZE, int)
+        self.queue_timeout = queue_timeout if queue_timeout is not None else \
+            _env_number("MCP_QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT, float)
+        self.rate = rate if rate is not None else \
+            _env_number("MCP_RATE_LIMIT", DEFAULT_RATE_LIMIT, float)
+        self.burst = burst if burst is not None else \
+            _env_number("MCP_RATE_BURST", max(1.0, 2 * self.rate), float)
+        self.max_body_bytes = max_body_bytes if max_body_bytes is not None else \
+            _env_number("MCP_MAX_BODY_BYTES", DEFAULT_MAX_BODY_BYTES, int)
+
+        self.sessions = 0
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._lock = threading.Lock()
+        # Per client: [tokens, last refill]
+        self._buckets: dict[str, list] = {}
+        self.rejected: dict[str, int] = {"sessions": 0, "rate": 0, "queue_full": 0, "queue_timeout": 0,
+                                         "body_size": 0, "batch": 0}
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _reject(self, status: int, reason: str, retry_after: float | None = None):
+        self.rejected[reason] += 1
+        raise Rejected(status, reason, retry_after)
+
+    # ----------------------------------------------------------------- sessions
+
+    def open_session(self):
+        if self.max_sessions > 0 and self.sessions >= self.max_sessions:
+            self._reject(503, "sessions", BUSY_RETRY_AFTER)
+        self.sessions += 1
+
+    def close_session(self):
+        self.sessions -= 1
+
+    # -------------------------------------------------------------------- body
+
+    def check_body(self, size: int):
+        """Reject a request body of `size` bytes when it is over max_body_bytes"""
+        if self.max_body_bytes > 0 and size > self.max_body_bytes:
+            self._reject(413, "body_size")
+
+    # --------------------------------------------------------------------- rate
+
+    def check_rate(self, client: str, now: float | None = None):
+        """Take one token from the client's bucket, or reject with the wait until the next one"""
+        if self.rate <= 0:
+            return
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_CLIENTS:
+                self._forget_idle(now)
+            bucket = self._buckets[client] = [self.burst, now]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            self._reject(429, "rate", (1 - tokens) / self.rate)
+        bucket[0] = tokens - 1
+
+    def _forget_idle(self, now: float):
+        """Drop clients whose bucket has refilled (they are indistinguishable from new ones)"""
+        for client, (tokens, last) in list(self._buckets.items()):
+            if tokens + (now - last) * self.rate >= self.burst:
+                del self._buckets[client]
+
+    # --------------------------------------------------------------- tool calls
+
+    async def acquire(self) -> Slot | None:
+        """Wait (in the bounded queue) for a tool call slot; None when calls are unlimited"""
+        if self.max_tool_calls <= 0:
+            return None
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.in_flight < self.max_tool_calls and not self._waiters:
+                self.in_flight += 1
+                return Slot(self, loop)
+            if len(self._waiters) >= self.queue_size:
+                self._reject(503, "queue_full", BUSY_RETRY_AFTER)
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+        try:
+            done, _ = await asyncio.wait({waiter}, timeout=self.queue_timeout)
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        if not done:
+            self._abandon(waiter)
+            self._reject(503, "queue_timeout", BUSY_RETRY_AFTER)
+        # The slot was handed over by _release()
+        return Slot(self, loop)
+
+    def _abandon(self, waiter: asyncio.Future):
+        with self._lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                waiter.cancel()
+                return
+        if waiter.done() and not waiter.cancelled():
+            # Handed a slot just as we gave up: pass it on
+            self._release()
+
+    def _release(self):
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+            self.in_flight -= 1
+
+
+def release_slot(scope: dict | None):
+    """Release the tool call slot admitted with a request, if it still holds one"""
+    slot = scope.pop(SLOT_KEY, None) if scope is not None else None
+    if slot is not None:
+        slot.release()
+
+
+def tool_calls(body: bytes) -> int:
+    """Number of tool calls in a JSON-RPC message (or batch)"""
+    try:
+        message = json.loads(body)
+    except ValueError:
+        return 0
+    messages = message if isinstance(message, list) else [message]
+    return sum(1 for item in messages if isinstance(item, dict) and item.get("method") == "tools/call")
+
+
+def _content_length(scope) -> int | None:
+    for name, value in scope.get("headers", []):
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying an Admission's limits ahead of the MCP endpoints.
+
+    Every request to a session or message path counts against its client's rate.
+    A GET on a session path holds a session until it ends. A POSTed body is read
+    up to max_body_bytes; one carrying a tool call waits for a tool call slot,
+    which travels with the request scope to the tool call handler: the SSE
+    transport answers 202 and runs the call afterwards, so the slot is released
+    when the call finishes rather than with the POST.
+
+    POSTs for which `relayed(scope)` is true are handed to another worker (the
+    SSE session relay), whose own middleware (with `limit_rate=False`, as the
+    rate was charged here) holds the slot while the call runs there.
+    """
+
+    def __init__(self, app, admission: Admission, session_paths=("/sse",),
+                 message_prefixes=("/messages", "/mcp"), relayed=None, limit_rate: bool = True):
+        self.app = app
+        self.admission = admission
+        self.session_paths = frozenset(session_paths)
+        self.message_prefixes = tuple(message_prefixes)
+        self.relayed = relayed
+        self.limit_rate = limit_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        path = scope["path"]
+        is_session = path in self.session_paths
+        if not is_session and not path.startswith(self.message_prefixes):
+            return await self.app(scope, receive, send)
+
+        admission = self.admission
+        try:
+            if self.limit_rate:
+                admission.check_rate(scope["client"][0] if scope.get("client") else "")
+            if is_session and scope["method"] == "GET":
+                admission.open_session()
+        except Rejected as e:
+            return await self._reject(e, scope, receive, send)
+
+        if is_session:
+            if scope["method"] != "GET":
+                return await self.app(scope, receive, send)
+            try:
+                return await self.app(scope, receive, send)
+            finally:
+                admission.close_session()
+
+        if scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        try:
+            declared = _content_length(scope)
+            if declared is not None:
+                admission.check_body(declared)
+            body, more = b"", True
+            while more:
+                message = await receive()
+                if message["type"] != "http.request":
+                    break
+                body += message.get("body", b"")
+                admission.check_body(len(body))
+                more = message.get("more_body", False)
+        except Rejected as e:
+            return await self._reject(e, scope, receive, send)
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        if self.relayed is not None and self.relayed(scope):
+            return await self.app(scope, replay, send)
+        calls = tool_calls(body)
+        if not calls:
+            return await self.app(scope, replay, send)
+        try:
+            if calls > 1:
+                # One slot per request: a batch would run several calls on it
+                admission._reject(400, "batch")
+            slot = await admission.acquire()
+        except Rejected as e:
+            return await self._reject(e, scope, receive, send)
+        if slot is None:
+            return await self.app(scope, replay, send)
+
+        status = None
+
+        async def watch_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        scope[SLOT_KEY] = slot
+        del slot
+        try:
+            await self.app(scope, replay, watch_status)
+        finally:
+            if status != 202:
+                # Answered (or failed) within the request: the call is over either way
+                release_slot(scope)
+
+    @staticmethod
+    async def _reject(error: Rejected, scope, receive, send):
+        messages = {400: "Batched tool calls are not supported", 413: "Request body too large",
+                    429: "Too many requests", 503: "Server busy"}
+        text, headers = messages[error.status], {}
+        if error.retry_after is not None:
+            text += f", retry in {error.retry_after} s"
+            headers["Retry-After"] = str(error.retry_after)
+        response = PlainTextResponse(text, status_code=error.status, headers=headers)
+        await response(scope, receive, send)
@@ -0,0 +1,129 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from context_store import _env_number
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# SQLite file holding cached answers (AGENT_CACHE_PATH)
+DEFAULT_PATH = ROOT / ".answer_cache.sqlite3"
+
+# Seconds an answer may be reused (AGENT_CACHE_TTL, 0 disables the cache)
+DEFAULT_TTL = 7 * 24 * 3600
+
+# Total size of cached answers; least recently used are evicted beyond it
+# (AGENT_CACHE_MAX_BYTES, 0 disables the cache)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def answer_key(model, system, prompt):
+    """
+    Cache key for one question. The system context is part of it, so editing any
+    document it was built from makes the old answer unreachable.
+    """
+    context_hash = hashlib.sha256(system.encode("utf-8")).hexdigest()
+    prompt = " ".join(prompt.split())
+    return hashlib.sha256(f"{model}\0{context_hash}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    Model answers on disk, bounded by age and total size. Safe to share between
+    threads and between processes (SQLite in WAL mode).
+    """
+
+    def __init__(self, path=DEFAULT_PATH, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT NOT NULL, "
+                         "size INTEGER NOT NULL, created REAL NOT NULL, used REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_used ON answers (used)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT answer, created FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                db.execute("DELETE FROM answers WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            db.execute("UPDATE answers SET used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, answer):
+        now = time.time()
+        size = len(answer.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?)",
+                           (key, answer, size, now, now))
+                db.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,))
+                self._evict(db)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def _evict(self, db):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM answers").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        doomed = []
+        for key, size in db.execute("SELECT key, size FROM answers ORDER BY used"):
+            doomed.append((key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        db.executemany("DELETE FROM answers WHERE key = ?", doomed)
+
+    def clear(self):
+        with self._lock:
+            self._db().execute("DELETE FROM answers")
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answers").fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def default_cache():
+    """The cache configured by AGENT_CACHE_* variables, or None when it is disabled"""
+    ttl = _env_number("AGENT_CACHE_TTL", DEFAULT_TTL, float)
+    max_bytes = _env_number("AGENT_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES, int)
+    if ttl <= 0 or max_bytes <= 0:
+        return None
+    return AnswerCache(os.environ.get("AGENT_CACHE_PATH") or DEFAULT_PATH, ttl, max_bytes)
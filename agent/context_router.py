@@ -1,24 +1,28 @@
-import json
 from pathlib import Path
 
+from context_builder import PackItem, pack_items
+from context_store import get_store
+from routing import rank_docs
+
 ROOT = Path(__file__).resolve().parents[1]
 
 def _read_text(rel):
-    return (ROOT / rel).read_text(encoding="utf-8")
+    return get_store(ROOT).read_text(rel)
+
+def _rank(prompt, manifest="context/manifest.json", max_docs=3):
+    store = get_store(ROOT, manifest)
+    return rank_docs(store, store.manifest_for(prompt), prompt)[:max_docs]
 
 def select_docs(prompt, manifest="context/manifest.json", max_docs=3):
-    p = prompt.lower()
-    manifest = json.loads(_read_text(manifest))
-    scored = []
-    for d in manifest["docs"]:
-        hits = sum(1 for k in d["when"] if k in p)
-        if hits:
-            scored.append((hits, d["path"]))
-    scored.sort(reverse=True)
-    return [p for _, p in scored[:max_docs]]
+    return [d["path"] for d in _rank(prompt, manifest, max_docs)]
 
-def build_system_context(prompt):
-    base = _read_text("context/base.md")
-    docs = select_docs(prompt)
-    extra = "\n\n".join([_read_text(d) for d in docs])
-    return base + ("\n\n" + extra if extra else "")
+def build_system_context(prompt, max_tokens=None, max_docs=3):
+    items = [PackItem("context/base.md", "", _read_text("context/base.md"), required=True)]
+    for d in _rank(prompt, max_docs=max_docs):
+        items.append(PackItem(d["path"], "", _read_text(d["path"]), score=d["score"]))
+    packed = pack_items(items, max_tokens)
+    parts = [body for _, body in packed.included]
+    report = packed.report()
+    if report:
+        parts.append(report)
+    return "\n\n".join(parts)
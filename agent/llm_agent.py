@@ -1,15 +1,138 @@
-from openai import OpenAI
+import asyncio
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from agent.answer_cache import answer_key, default_cache
 from agent.context_router import build_system_context
+from context_store import _env_number, run_io
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# Model requests in flight at once (AGENT_MAX_CONCURRENCY); further requests wait for a slot
+DEFAULT_MAX_CONCURRENCY = 16
 
-client = OpenAI()
+# Seconds for a whole model round-trip (AGENT_TIMEOUT) and for opening a connection
+# (AGENT_CONNECT_TIMEOUT)
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_CONNECT_TIMEOUT = 5.0
 
-def ask_agent(prompt, model="gpt-4o-mini"):
+# Retries of failed or timed-out model requests (AGENT_MAX_RETRIES)
+DEFAULT_MAX_RETRIES = 2
+
+_client = None
+_cache = None
+
+def _messages(system, prompt):
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": prompt}
+    ]
+
+def ask_agent(prompt, model=DEFAULT_MODEL):
+    global _client, _cache
+    if _client is None:
+        _client = OpenAI()
+        _cache = default_cache()
     system = build_system_context(prompt)
-    res = client.chat.completions.create(
+    key = answer_key(model, system, prompt)
+    answer = _cache.get(key) if _cache is not None else None
+    if answer is not None:
+        return answer
+    res = _client.chat.completions.create(
         model=model,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": prompt}
-        ]
+        messages=_messages(system, prompt)
     )
-    return res.choices[0].message.content
+    answer = res.choices[0].message.content
+    if _cache is not None and answer is not None:
+        _cache.put(key, answer)
+    return answer
+
+
+class AsyncAgent:
+    """
+    Async model client sharing one pooled HTTP connection pool. The base URL and
+    API key default to OPENAI_BASE_URL / OPENAI_API_KEY as for OpenAI(), and the
+    answer cache to default_cache() (pass cache=False to disable it).
+    """
+
+    def __init__(self, max_concurrency=None, timeout=None, connect_timeout=None,
+                 base_url=None, api_key=None, max_retries=None, cache=None):
+        if max_concurrency is None:
+            max_concurrency = _env_number("AGENT_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY, int)
+        if timeout is None:
+            timeout = _env_number("AGENT_TIMEOUT", DEFAULT_TIMEOUT, float)
+        if connect_timeout is None:
+            connect_timeout = _env_number("AGENT_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT, float)
+        if max_retries is None:
+            max_retries = _env_number("AGENT_MAX_RETRIES", DEFAULT_MAX_RETRIES, int)
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.max_concurrency,
+                                max_keepalive_connections=self.max_concurrency),
+            timeout=self.timeout,
+        )
+        self.client = AsyncOpenAI(base_url=base_url, api_key=api_key, http_client=self.http,
+                                  timeout=self.timeout, max_retries=max_retries)
+        self.slots = asyncio.Semaphore(self.max_concurrency)
+        self.cache = default_cache() if cache is None else (cache or None)
+
+    async def _cached(self, model, context, prompt):
+        """(key, cached answer or None); no key when caching is off"""
+        if self.cache is None:
+            return None, None
+        key = answer_key(model, await context, prompt)
+        return key, await run_io(self.cache.get, key)
+
+    async def _store(self, key, answer):
+        if key is not None and answer:
+            await run_io(self.cache.put, key, answer)
+
+    async def ask(self, prompt, model=DEFAULT_MODEL):
+        # Documents are read and packed in the I/O pool while this request waits for a slot
+        context = asyncio.ensure_future(run_io(build_system_context, prompt))
+        try:
+            key, answer = await self._cached(model, context, prompt)
+            if answer is not None:
+                return answer
+            async with self.slots:
+                res = await self.client.chat.completions.create(
+                    model=model,
+                    messages=_messages(await context, prompt)
+                )
+        finally:
+            context.cancel()
+        answer = res.choices[0].message.content
+        await self._store(key, answer)
+        return answer
+
+    async def stream(self, prompt, model=DEFAULT_MODEL):
+        """Yield the answer in pieces as the model produces them; the slot is held until the end"""
+        context = asyncio.ensure_future(run_io(build_system_context, prompt))
+        try:
+            key, answer = await self._cached(model, context, prompt)
+            if answer is not None:
+                yield answer
+                return
+            pieces = []
+            async with self.slots:
+                chunks = await self.client.chat.completions.create(
+                    model=model,
+                    messages=_messages(await context, prompt),
+                    stream=True
+                )
+                async with chunks:
+                    async for chunk in chunks:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            pieces.append(chunk.choices[0].delta.content)
+                            yield pieces[-1]
+        finally:
+            context.cancel()
+        # Only answers that streamed to the end are cached
+        await self._store(key, "".join(pieces))
+
+    async def aclose(self):
+        await self.client.close()
+        if self.cache is not None:
+            self.cache.close()
@@ -1,13 +1,68 @@
-from fastapi import FastAPI
+import json
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from openai import APIConnectionError, APIStatusError, APITimeoutError, OpenAIError
 from pydantic import BaseModel
-from agent.llm_agent import ask_agent
+from agent.llm_agent import DEFAULT_MODEL, AsyncAgent
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.agent = AsyncAgent()
+    try:
+        yield
+    finally:
+        await app.state.agent.aclose()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 class Ask(BaseModel):
     prompt: str
     model: str | None = None
 
+def _model_error(e):
+    if isinstance(e, APITimeoutError):
+        return HTTPException(status_code=504, detail="Model request timed out")
+    return HTTPException(status_code=502, detail=f"Model request failed: {e}")
+
+def _event(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
 @app.post("/ask")
-def ask(req: Ask):
-    return {"answer": ask_agent(req.prompt, req.model or "gpt-4o-mini")}
+async def ask(req: Ask, request: Request):
+    try:
+        answer = await request.app.state.agent.ask(req.prompt, req.model or DEFAULT_MODEL)
+    except (APIConnectionError, APIStatusError) as e:
+        raise _model_error(e)
+    return {"answer": answer}
+
+@app.post("/ask/stream")
+async def ask_stream(req: Ask, request: Request):
+    """
+    Server-sent events: one `data: {"delta": ...}` event per piece of the answer as
+    the model produces it, then `data: [DONE]`. Failures before the first piece
+    return 502/504 like /ask; later ones end the stream with an `error` event.
+    """
+    pieces = request.app.state.agent.stream(req.prompt, req.model or DEFAULT_MODEL)
+    try:
+        first = await anext(pieces, None)
+    except (APIConnectionError, APIStatusError) as e:
+        raise _model_error(e)
+
+    async def events():
+        try:
+            if first is not None:
+                yield _event({"delta": first})
+            async for piece in pieces:
+                yield _event({"delta": piece})
+        except OpenAIError as e:
+            yield _event({"error": str(e)}, event="error")
+            return
+        finally:
+            await pieces.aclose()
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for document routing and context building on synthetic corpora
+Generates a reproducible corpus, times the hot paths and compares against a baseline
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import mcp_server
+from agent import context_router
+from context_pack import build_pack
+from context_store import get_store
+from skills import SkillsManager
+
+# A run fails when a benchmark's median is this much slower than the baseline's
+DEFAULT_THRESHOLD = 0.25
+
+# One-shot and process-spawn timings, which swing with the page cache and the
+# scheduler far more than the in-process hot paths, and their wider allowance
+NOISY_BENCHMARKS = ("cold_start", "python_startup", "skills_cold_start")
+DEFAULT_NOISY_THRESHOLD = 1.0
+
+# Target for `skills.py show` (a keyboard shortcut) on top of the interpreter's own startup
+SKILLS_STARTUP_TARGET_MS = 25
+
+SKILLS_SCRIPT = Path(__file__).parent / "skills.py"
+
+_SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "ta", "vi", "so", "pe", "da", "gu", "zo", "fi", "ba", "xe"]
+
+
+def _word(rng: random.Random, syllables: int) -> str:
+    return "".join(rng.choice(_SYLLABLES) for _ in range(syllables))
+
+
+def generate_corpus(root: Path, docs: int = 1000, doc_size: int = 4000,
+                    keywords_per_doc: int = 5, seed: int = 0) -> list[str]:
+    """
+    Write a synthetic context tree under root: base.md, a manifest and `docs`
+    markdown files of roughly `doc_size` bytes, each split into a few sections.
+    Keywords are drawn from a shared pool so some documents share keywords.
+    Returns the keyword pool.
+    """
+    rng = random.Random(seed)
+    vocabulary = sorted({_word(rng, rng.randint(2, 4)) for _ in range(5000)})
+    pool = sorted({_word(rng, 3) + str(i % 97) for i in range(max(docs * keywords_per_doc // 2, 1))})
+
+    context = root / "context"
+    (context / "synthetic").mkdir(parents=True, exist_ok=True)
+    (context / "base.md").write_text("# Base Context\n\nSynthetic benchmark corpus.\n", encoding="utf-8")
+
+    entries = []
+    for i in range(docs):
+        rel = f"context/synthetic/doc_{i:05d}.md"
+        keywords = rng.sample(pool, min(keywords_per_doc, len(pool)))
+        parts = [f"# Document {i}\n\n"]
+        size = len(parts[0])
+        section = 0
+        while size < doc_size:
+            if size > (section + 1) * max(doc_size // 4, 200):
+                section += 1
+                heading = f"\n## {rng.choice(vocabulary).title()} {section}\n\n"
+                parts.append(heading)
+                size += len(heading)
+            words = rng.choices(vocabulary, k=12) + [rng.choice(keywords)]
+            line = " ".join(words) + ".\n"
+            parts.append(line)
+            size += len(line)
+        (root / rel).write_text("".join(parts), encoding="utf-8")
+        entries.append({"path": rel, "when": keywords})
+
+    manifest = {"word_boundary": True, "docs": entries}
+    (context / "manifest.json").write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+    return pool
+
+
+def make_prompts(keywords: list[str], count: int, prompt_words: int, seed: int = 0) -> list[str]:
+    """Prompts of `prompt_words` words, a couple of which are manifest keywords"""
+    rng = random.Random(seed + 1)
+    filler = ["how", "do", "i", "write", "test", "for", "the", "module", "with", "a", "new", "class",
+              "should", "we", "use", "when", "adding", "function", "error", "handling"]
+    prompts = []
+    for _ in range(count):
+        words = rng.choices(filler, k=max(prompt_words - 2, 0)) + rng.sample(keywords, min(2, len(keywords)))
+        rng.shuffle(words)
+        prompts.append(" ".join(words[:prompt_words]))
+    return prompts
+
+
+def time_calls(func, args: list[tuple], warmup: int = 3) -> dict:
+    """Call func(*a) for every a in args and summarise the per-call times in milliseconds"""
+    for a in args[:warmup]:
+        func(*a)
+    samples = []
+    for a in args:
+        started = time.perf_counter_ns()
+        func(*a)
+        samples.append((time.perf_counter_ns() - started) / 1e6)
+    samples.sort()
+    return {
+        "iterations": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p50_ms": round(samples[len(samples) // 2], 4),
+        "p95_ms": round(samples[min(int(len(samples) * 0.95), len(samples) - 1)], 4),
+        "min_ms": round(samples[0], 4),
+        "max_ms": round(samples[-1], 4),
+    }
+
+
+def _time_corpus(root: Path, prompts: list[str], docs: int, iterations: int, seed: int) -> dict:
+    """Point the server and agent at root and time every benchmark"""
+    results = {}
+    started = time.perf_counter()
+    mcp_server.STORE = get_store(root)
+    mcp_server.RESPONSE_CACHE.clear()
+    mcp_server.select_relevant_docs(prompts[0])
+    cold_start = round((time.perf_counter() - started) * 1000, 4)
+    results["cold_start"] = {"iterations": 1, "mean_ms": cold_start, "p50_ms": cold_start}
+
+    single = [(prompt,) for prompt in prompts]
+    results["select_relevant_docs"] = time_calls(mcp_server.select_relevant_docs, single)
+    results["build_context_response"] = time_calls(
+        lambda prompt: (mcp_server.RESPONSE_CACHE.clear(), mcp_server.build_context_response(prompt)),
+        single)
+    results["build_context_response_cached"] = time_calls(
+        mcp_server.build_context_response, [(prompts[0],)] * iterations)
+    results["list_all_contexts"] = time_calls(
+        mcp_server.list_all_contexts, [()] * max(iterations // 10, 5))
+
+    manager = SkillsManager(base_dir=root)
+    rng = random.Random(seed + 2)
+    names = [(f"doc_{rng.randrange(docs):05d}",) for _ in range(iterations)]
+    results["skills_lookup"] = time_calls(manager.get_skill_by_name, names)
+
+    # Fresh processes, as a keyboard shortcut starts them
+    runs = [()] * max(iterations // 20, 3)
+    results["python_startup"] = time_calls(
+        lambda: subprocess.run([sys.executable, "-c", "pass"], check=True), runs, warmup=1)
+    show = [sys.executable, str(SKILLS_SCRIPT), "--base-dir", str(root), "show", names[0][0]]
+    results["skills_cold_start"] = time_calls(
+        lambda: subprocess.run(show, check=True, stdout=subprocess.DEVNULL), runs, warmup=1)
+
+    context_router.ROOT = root
+    results["agent_select_docs"] = time_calls(context_router.select_docs, single)
+    return results
+
+
+def run_benchmarks(docs: int = 1000, doc_size: int = 4000, keywords_per_doc: int = 5,
+                   prompt_words: int = 12, iterations: int = 200, seed: int = 0,
+                   use_pack: bool = False) -> dict:
+    """Generate a corpus in a temporary directory and time every benchmark against it"""
+    config = {"docs": docs, "doc_size": doc_size, "keywords_per_doc": keywords_per_doc,
+              "prompt_words": prompt_words, "iterations": iterations, "seed": seed, "pack": use_pack}
+    saved = mcp_server.STORE, context_router.ROOT
+    with tempfile.TemporaryDirectory(prefix="context-bench-") as tmp:
+        root = Path(tmp)
+        keywords = generate_corpus(root, docs, doc_size, keywords_per_doc, seed)
+        prompts = make_prompts(keywords, iterations, prompt_words, seed)
+        if use_pack:
+            build_pack(None, root)
+        try:
+            results = _time_corpus(root, prompts, docs, iterations, seed)
+        finally:
+            mcp_server.STORE, context_router.ROOT = saved
+            mcp_server.RESPONSE_CACHE.clear()
+
+    return {
+        "config": config,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def find_regressions(run: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD,
+                     noisy_threshold: float = DEFAULT_NOISY_THRESHOLD) -> list[str]:
+    """
+    Benchmarks whose median got more than `threshold` slower than in the baseline
+    (`noisy_threshold` for NOISY_BENCHMARKS)
+    """
+    if run["config"] != baseline["config"]:
+        raise ValueError(f"baseline was recorded with a different configuration: {baseline['config']}")
+    regressions = []
+    for name, result in run["results"].items():
+        before = baseline["results"].get(name)
+        if before is None or before["p50_ms"] <= 0:
+            continue
+        ratio = result["p50_ms"] / before["p50_ms"]
+        if ratio > 1 + (noisy_threshold if name in NOISY_BENCHMARKS else threshold):
+            regressions.append(f"{name}: p50 {before['p50_ms']:.3f} ms -> {result['p50_ms']:.3f} ms "
+                               f"({(ratio - 1) * 100:+.0f}%)")
+    return regressions
+
+
+def print_results(run: dict):
+    print(f"Corpus: {run['config']}")
+    print(f"{'benchmark':34} {'p50 ms':>10} {'p95 ms':>10} {'mean ms':>10}")
+    for name, result in run["results"].items():
+        print(f"{name:34} {result['p50_ms']:>10.3f} {result.get('p95_ms', result['p50_ms']):>10.3f} "
+              f"{result['mean_ms']:>10.3f}")
+    results = run["results"]
+    if "skills_cold_start" in results and "python_startup" in results:
+        overhead = results["skills_cold_start"]["p50_ms"] - results["python_startup"]["p50_ms"]
+        mark = "✓" if overhead <= SKILLS_STARTUP_TARGET_MS else "✗"
+        print(f"\n{mark} skills.py show: {overhead:.1f} ms over interpreter startup "
+              f"(target {SKILLS_STARTUP_TARGET_MS} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark routing and context building on a synthetic corpus")
+    parser.add_argument("--docs", type=int, default=1000, help="Number of documents (default: 1000)")
+    parser.add_argument("--doc-size", type=int, default=4000, help="Approximate bytes per document (default: 4000)")
+    parser.add_argument("--keywords", type=int, default=5, help="Keywords per document (default: 5)")
+    parser.add_argument("--prompt-words", type=int, default=12, help="Words per prompt (default: 12)")
+    parser.add_argument("--iterations", type=int, default=200, help="Timed calls per benchmark (default: 200)")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus and prompt seed (default: 0)")
+    parser.add_argument("--pack", action="store_true", help="Build and use a context pack for the corpus")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the results JSON")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Allowed slowdown of a median before failing (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--noisy-threshold", type=float, default=DEFAULT_NOISY_THRESHOLD,
+                        help=f"Allowed slowdown for cold start and process spawn timings "
+                             f"(default: {DEFAULT_NOISY_THRESHOLD})")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results to --baseline")
+    args = parser.parse_args()
+    if args.baseline and not args.save_baseline and not Path(args.baseline).exists():
+        # Baselines depend on the machine, so none is committed: record one here first
+        parser.error(f"no baseline at {args.baseline}; record one on this machine with "
+                     f"--baseline {args.baseline} --save-baseline")
+
+    run = run_benchmarks(args.docs, args.doc_size, args.keywords, args.prompt_words,
+                         args.iterations, args.seed, args.pack)
+    print_results(run)
+    Path(args.output).write_text(json.dumps(run, indent=2), encoding="utf-8")
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline and args.save_baseline:
+        Path(args.baseline).write_text(json.dumps(run, indent=2), encoding="utf-8")
+        print(f"Baseline saved to {args.baseline}")
+    elif args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = find_regressions(run, baseline, args.threshold, args.noisy_threshold)
+        if regressions:
+            print(f"\n✗ {len(regressions)} benchmark(s) regressed more than {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\n✓ No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
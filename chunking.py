@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Section-level markdown chunking
+Splits documents by heading so only the sections relevant to a prompt are returned
+"""
+
+import hashlib
+import re
+from dataclasses import dataclass
+
+from response_cache import LRUCache
+from search_index import BM25Index
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+
+PREAMBLE_ID = "_preamble"
+
+# Sections scoring below this fraction of the best section are dropped
+SECTION_RELATIVE_CUTOFF = 0.5
+
+# Return the whole document once the selected sections cover this share of it
+WHOLE_DOC_RATIO = 0.8
+
+# Documents whose section layouts and section indexes are cached, keyed by
+# content digest: the caches hold offsets, ids and postings, never the text
+SECTION_CACHE_SIZE = 1024
+
+_layouts = LRUCache(SECTION_CACHE_SIZE, float("inf"))
+_section_indexes = LRUCache(SECTION_CACHE_SIZE, float("inf"))
+
+
+@dataclass(frozen=True)
+class Section:
+    """A heading and the text up to the next heading of any level"""
+    id: str
+    title: str
+    level: int
+    breadcrumb: tuple[str, ...]
+    start: int
+    end: int
+    text: str
+
+    @property
+    def byte_range(self) -> tuple[int, int]:
+        return self.start, self.end
+
+
+def slugify(title: str) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", title.lower()).strip("-")
+    return slug or "section"
+
+
+def _layout(text: str) -> tuple[tuple, ...]:
+    """(id, title, level, breadcrumb, start, end) of each section, see split_sections"""
+    layout = []
+    stack: list[tuple[int, str, str]] = []   # (level, title, slug)
+    seen: dict[str, int] = {}
+
+    current = None  # (id, title, level, breadcrumb, start_byte, start_char)
+    in_fence = False
+    byte_pos = 0
+    char_pos = 0
+
+    def close(end_byte: int, end_char: int):
+        if current is None:
+            return
+        sid, title, level, breadcrumb, start_byte, start_char = current
+        if sid == PREAMBLE_ID and not text[start_char:end_char].strip():
+            return
+        layout.append((sid, title, level, breadcrumb, start_byte, end_byte))
+
+    current = (PREAMBLE_ID, "", 0, (), 0, 0)
+    for line in text.splitlines(keepends=True):
+        if FENCE_RE.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else HEADING_RE.match(line.rstrip("\r\n"))
+        if match:
+            close(byte_pos, char_pos)
+            level = len(match.group(1))
+            title = match.group(2)
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            stack.append((level, title, slugify(title)))
+            sid = "/".join(slug for _, _, slug in stack)
+            seen[sid] = seen.get(sid, 0) + 1
+            if seen[sid] > 1:
+                sid = f"{sid}-{seen[sid]}"
+            current = (sid, title, level, tuple(t for _, t, _ in stack), byte_pos, char_pos)
+        byte_pos += len(line.encode("utf-8"))
+        char_pos += len(line)
+    close(byte_pos, char_pos)
+    return tuple(layout)
+
+
+def sections_from_layout(text: str, layout: tuple[tuple, ...],
+                         data: bytes | None = None) -> tuple[Section, ...]:
+    """Sections of `text` (UTF-8 encoded: `data`) at the byte offsets of a layout"""
+    if data is None:
+        data = text.encode("utf-8")
+    if len(data) == len(text):
+        # ASCII: byte offsets are character offsets
+        return tuple(Section(sid, title, level, breadcrumb, start, end, text[start:end])
+                     for sid, title, level, breadcrumb, start, end in layout)
+    return tuple(Section(sid, title, level, breadcrumb, start, end, str(data[start:end], "utf-8"))
+                 for sid, title, level, breadcrumb, start, end in layout)
+
+
+def content_digest(data: bytes) -> bytes:
+    """SHA-256 of a UTF-8 encoded text, the key of the caches below (and of packed documents)"""
+    return hashlib.sha256(data).digest()
+
+
+def split_sections(text: str) -> tuple[Section, ...]:
+    """
+    Split markdown into sections at ATX headings, ignoring fenced code blocks.
+
+    Section IDs are the slugged heading path ("gtest-mock/return-values"), with a
+    numeric suffix for duplicates, so they stay stable while headings do. Offsets
+    are byte offsets into the UTF-8 encoded document. Only the layout is cached,
+    by content digest, so the cache never holds document text.
+    """
+    data = text.encode("utf-8")
+    digest = content_digest(data)
+    layout = _layouts.get(digest)
+    if layout is None:
+        layout = _layout(text)
+        _layouts.put(digest, layout)
+    return sections_from_layout(text, layout, data)
+
+
+def document_sections(store, rel_path: str, text: str) -> tuple[Section, ...]:
+    """
+    Sections of a document read from `store`. While the text is the document as
+    stored in the store's context pack (same content hash), the packed section
+    offsets are used instead of splitting the text again.
+    """
+    pack = store.pack
+    if pack is not None and store.is_packed(rel_path):
+        data = text.encode("utf-8")
+        if content_digest(data) == pack.content_hash(rel_path):
+            return sections_from_layout(text, pack.section_layout(rel_path), data)
+    return split_sections(text)
+
+
+def _section_index(text: str, sections: tuple[Section, ...]) -> BM25Index:
+    """BM25 index over one document's sections (breadcrumb titles count as content), cached by digest"""
+    key = (content_digest(text.encode("utf-8")), tuple(section.id for section in sections))
+    index = _section_indexes.get(key)
+    if index is None:
+        index = BM25Index()
+        for position, section in enumerate(sections):
+            index.add(str(position), " ".join(section.breadcrumb) + "\n" + section.text)
+        _section_indexes.put(key, index)
+    return index
+
+
+def find_section(text: str, section_id: str,
+                 sections: tuple[Section, ...] | None = None) -> Section | None:
+    """Look a section up by ID, falling back to a case-insensitive title match"""
+    if sections is None:
+        sections = split_sections(text)
+    for section in sections:
+        if section.id == section_id:
+            return section
+    wanted = section_id.strip().lstrip("#").strip().lower()
+    for section in sections:
+        if section.title.lower() == wanted:
+            return section
+    return None
+
+
+def select_sections(text: str, prompt: str,
+                    sections: tuple[Section, ...] | None = None) -> list[Section] | None:
+    """
+    Return the sections relevant to a prompt in document order, or None when the
+    whole document should be used (no section stands out, or most of it matches).
+    `sections` may be passed when already known (see document_sections).
+    """
+    if sections is None:
+        sections = split_sections(text)
+    if len(sections) <= 1:
+        return None
+    scores = _section_index(text, sections).scores(prompt)
+    if not scores:
+        return None
+
+    best = max(scores.values())
+    chosen = sorted(int(pos) for pos, score in scores.items()
+                    if score >= best * SECTION_RELATIVE_CUTOFF)
+    selected = [sections[pos] for pos in chosen]
+    if sum(len(s.text) for s in selected) >= WHOLE_DOC_RATIO * len(text):
+        return None
+    return selected
+
+
+def render_section(section: Section) -> str:
+    """Section text preceded by its heading breadcrumb and ID"""
+    crumbs = " > ".join(section.breadcrumb) or "(top of document)"
+    return f"[{crumbs}] (section: {section.id})\n{section.text.rstrip()}"
+
+
+def render_sections(sections: list[Section], total: int) -> str:
+    """Render selected sections, noting how many of the document's sections they are"""
+    rendered = "\n\n".join(render_section(section) for section in sections)
+    return f"(showing {len(sections)} of {total} sections)\n\n{rendered}"
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Token-budgeted context assembly shared by the MCP servers and the agent
+Estimates tokens locally and packs the highest-value content into a budget
+"""
+
+import hashlib
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from chunking import content_digest, document_sections, render_sections, select_sections, split_sections
+from response_cache import LRUCache
+from search_index import content_index_for
+
+BASE_PATH = "context/base.md"
+
+# Do not bother including a truncated document with less room than this
+MIN_PARTIAL_TOKENS = 48
+
+TRUNCATION_MARKER = "\n[... truncated to fit the token budget ...]"
+
+# Sent instead of content the client session has already received unchanged
+ALREADY_SENT_MARKER = "[unchanged since it was sent earlier in this session]"
+
+# Versions of one document remembered per session (e.g. different section selections)
+MAX_VERSIONS_PER_DOC = 32
+
+# Word pieces of up to 4 characters, or single punctuation characters: a close
+# enough approximation of BPE tokenizers for English prose and code
+_TOKEN_PIECE_RE = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+# Texts up to this many characters are cached as themselves; longer ones (document
+# bodies) by content digest, so the estimate cache never holds document text
+SHORT_TEXT_CHARS = 256
+
+_long_estimates = LRUCache(4096, float("inf"))
+
+
+@lru_cache(maxsize=4096)
+def _estimate_short(text: str) -> int:
+    return len(_TOKEN_PIECE_RE.findall(text))
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local estimate of how many model tokens a text costs"""
+    if len(text) <= SHORT_TEXT_CHARS:
+        return _estimate_short(text)
+    digest = content_digest(text.encode("utf-8"))
+    tokens = _long_estimates.get(digest)
+    if tokens is None:
+        tokens = len(_TOKEN_PIECE_RE.findall(text))
+        _long_estimates.put(digest, tokens)
+    return tokens
+
+
+@dataclass
+class PackItem:
+    """One piece of content competing for the token budget"""
+    key: str
+    header: str
+    body: str
+    score: float = 0.0
+    required: bool = False
+
+
+@dataclass
+class PackResult:
+    """Outcome of packing: what went in whole, cut down, or was left out"""
+    included: list[tuple[PackItem, str]] = field(default_factory=list)
+    truncated: list[tuple[str, int, int]] = field(default_factory=list)
+    omitted: list[str] = field(default_factory=list)
+    used_tokens: int = 0
+    max_tokens: int | None = None
+
+    def report(self) -> str:
+        """Human readable summary, empty when nothing had to be cut"""
+        if not self.truncated and not self.omitted:
+            return ""
+        lines = [f"=== Context budget: {self.used_tokens}/{self.max_tokens} tokens used ==="]
+        for key, kept, total in self.truncated:
+            lines.append(f"- truncated {key} (kept ~{kept} of ~{total} tokens)")
+        for key in self.omitted:
+            lines.append(f"- omitted {key}")
+        return "\n".join(lines)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> tuple[str, int]:
+    """
+    Cut text so it fits max_tokens; returns (text, tokens)
+    Cuts at a line boundary, or inside the first line when not even that fits
+    """
+    budget = max_tokens - estimate_tokens(TRUNCATION_MARKER)
+    if budget <= 0:
+        return "", 0
+    used = 0
+    end = 0
+    for line in text.splitlines(keepends=True):
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            break
+        used += cost
+        end += len(line)
+    if end == 0:
+        pieces = _TOKEN_PIECE_RE.finditer(text)
+        for used, piece in enumerate(pieces, start=1):
+            if used > budget:
+                used -= 1
+                break
+            end = piece.end()
+        if end == 0:
+            return "", 0
+    return text[:end].rstrip("\n") + TRUNCATION_MARKER, used + estimate_tokens(TRUNCATION_MARKER)
+
+
+def pack_items(items: list[PackItem], max_tokens: int | None) -> PackResult:
+    """
+    Fit items into max_tokens.
+
+    Required items go first, then the remaining items by score: every item that
+    fits whole is taken, and leftover room is filled with line-truncated prefixes
+    of the items that did not fit. Without a budget everything is included.
+    """
+    result = PackResult(max_tokens=max_tokens)
+    if max_tokens is None:
+        result.included = [(item, item.body) for item in items]
+        result.used_tokens = sum(estimate_tokens(item.header) + estimate_tokens(item.body) for item in items)
+        return result
+
+    order = sorted(items, key=lambda item: (not item.required, -item.score))
+    remaining = max_tokens
+    chosen: dict[str, str] = {}
+    skipped = []
+
+    for item in order:
+        cost = estimate_tokens(item.header) + estimate_tokens(item.body)
+        if cost <= remaining:
+            chosen[item.key] = item.body
+            remaining -= cost
+        elif item.required:
+            # Required content (base context) is cut down rather than dropped
+            room = remaining - estimate_tokens(item.header)
+            body, kept = truncate_to_tokens(item.body, room) if room > 0 else ("", 0)
+            chosen[item.key] = body
+            remaining -= estimate_tokens(item.header) + kept
+            result.truncated.append((item.key, kept, estimate_tokens(item.body)))
+        else:
+            skipped.append(item)
+
+    for item in skipped:
+        room = remaining - estimate_tokens(item.header)
+        if room >= MIN_PARTIAL_TOKENS:
+            body, kept = truncate_to_tokens(item.body, room)
+            if body:
+                chosen[item.key] = body
+                remaining -= estimate_tokens(item.header) + kept
+                result.truncated.append((item.key, kept, estimate_tokens(item.body)))
+                continue
+        result.omitted.append(item.key)
+
+    # Keep the caller's ordering in the output
+    result.included = [(item, chosen[item.key]) for item in items if item.key in chosen]
+    result.used_tokens = max_tokens - remaining
+    return result
+
+
+class DeliveryLog:
+    """
+    What one client session has already received: per document, hashes of the
+    bodies sent. A body counts as delivered only if exactly that text was sent,
+    so edited documents and different section selections are sent again.
+    """
+
+    def __init__(self):
+        self._sent: dict[str, dict[bytes, None]] = {}
+
+    @staticmethod
+    def _digest(body: str) -> bytes:
+        return hashlib.blake2b(body.encode("utf-8"), digest_size=16).digest()
+
+    def has(self, key: str, body: str) -> bool:
+        return self._digest(body) in self._sent.get(key, ())
+
+    def record(self, key: str, body: str):
+        versions = self._sent.setdefault(key, {})
+        versions[self._digest(body)] = None
+        if len(versions) > MAX_VERSIONS_PER_DOC:
+            del versions[next(iter(versions))]
+
+    def __len__(self) -> int:
+        return sum(len(versions) for versions in self._sent.values())
+
+
+def _read(store, rel_path: str) -> str:
+    try:
+        return store.read_text(rel_path)
+    except Exception as e:
+        return f"Error reading {rel_path}: {str(e)}"
+
+
+def plan_context(store, relevant: list[dict], prompt: str | None = None) -> tuple:
+    """
+    Decide what goes into a response: per doc (path, keywords, score, section IDs),
+    where section IDs is None for the whole document. When a prompt is given, each
+    doc is narrowed to its matching sections. The plan is hashable, so responses
+    for identical plans can be shared.
+    """
+    plan = []
+    for doc in relevant:
+        section_ids = None
+        if prompt:
+            text = _read(store, doc["path"])
+            selected = select_sections(text, prompt, document_sections(store, doc["path"], text))
+            if selected is not None:
+                section_ids = tuple(section.id for section in selected)
+        plan.append((doc["path"], tuple(doc["keywords"]), doc["score"], section_ids))
+    return tuple(plan)
+
+
+def doc_body(text: str, section_ids: tuple | None, sections: tuple | None = None) -> str:
+    """The planned sections of a document, or the whole text"""
+    if section_ids is None:
+        return text
+    wanted = set(section_ids)
+    if sections is None:
+        sections = split_sections(text)
+    selected = [section for section in sections if section.id in wanted]
+    return render_sections(selected, len(sections)) if selected else text
+
+
+def render_context(store, plan: tuple, include_base: bool = True,
+                   max_tokens: int | None = None, delivered: DeliveryLog | None = None) -> str:
+    """
+    Render base context plus the planned docs, packed into max_tokens
+    With a delivery log, content the session already has is replaced by a short
+    reference, and whatever is sent in full is recorded in the log
+    """
+    divider = "\n=== Relevant Documentation ==="
+
+    items = []
+    if include_base:
+        items.append(PackItem(BASE_PATH, "=== Base Context ===\n", _read(store, BASE_PATH), required=True))
+    for path, keywords, score, section_ids in plan:
+        header = f"\n--- {path} (matched keywords: {', '.join(keywords)}) ---\n"
+        text = _read(store, path)
+        body = doc_body(text, section_ids, document_sections(store, path, text) if section_ids else None)
+        items.append(PackItem(path, header, body, score=score))
+
+    if delivered is not None:
+        for item in items:
+            if delivered.has(item.key, item.body):
+                item.body = ALREADY_SENT_MARKER
+
+    budget = max(max_tokens - estimate_tokens(divider), 0) if max_tokens is not None else None
+    packed = pack_items(items, budget)
+    packed.max_tokens = max_tokens
+
+    if delivered is not None:
+        for item, body in packed.included:
+            # Truncated bodies are not recorded, so the whole text is sent next time
+            if body is item.body and body is not ALREADY_SENT_MARKER:
+                delivered.record(item.key, body)
+
+    parts = []
+    docs = []
+    for item, body in packed.included:
+        if include_base and item.key == BASE_PATH and item.required:
+            parts.append(item.header + body)
+        else:
+            docs.append(item.header + body)
+
+    if plan:
+        parts.append(divider)
+        parts.extend(docs)
+    else:
+        parts.append("\n=== No specific documentation matched your query ===")
+
+    report = packed.report()
+    if report:
+        parts.append("\n" + report)
+
+    return "\n\n".join(parts)
+
+
+def merge_plans(plans: list[tuple]) -> tuple:
+    """
+    One plan covering several: each document appears once, best score first,
+    with the union of the sections each plan wanted (whole if any wanted it whole)
+    """
+    merged: dict[str, list] = {}
+    for plan in plans:
+        for path, keywords, score, section_ids in plan:
+            entry = merged.get(path)
+            if entry is None:
+                merged[path] = [path, keywords, score, section_ids]
+                continue
+            entry[2] = max(entry[2], score)
+            if entry[3] is None or section_ids is None:
+                entry[3] = None
+            else:
+                entry[3] = entry[3] + tuple(i for i in section_ids if i not in entry[3])
+    entries = sorted(merged.values(), key=lambda entry: entry[2], reverse=True)
+    return tuple(tuple(entry) for entry in entries)
+
+
+def render_batch_context(store, prompts: list[str], plans: list[tuple], include_base: bool = True,
+                         max_tokens: int | None = None, delivered: DeliveryLog | None = None) -> str:
+    """
+    Render the context for several prompts in one response: base context and each
+    document at most once, then which documents and sections answer each prompt
+    """
+    index_lines = ["\n=== Results per Prompt ==="]
+    for number, (prompt, plan) in enumerate(zip(prompts, plans), start=1):
+        index_lines.append(f"[{number}] {prompt}")
+        if not plan:
+            index_lines.append("  (no specific documentation matched)")
+        for path, _, score, section_ids in plan:
+            where = f"sections: {', '.join(section_ids)}" if section_ids else "whole document"
+            index_lines.append(f"  - {path} (score {score}; {where})")
+    index = "\n".join(index_lines)
+
+    budget = max(max_tokens - estimate_tokens(index), 1) if max_tokens is not None else None
+    return render_context(store, merge_plans(plans), include_base, budget, delivered) + "\n\n" + index
+
+
+async def prefetch_context(store, prompts: list[str] | tuple = ()):
+    """
+    Load everything a load_context call may read (manifest, the shards `prompts`
+    route to, base context and the documents the content index needs) in the I/O
+    thread pool, concurrently, so the response can then be built from memory
+    without blocking the event loop
+    """
+    try:
+        manifest = await store.manifest_for_async(*prompts)
+    except Exception:
+        return
+    await store.refresh_async()
+    await content_index_for(store).sync_async(manifest)
+    await store.read_many_async([BASE_PATH])
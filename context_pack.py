@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Compiled context pack: manifest, documents, sections and matching indexes in one file
+Built once (skills.py build-pack) and memory-mapped, so processes start without
+reading loose files and several workers share a single copy
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from functools import cached_property, lru_cache
+from pathlib import Path
+
+import manifest_shards
+from chunking import Section, content_digest, sections_from_layout, split_sections
+from context_store import BASE_PATH, MANIFEST_PATH, ROOT
+from keyword_matcher import KeywordMatcher, register_matcher, unregister_matcher
+from search_index import BM25Index, PackedBM25Index
+
+MAGIC = b"CTXPACK\0"
+FORMAT_VERSION = 2
+
+# Where build-pack writes the pack, relative to the context root
+DEFAULT_PACK_PATH = "context/context.pack"
+
+# magic, format version, number of sections
+_HEADER = struct.Struct("<8sII")
+# name, array typecode, offset, length in bytes
+_SECTION = struct.Struct("<24sc7xQQ")
+# Sections start on 8-byte boundaries so int/float arrays can be cast in place
+_ALIGN = 8
+_HASH_SIZE = 32
+
+
+def _stat(path: Path) -> tuple:
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def normalize_newlines(text: str) -> str:
+    """The newline translation open() applies in text mode, so packed text equals read_text()"""
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def content_hash(text: str) -> bytes:
+    return content_digest(text.encode("utf-8"))
+
+
+class _Strings:
+    """String table builder: each distinct string is stored once"""
+
+    def __init__(self):
+        self.blob = bytearray()
+        self.index = array("i", [0])
+        self._ids: dict[str, int] = {}
+
+    def add(self, value: str) -> int:
+        sid = self._ids.get(value)
+        if sid is None:
+            sid = self._ids[value] = len(self.index) - 1
+            self.blob += value.encode("utf-8")
+            self.index.append(len(self.blob))
+        return sid
+
+
+def build_pack(path=None, root: Path = ROOT, manifest_path: str = MANIFEST_PATH) -> Path:
+    """
+    Compile the manifest, the base context and every referenced document under
+    `root` into a pack file (written atomically). Returns the pack's path.
+    """
+    root = Path(root).resolve()
+    path = Path(path) if path is not None else root / DEFAULT_PACK_PATH
+
+    # Stat before reading: a file changed while being packed then no longer
+    # matches its recorded signature and is read from disk instead
+    manifest_signature = _stat(root / manifest_path)
+    manifest_bytes = (root / manifest_path).read_bytes()
+    manifest_hash = hashlib.sha256(manifest_bytes).digest()
+    manifest = json.loads(manifest_bytes)
+    # A sharded manifest is packed flattened; the shards are recorded so that
+    # editing any of them makes the pack stale
+    shards = {}
+    if manifest_shards.includes(manifest):
+        loaded = []
+        for rel_path in manifest_shards.includes(manifest):
+            shards[rel_path], data = manifest_shards.fingerprint(root, rel_path)
+            loaded.append(json.loads(data) if data is not None else {"docs": []})
+        manifest = manifest_shards.merge(manifest, loaded)
+        manifest_bytes = json.dumps(manifest).encode("utf-8")
+    docs = manifest.get("docs", [])
+    listed = {doc["path"] for doc in docs}
+
+    paths, offsets, lengths, mtimes, sizes = [], array("q"), array("q"), array("q"), array("q")
+    blobs, hashes, index = bytearray(), bytearray(), BM25Index()
+    strings = _Strings()
+    sec_index, sec_start, sec_end = array("i", [0]), array("q"), array("q")
+    sec_level, sec_id, sec_title = array("i"), array("i"), array("i")
+    crumb_index, crumbs = array("i", [0]), array("i")
+
+    for rel_path in dict.fromkeys([BASE_PATH] + [doc["path"] for doc in docs]):
+        try:
+            signature = _stat(root / rel_path)
+            text = normalize_newlines((root / rel_path).read_bytes().decode("utf-8"))
+        except (OSError, UnicodeDecodeError):
+            # Left out: the store reads (and reports) it from disk as before
+            continue
+        data = text.encode("utf-8")
+        paths.append(rel_path)
+        offsets.append(len(blobs))
+        lengths.append(len(data))
+        mtimes.append(signature[0])
+        sizes.append(signature[1])
+        blobs += data
+        hashes += hashlib.sha256(data).digest()
+        if rel_path in listed:
+            index.add(rel_path, text)
+        for section in split_sections(text):
+            sec_start.append(section.start)
+            sec_end.append(section.end)
+            sec_level.append(section.level)
+            sec_id.append(strings.add(section.id))
+            sec_title.append(strings.add(section.title))
+            crumbs.extend(strings.add(title) for title in section.breadcrumb)
+            crumb_index.append(len(crumbs))
+        sec_index.append(len(sec_start))
+
+    ordinals = {rel_path: i for i, rel_path in enumerate(paths)}
+    path_strings = _Strings()
+    for rel_path in paths:
+        path_strings.add(rel_path)
+
+    word_boundary = bool(manifest.get("word_boundary", False))
+    meta = {
+        "manifest_path": manifest_path,
+        "word_boundary": word_boundary,
+        "shards": shards,
+        "byteorder": sys.byteorder,
+        "built_at": time.time(),
+    }
+    sections = [
+        ("meta", json.dumps(meta).encode("utf-8")),
+        ("manifest", manifest_bytes),
+        ("manifest.sig", array("q", manifest_signature)),
+        ("manifest.hash", manifest_hash),
+        ("manifest.docs", array("i", (ordinals.get(doc["path"], -1) for doc in docs))),
+        ("doc.paths", bytes(path_strings.blob)),
+        ("doc.path_index", path_strings.index),
+        ("doc.offset", offsets),
+        ("doc.length", lengths),
+        ("doc.mtime", mtimes),
+        ("doc.size", sizes),
+        ("doc.hash", bytes(hashes)),
+        ("doc.blobs", bytes(blobs)),
+        ("sec.index", sec_index),
+        ("sec.start", sec_start),
+        ("sec.end", sec_end),
+        ("sec.level", sec_level),
+        ("sec.id", sec_id),
+        ("sec.title", sec_title),
+        ("sec.crumb_index", crumb_index),
+        ("sec.crumbs", crumbs),
+        ("str.blob", bytes(strings.blob)),
+        ("str.index", strings.index),
+    ]
+    matcher = KeywordMatcher(docs, word_boundary)
+    sections += [(f"kw.{name}", data) for name, data in matcher.to_arrays().items()]
+    sections += [(f"bm25.{name}", data) for name, data in index.to_arrays(paths).items()]
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _write(path, sections)
+    return path
+
+
+def _write(path: Path, sections: list[tuple]):
+    offset = _HEADER.size + _SECTION.size * len(sections)
+    entries, payloads = [], []
+    for name, data in sections:
+        typecode = data.typecode if isinstance(data, array) else "B"
+        payload = data.tobytes() if isinstance(data, array) else data
+        offset += -offset % _ALIGN
+        entries.append(_SECTION.pack(name.encode("ascii"), typecode.encode("ascii"),
+                                     offset, len(payload)))
+        payloads.append((offset, payload))
+        offset += len(payload)
+
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(sections)))
+        f.write(b"".join(entries))
+        for start, payload in payloads:
+            f.write(b"\0" * (start - f.tell()))
+            f.write(payload)
+    os.replace(tmp, path)
+
+
+class ContextPack:
+    """
+    A pack file mapped into memory.
+
+    Nothing is parsed up front except a small header: documents are decoded
+    from the mapping on demand, and the keyword automaton, BM25 postings and
+    section tables are used in place, so the pages are shared by every process
+    that opens the same file. The manifest JSON is only parsed when asked for.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, version, count = _HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"not a version {FORMAT_VERSION} context pack (rebuild it with build-pack)")
+        self._sections: dict[str, tuple] = {}
+        for i in range(count):
+            name, typecode, offset, length = _SECTION.unpack_from(
+                self._view, _HEADER.size + i * _SECTION.size)
+            self._sections[name.rstrip(b"\0").decode("ascii")] = (typecode.decode("ascii"),
+                                                                   offset, length)
+
+        meta = json.loads(bytes(self.array("meta")))
+        if meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"pack was built on a {meta['byteorder']}-endian machine")
+        self.manifest_path = meta["manifest_path"]
+        self.built_at = meta["built_at"]
+        self.shards = meta.get("shards", {})
+        self.sharded = bool(self.shards)
+        self.manifest_signature = tuple(self.array("manifest.sig"))
+        self.manifest_hash = bytes(self.array("manifest.hash"))
+
+        path_blob, path_index = self.array("doc.paths"), self.array("doc.path_index")
+        self.paths = [str(path_blob[path_index[i]:path_index[i + 1]], "utf-8")
+                      for i in range(len(path_index) - 1)]
+        self._ordinals = {rel_path: i for i, rel_path in enumerate(self.paths)}
+        self._offset, self._length = self.array("doc.offset"), self.array("doc.length")
+        self._mtime, self._size = self.array("doc.mtime"), self.array("doc.size")
+        self._hash, self._blobs = self.array("doc.hash"), self.array("doc.blobs")
+
+        self.matcher = KeywordMatcher.from_arrays(self._group("kw."), meta["word_boundary"])
+        # Only the manifest's documents are indexed (see build_pack)
+        self.bm25 = PackedBM25Index(self._group("bm25."), self.paths,
+                                    frozenset(self.manifest_doc_paths()))
+
+    def array(self, name: str) -> memoryview:
+        """Return a section as a typed, read-only view into the mapping"""
+        typecode, offset, length = self._sections[name]
+        return self._view[offset:offset + length].cast(typecode)
+
+    def _group(self, prefix: str) -> dict[str, memoryview]:
+        return {name[len(prefix):]: self.array(name)
+                for name in self._sections if name.startswith(prefix)}
+
+    @cached_property
+    def manifest(self) -> dict:
+        """The manifest, with the documents of any shards merged in"""
+        return json.loads(bytes(self.array("manifest")))
+
+    def manifest_doc_paths(self) -> list[str]:
+        """Paths of the manifest's documents in manifest order, without parsing it"""
+        return [self.paths[i] for i in self.array("manifest.docs") if i >= 0]
+
+    def manifest_is_current(self, root: Path) -> bool:
+        """True when the manifest (and its shards) on disk are the ones the pack was built from"""
+        path = Path(root) / self.manifest_path
+        try:
+            if _stat(path) != self.manifest_signature and \
+                    hashlib.sha256(path.read_bytes()).digest() != self.manifest_hash:
+                return False
+        except OSError:
+            return False
+        return all(manifest_shards.is_current(root, rel_path, recorded)
+                   for rel_path, recorded in self.shards.items())
+
+    # ---------------------------------------------------------------- documents
+
+    def __contains__(self, rel_path: str) -> bool:
+        return rel_path in self._ordinals
+
+    def signature(self, rel_path: str) -> tuple | None:
+        """(mtime_ns, size) the file had when the pack was built, or None"""
+        i = self._ordinals.get(rel_path)
+        return (self._mtime[i], self._size[i]) if i is not None else None
+
+    def signatures(self) -> dict[str, tuple]:
+        return {rel_path: (self._mtime[i], self._size[i]) for i, rel_path in enumerate(self.paths)}
+
+    def content_hash(self, rel_path: str) -> bytes | None:
+        """SHA-256 of the packed text (UTF-8, newlines normalized), or None"""
+        i = self._ordinals.get(rel_path)
+        return bytes(self._hash[i * _HASH_SIZE:(i + 1) * _HASH_SIZE]) if i is not None else None
+
+    def matches(self, rel_path: str, text: str) -> bool:
+        """True when `text` (as read from disk) is identical to the packed document"""
+        return content_hash(text) == self.content_hash(rel_path)
+
+    def text(self, rel_path: str) -> str:
+        i = self._ordinals[rel_path]
+        offset = self._offset[i]
+        return str(self._blobs[offset:offset + self._length[i]], "utf-8")
+
+    def text_if_current(self, root: Path, rel_path: str) -> str | None:
+        """The packed text when the file on disk still has its packed signature"""
+        signature = self.signature(rel_path)
+        try:
+            if signature is None or _stat(Path(root) / rel_path) != signature:
+                return None
+        except OSError:
+            return None
+        return self.text(rel_path)
+
+    def sections(self, rel_path: str) -> tuple[Section, ...]:
+        """The document's sections as split_sections() returns them, from the packed offsets"""
+        return sections_from_layout(self.text(rel_path), self.section_layout(rel_path))
+
+    def section_layout(self, rel_path: str) -> tuple[tuple, ...]:
+        """(id, title, level, breadcrumb, start, end) of each packed section (no text)"""
+        return _pack_layout(self, rel_path)
+
+
+@lru_cache(maxsize=1024)
+def _pack_layout(pack: ContextPack, rel_path: str) -> tuple[tuple, ...]:
+    i = pack._ordinals[rel_path]
+    first, last = pack.array("sec.index")[i:i + 2]
+    start, end, level = pack.array("sec.start"), pack.array("sec.end"), pack.array("sec.level")
+    sid, title = pack.array("sec.id"), pack.array("sec.title")
+    crumb_index, crumbs = pack.array("sec.crumb_index"), pack.array("sec.crumbs")
+    blob, index = pack.array("str.blob"), pack.array("str.index")
+
+    def string(k: int) -> str:
+        return str(blob[index[k]:index[k + 1]], "utf-8")
+
+    return tuple(
+        (string(sid[row]), string(title[row]), level[row],
+         tuple(string(k) for k in crumbs[crumb_index[row]:crumb_index[row + 1]]),
+         start[row], end[row])
+        for row in range(first, last)
+    )
+
+
+def open_pack(path) -> ContextPack | None:
+    """Open a pack, or return None (with a note on stderr) if it is missing or unreadable"""
+    if not Path(path).exists():
+        return None
+    try:
+        return ContextPack(path)
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        print(f"Ignoring context pack {path}: {e}", file=sys.stderr)
+        return None
+
+
+def attach_pack(store, path) -> ContextPack | None:
+    """
+    Open a pack and attach it to a store, so the store and the matchers built on
+    it use the pack. Returns None, leaving the store on the loose files, when the
+    pack is unusable or was built from a different manifest.
+    """
+    pack = open_pack(path)
+    if pack is None:
+        return None
+    if pack.manifest_path != store.manifest_path or not pack.manifest_is_current(store.root):
+        print(f"Ignoring context pack {path}: manifest changed since it was built "
+              f"(rebuild it with build-pack)", file=sys.stderr)
+        return None
+
+    previous = store.pack
+    store.attach_pack(pack)
+    register_matcher(pack.manifest, pack.matcher)
+    if previous is not None:
+        unregister_matcher(previous.manifest)
+    return pack
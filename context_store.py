@@ -0,0 +1,640 @@
+#!/usr/bin/env python3
+"""
+Shared in-memory document store for the context servers
+Loads the manifest and referenced markdown once and keeps them warm in memory
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import manifest_shards
+
+# Root directory of the context files (the repository root)
+ROOT = Path(__file__).resolve().parent
+
+MANIFEST_PATH = "context/manifest.json"
+BASE_PATH = "context/base.md"
+
+# Byte budget for cached documents (override with CONTEXT_CACHE_MAX_BYTES)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Seconds a cached entry is trusted before its mtime/size is checked again
+# (override with CONTEXT_REVALIDATE_SECONDS, 0 = stat on every access)
+DEFAULT_REVALIDATE_INTERVAL = 1.0
+
+# Threads used for file I/O from async code (override with CONTEXT_IO_WORKERS
+# or configure_io() at startup)
+DEFAULT_IO_WORKERS = 8
+
+# Context pack (see context_pack.py) that get_store() attaches instead of reading
+# every loose file; defaults to <root>/context/context.pack when that exists
+PACK_ENV = "CONTEXT_PACK"
+
+
+def _env_number(name: str, default, cast):
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        return default
+
+
+_io_executor: "ThreadPoolExecutor | None" = None
+_io_lock = threading.Lock()
+
+
+def configure_io(max_workers: int | None = None) -> "ThreadPoolExecutor":
+    """(Re)create the bounded thread pool used for file I/O from async code"""
+    from concurrent.futures import ThreadPoolExecutor
+    global _io_executor
+    if max_workers is None:
+        max_workers = _env_number("CONTEXT_IO_WORKERS", DEFAULT_IO_WORKERS, int)
+    with _io_lock:
+        old = _io_executor
+        _io_executor = ThreadPoolExecutor(max_workers=max(1, max_workers),
+                                          thread_name_prefix="context-io")
+    if old is not None:
+        old.shutdown(wait=False)
+    return _io_executor
+
+
+def io_executor() -> "ThreadPoolExecutor":
+    return _io_executor or configure_io()
+
+
+async def run_io(func, *args):
+    """Run a blocking call in the I/O thread pool without stalling the event loop"""
+    # asyncio and the thread pool are imported where they are used, so synchronous
+    # users (skills.py opening a pack) do not pay for importing them
+    import asyncio
+    loop = asyncio.get_running_loop()
+    # Run in a copy of the caller's context, so a pinned snapshot stays pinned
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(io_executor(), context.run, func, *args)
+
+
+class _Entry:
+    """A cached file together with the stat signature it was read at"""
+    __slots__ = ("value", "signature", "nbytes", "checked")
+
+    def __init__(self, value, signature: tuple, nbytes: int, checked: float):
+        self.value = value
+        self.signature = signature
+        self.nbytes = nbytes
+        self.checked = checked
+
+
+def _entry_text(rel_path: str, entry: _Entry) -> str:
+    """Text of a cached document; a packed one is decoded from the pack's shared mapping"""
+    value = entry.value
+    return value if isinstance(value, str) else value.text(rel_path)
+
+
+class Snapshot:
+    """
+    One consistent version of the context tree, built off the request path by the
+    watcher (see context_watcher.py) and never modified once published: the merged
+    manifest, the text and stat signature of every listed document, the parsed
+    manifest files it was merged from and the content index over its documents
+    """
+    __slots__ = ("manifest", "texts", "signatures", "sources", "version", "content_index")
+
+    def __init__(self, manifest: dict, texts: dict[str, str], signatures: dict[str, tuple],
+                 sources: dict[str, dict]):
+        self.manifest = manifest
+        self.texts = texts
+        self.signatures = signatures
+        self.sources = sources
+        self.version = None
+        self.content_index = None
+
+
+# (store, snapshot) pinned by DocumentStore.pinned() for the current thread or task
+_pinned: contextvars.ContextVar = contextvars.ContextVar("context_snapshot", default=None)
+
+
+class DocumentStore:
+    """
+    Keeps the manifest and context documents in memory.
+
+    Documents are held in an LRU bounded by `max_bytes` (charged by file size).
+    A cached entry is only re-validated with a cheap stat() once it is older than
+    `revalidate_interval` seconds, and only re-read when its mtime or size changed.
+
+    With a context pack attached, files whose stat signature still matches the
+    pack are decoded from it instead of being read from disk. Their cache entries
+    only hold the pack and the signature, and every read decodes a slice of the
+    pack's mapping, so workers sharing a pack do not each keep a decoded copy.
+
+    Once a watcher publishes a Snapshot, the manifest and the documents it lists
+    are served from that snapshot without any stat, until the next one replaces it.
+    """
+
+    def __init__(self, root: Path = ROOT, manifest_path: str = MANIFEST_PATH,
+                 max_bytes: int | None = None, revalidate_interval: float | None = None):
+        self.root = Path(root)
+        self.manifest_path = manifest_path
+        self.max_bytes = max_bytes if max_bytes is not None else \
+            _env_number("CONTEXT_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES, int)
+        self.revalidate_interval = revalidate_interval if revalidate_interval is not None else \
+            _env_number("CONTEXT_REVALIDATE_SECONDS", DEFAULT_REVALIDATE_INTERVAL, float)
+
+        self._lock = threading.Lock()
+        self._docs: OrderedDict[str, _Entry] = OrderedDict()
+        self._manifest: _Entry | None = None
+        # Sharded manifests: shards loaded so far, the router for the current root
+        # manifest and the merged manifest handed out for them
+        self._shards: dict[str, _Entry] = {}
+        self._router: tuple | None = None
+        self._routes_signature = None
+        self._merged: tuple | None = None
+        self._bytes = 0
+        # Last stat signature seen per path, kept even after eviction
+        self._signatures: dict[str, tuple] = {}
+        self._refreshed = float("-inf")
+        self.pack = None
+        # Signatures at which each file's content equals the attached pack
+        self._pack_signatures: dict[str, tuple] = {}
+        # Latest snapshot published by a watcher; replaced, never modified
+        self.live: Snapshot | None = None
+
+        # Bumped whenever the manifest or any cached document changes on disk
+        self.version = 0
+        self.manifest_version = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ------------------------------------------------------------------ helpers
+
+    def _stat(self, rel_path: str) -> tuple:
+        st = os.stat(self.root / rel_path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _is_fresh(self, rel_path: str, entry: _Entry, now: float) -> bool:
+        """Return True if the entry can be served, re-stat'ing it when due"""
+        if now - entry.checked < self.revalidate_interval:
+            return True
+        try:
+            signature = self._stat(rel_path)
+        except OSError:
+            return False
+        if signature != entry.signature:
+            return False
+        entry.checked = now
+        return True
+
+    # ----------------------------------------------------------------- manifest
+
+    def manifest(self) -> dict:
+        """
+        Return the parsed manifest, re-parsing only when the file changed. For a
+        sharded manifest ("include"), the documents of the shards loaded so far are
+        merged in; use manifest_for() or manifest_all() to load more.
+        """
+        live = self.snapshot()
+        if live is not None:
+            return live.manifest
+        root = self._root_manifest()
+        if not root.get("include"):
+            return root
+        return self._merged_manifest(root)
+
+    def manifest_for(self, *prompts: str) -> dict:
+        """manifest(), after loading every shard the prompts can possibly match"""
+        live = self.snapshot()
+        if live is not None:
+            return live.manifest
+        root = self._root_manifest()
+        if not root.get("include"):
+            return root
+        for rel_path in self._shard_router(root).route(prompts):
+            if rel_path not in self._shards:
+                self._load_shard(rel_path)
+        return self._merged_manifest(root)
+
+    def manifest_all(self) -> dict:
+        """manifest() with every shard loaded (listing, warming, packing)"""
+        live = self.snapshot()
+        if live is not None:
+            return live.manifest
+        root = self._root_manifest()
+        if not root.get("include"):
+            return root
+        for rel_path in manifest_shards.includes(root):
+            if rel_path not in self._shards:
+                self._load_shard(rel_path)
+        return self._merged_manifest(root)
+
+    def _root_manifest(self) -> dict:
+        now = time.monotonic()
+        entry = self._manifest
+        if entry is not None and self._is_fresh(self.manifest_path, entry, now):
+            return entry.value
+
+        signature = self._stat(self.manifest_path)
+        with open(self.root / self.manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        with self._lock:
+            self._manifest = _Entry(manifest, signature, signature[1], now)
+            self.manifest_version += 1
+            self.version += 1
+        return manifest
+
+    def _load_shard(self, rel_path: str):
+        try:
+            signature = self._stat(rel_path)
+        except OSError:
+            signature = None
+        shard = manifest_shards.read_shard(self.root, rel_path)
+        with self._lock:
+            if rel_path in self._shards:
+                # A changed shard: re-check the routing table against it
+                self._router = None
+            self._shards[rel_path] = _Entry(shard, signature, 0, time.monotonic())
+
+    def _shard_router(self, root: dict):
+        cached = self._router
+        if cached is not None and cached[0] is root:
+            return cached[1]
+        try:
+            self._routes_signature = self._stat(manifest_shards.routes_path(self.manifest_path))
+        except OSError:
+            self._routes_signature = None
+        router = manifest_shards.ShardRouter(
+            self.root, root, manifest_shards.read_routes(self.root, self.manifest_path))
+        self._router = (root, router)
+        return router
+
+    def _merged_manifest(self, root: dict) -> dict:
+        now = time.monotonic()
+        loaded = []
+        for rel_path in manifest_shards.includes(root):
+            entry = self._shards.get(rel_path)
+            if entry is None:
+                continue
+            if not self._is_fresh(rel_path, entry, now):
+                self._load_shard(rel_path)
+                entry = self._shards[rel_path]
+            loaded.append(entry)
+
+        key = (root, *loaded)
+        cached = self._merged
+        if cached is not None and len(cached[0]) == len(key) and \
+                all(a is b for a, b in zip(cached[0], key)):
+            return cached[1]
+        merged = manifest_shards.merge(root, [entry.value for entry in loaded])
+        with self._lock:
+            self._merged = (key, merged)
+            self.manifest_version += 1
+            self.version += 1
+        return merged
+
+    # ---------------------------------------------------------------- documents
+
+    def read_text(self, rel_path: str) -> str:
+        """Return the text of a file relative to root, from memory when possible"""
+        live = self.snapshot()
+        if live is not None:
+            text = live.texts.get(rel_path)
+            if text is not None:
+                self.hits += 1
+                return text
+        now = time.monotonic()
+        entry = self._docs.get(rel_path)
+        if entry is not None and self._is_fresh(rel_path, entry, now):
+            with self._lock:
+                if rel_path in self._docs:
+                    self._docs.move_to_end(rel_path)
+                self.hits += 1
+            return _entry_text(rel_path, entry)
+
+        signature = self._stat(rel_path)
+        pack = self.pack
+        if pack is not None and self._pack_signatures.get(rel_path) == signature:
+            # Nothing charged to the budget: the text stays in the (shared) pack
+            self._put(rel_path, _Entry(pack, signature, 0, now))
+            return pack.text(rel_path)
+        text = (self.root / rel_path).read_text(encoding="utf-8")
+        if pack is not None and rel_path in pack and pack.matches(rel_path, text):
+            # Touched but unchanged (e.g. a fresh checkout): keep using the pack
+            self._pack_signatures[rel_path] = signature
+            self._put(rel_path, _Entry(pack, signature, 0, now))
+        else:
+            self._put(rel_path, _Entry(text, signature, signature[1], now))
+        return text
+
+    # -------------------------------------------------------------------- packs
+
+    def attach_pack(self, pack):
+        """
+        Serve the manifest and unchanged documents from a context pack.
+
+        The pack's signatures are taken as the last known ones, so refresh() and
+        the per-entry stat checks notice files edited after the pack was built
+        and fall back to reading them from disk. The caller checks that the
+        manifest on disk is the one the pack was built from. A sharded manifest
+        is still read (and its shards loaded lazily) from disk.
+        """
+        try:
+            signature = self._stat(self.manifest_path)
+        except OSError:
+            signature = pack.manifest_signature
+        now = time.monotonic()
+        with self._lock:
+            self.pack = pack
+            self._pack_signatures = pack.signatures()
+            self._docs.clear()
+            self._bytes = 0
+            self._signatures.update(self._pack_signatures)
+            if not pack.sharded:
+                self._manifest = _Entry(pack.manifest, signature, signature[1], now)
+            self.manifest_version += 1
+            self.version += 1
+
+    def is_packed(self, rel_path: str) -> bool:
+        """True when rel_path is served from the attached pack (unchanged since it was built)"""
+        signature = self._pack_signatures.get(rel_path)
+        return signature is not None and self._signatures.get(rel_path) == signature
+
+    def _put(self, rel_path: str, entry: _Entry):
+        with self._lock:
+            self.misses += 1
+            known = self._signatures.get(rel_path)
+            if known is not None and known != entry.signature:
+                self.version += 1
+            self._signatures[rel_path] = entry.signature
+
+            old = self._docs.pop(rel_path, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+
+            # A single document larger than the whole budget is served uncached
+            if entry.nbytes > self.max_bytes:
+                return
+
+            self._docs[rel_path] = entry
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes and self._docs:
+                _, evicted = self._docs.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def refresh(self) -> int:
+        """
+        Stat every known file (at most once per revalidation interval) and bump the
+        version if any changed, so version-keyed caches downstream are invalidated
+        even for files that were not read recently. Returns the current version.
+        With a published snapshot the watcher does the sweeping, and this returns
+        the version of the snapshot in use.
+        """
+        live = self.snapshot()
+        if live is not None:
+            return live.version
+        now = time.monotonic()
+        if now - self._refreshed < self.revalidate_interval:
+            return self.version
+        self._refreshed = now
+
+        changed = False
+        for rel_path, signature in list(self._signatures.items()):
+            try:
+                current = self._stat(rel_path)
+            except OSError:
+                current = None
+            if current != signature:
+                changed = True
+                with self._lock:
+                    self._signatures[rel_path] = current
+                    entry = self._docs.pop(rel_path, None)
+                    if entry is not None:
+                        self._bytes -= entry.nbytes
+
+        manifest = self._manifest
+        if manifest is not None:
+            try:
+                current = self._stat(self.manifest_path)
+            except OSError:
+                current = None
+            if current != manifest.signature:
+                # Re-parsed (and manifest_version bumped) on the next manifest() call
+                self._manifest = None
+                changed = True
+
+        for rel_path, entry in list(self._shards.items()):
+            try:
+                current = self._stat(rel_path)
+            except OSError:
+                current = None
+            if current != entry.signature:
+                # Reloaded when a prompt next routes to it; its route may be stale too
+                with self._lock:
+                    self._shards.pop(rel_path, None)
+                    self._router = None
+                changed = True
+
+        if self._router is not None:
+            try:
+                current = self._stat(manifest_shards.routes_path(self.manifest_path))
+            except OSError:
+                current = None
+            if current != self._routes_signature:
+                self._router = None
+                changed = True
+
+        if changed:
+            with self._lock:
+                self.version += 1
+        return self.version
+
+    # ---------------------------------------------------------------- snapshots
+
+    def snapshot(self) -> Snapshot | None:
+        """The snapshot pinned for the current request, else the latest published one"""
+        pinned = _pinned.get()
+        if pinned is not None and pinned[0] is self:
+            return pinned[1]
+        return self.live
+
+    def publish(self, snapshot: Snapshot):
+        """
+        Make a snapshot the current version of the tree. The swap is a single
+        reference assignment: a request sees either the previous snapshot or this
+        one, never a mix, and requests pinned to the previous one finish with it.
+        """
+        with self._lock:
+            previous = self.live
+            self.version += 1
+            snapshot.version = self.version
+            if previous is None or previous.manifest is not snapshot.manifest:
+                self.manifest_version += 1
+            self._signatures.update(snapshot.signatures)
+            self.live = snapshot
+            # Listed documents are now held by the snapshot
+            for rel_path in snapshot.texts:
+                entry = self._docs.pop(rel_path, None)
+                if entry is not None:
+                    self._bytes -= entry.nbytes
+
+    @contextlib.contextmanager
+    def pinned(self):
+        """
+        Serve every manifest and document access inside the block (in this thread
+        or task, and the I/O calls it makes) from the snapshot that is current on
+        entry, even if a newer one is published meanwhile
+        """
+        live = self.snapshot()
+        if live is None:
+            yield None
+            return
+        token = _pinned.set((self, live))
+        try:
+            yield live
+        finally:
+            _pinned.reset(token)
+
+    # -------------------------------------------------------------------- async
+
+    def needs_io(self, rel_path: str) -> bool:
+        """True when reading rel_path would touch the disk (not cached, or stat due)"""
+        live = self.snapshot()
+        if live is not None and rel_path in live.texts:
+            return False
+        entry = self._docs.get(rel_path)
+        return entry is None or time.monotonic() - entry.checked >= self.revalidate_interval
+
+    async def manifest_async(self) -> dict:
+        """manifest(), with any parsing or stat done in the I/O thread pool"""
+        live = self.snapshot()
+        if live is not None:
+            return live.manifest
+        entry = self._manifest
+        if entry is not None and time.monotonic() - entry.checked < self.revalidate_interval \
+                and not entry.value.get("include"):
+            return entry.value
+        return await run_io(self.manifest)
+
+    async def manifest_for_async(self, *prompts: str) -> dict:
+        """manifest_for(), with the routed shards loaded in the I/O thread pool"""
+        live = self.snapshot()
+        if live is not None:
+            return live.manifest
+        entry = self._manifest
+        if entry is not None and time.monotonic() - entry.checked < self.revalidate_interval \
+                and not entry.value.get("include"):
+            return entry.value
+        return await run_io(self.manifest_for, *prompts)
+
+    async def read_text_async(self, rel_path: str) -> str:
+        """read_text(), with any disk access done in the I/O thread pool"""
+        if not self.needs_io(rel_path):
+            return self.read_text(rel_path)
+        return await run_io(self.read_text, rel_path)
+
+    async def read_many_async(self, paths: list[str]) -> list:
+        """
+        Read several files concurrently; only files that need disk access are
+        dispatched to the pool. Returns texts, or the exception raised per file.
+        """
+        results: list = [None] * len(paths)
+        pending = []
+        for i, rel_path in enumerate(paths):
+            if self.needs_io(rel_path):
+                pending.append(i)
+            else:
+                try:
+                    results[i] = self.read_text(rel_path)
+                except OSError as e:
+                    results[i] = e
+        if pending:
+            import asyncio
+            loaded = await asyncio.gather(*(run_io(self.read_text, paths[i]) for i in pending),
+                                          return_exceptions=True)
+            for i, value in zip(pending, loaded):
+                results[i] = value
+        return results
+
+    async def refresh_async(self) -> int:
+        """refresh(), with the stat sweep done in the I/O thread pool when due"""
+        live = self.snapshot()
+        if live is not None:
+            return live.version
+        if time.monotonic() - self._refreshed < self.revalidate_interval:
+            return self.version
+        return await run_io(self.refresh)
+
+    def warm(self):
+        """Load the manifest, base context and every referenced document"""
+        paths = [BASE_PATH] + [doc["path"] for doc in self.manifest_all().get("docs", [])]
+        for rel_path in paths:
+            try:
+                self.read_text(rel_path)
+            except OSError:
+                pass
+
+    def clear(self):
+        """Drop every cached entry (the next access re-reads from disk)"""
+        with self._lock:
+            self._docs.clear()
+            self._manifest = None
+            self._shards.clear()
+            self._router = None
+            self._bytes = 0
+            self.live = None
+            self.version += 1
+
+    def stats(self) -> dict:
+        """Return cache counters for diagnostics"""
+        return {
+            "documents": len(self._docs),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "version": self.version,
+        }
+
+
+_stores: dict[tuple, DocumentStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(root: Path = ROOT, manifest_path: str = MANIFEST_PATH) -> DocumentStore:
+    """
+    Return the process-wide store for a context root, warming it on first use.
+
+    When a current context pack is available ($CONTEXT_PACK, or the one written
+    by build-pack), the store attaches it instead of reading every file.
+    """
+    key = (str(Path(root).resolve()), manifest_path)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = DocumentStore(root, manifest_path)
+                if not _attach_default_pack(store):
+                    try:
+                        store.warm()
+                    except (OSError, ValueError):
+                        pass
+                _stores[key] = store
+    return store
+
+
+def _attach_default_pack(store: DocumentStore) -> bool:
+    # Imported here: context_pack builds on this module
+    from context_pack import DEFAULT_PACK_PATH, attach_pack
+    pack_path = os.environ.get(PACK_ENV) or store.root / DEFAULT_PACK_PATH
+    return attach_pack(store, pack_path) is not None
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Live reload of the context tree
+Watches the manifest, its shards and every listed document (inotify on Linux,
+a stat sweep elsewhere), rebuilds what changed in a background thread and
+publishes it to the store as one snapshot
+"""
+
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import sys
+import threading
+from pathlib import Path
+
+import fuzzy_matcher
+import manifest_shards
+from context_store import BASE_PATH, Snapshot, _entry_text, _env_number
+from keyword_matcher import matcher_for
+from search_index import ContentIndex
+
+# Live reload mode: "inotify", "poll", "auto"/"1" (inotify where available) or
+# "0"/"off" (default: off, files are stat'ed on access as before)
+WATCH_ENV = "CONTEXT_WATCH"
+
+# Seconds between stat sweeps when polling (override with CONTEXT_WATCH_INTERVAL)
+DEFAULT_POLL_INTERVAL = 1.0
+
+# Quiet time after a file event before rebuilding, so a burst of writes (an editor
+# save, a git checkout) is picked up with one rebuild
+DEBOUNCE_SECONDS = 0.05
+
+# inotify event bits (linux/inotify.h)
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+              IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+_EVENT = struct.Struct("iIII")
+
+
+def _signature(store, rel_path: str) -> tuple | None:
+    try:
+        return store._stat(rel_path)
+    except OSError:
+        return None
+
+
+def build_snapshot(store, previous: Snapshot | None = None) -> Snapshot:
+    """
+    Build the next snapshot of a store's tree, reusing everything from `previous`
+    whose stat signature is unchanged. Returns `previous` itself when nothing
+    changed. A manifest or shard that no longer parses (e.g. half-saved) keeps its
+    previous contents; the very first root manifest has to parse.
+    """
+    old_signatures = previous.signatures if previous is not None else {}
+    old_sources = previous.sources if previous is not None else {}
+    old_texts = previous.texts if previous is not None else {}
+    signatures, sources, texts = {}, {}, {}
+
+    def load_json(rel_path: str, required: bool) -> dict:
+        signature = _signature(store, rel_path)
+        signatures[rel_path] = signature
+        if rel_path in old_sources and old_signatures.get(rel_path) == signature:
+            return old_sources[rel_path]
+        if rel_path not in old_sources:
+            if required:
+                with open(store.root / rel_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            return manifest_shards.read_shard(store.root, rel_path)
+        try:
+            with open(store.root / rel_path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+            if isinstance(value, dict):
+                return value
+        except (OSError, ValueError) as e:
+            print(f"Keeping the previous {rel_path}: {e}", file=sys.stderr)
+        return old_sources[rel_path]
+
+    root = sources[store.manifest_path] = load_json(store.manifest_path, required=True)
+    shards = manifest_shards.includes(root)
+    for rel_path in shards:
+        sources[rel_path] = load_json(rel_path, required=False)
+
+    if previous is not None and all(sources[path] is old_sources.get(path) for path in sources) \
+            and len(sources) == len(old_sources):
+        manifest = previous.manifest
+    elif shards:
+        manifest = manifest_shards.merge(root, [sources[rel_path] for rel_path in shards])
+    else:
+        manifest = root
+
+    pack = store.pack
+    for rel_path in [BASE_PATH] + [doc["path"] for doc in manifest.get("docs", [])]:
+        if rel_path in texts:
+            continue
+        signature = _signature(store, rel_path)
+        if signature is None:
+            # Missing: served (or reported) from disk as before
+            continue
+        if old_signatures.get(rel_path) == signature and rel_path in old_texts:
+            text = old_texts[rel_path]
+        else:
+            entry = store._docs.get(rel_path)
+            try:
+                if entry is not None and entry.signature == signature:
+                    text = _entry_text(rel_path, entry)
+                elif pack is not None and store._pack_signatures.get(rel_path) == signature:
+                    text = pack.text(rel_path)
+                else:
+                    text = (store.root / rel_path).read_text(encoding="utf-8")
+            except (OSError, ValueError):
+                continue
+        signatures[rel_path] = signature
+        texts[rel_path] = text
+
+    if previous is not None and manifest is previous.manifest and texts.keys() == old_texts.keys() \
+            and all(text is old_texts[rel_path] for rel_path, text in texts.items()):
+        return previous
+    return Snapshot(manifest, texts, signatures, sources)
+
+
+class _Inotify:
+    """Minimal inotify binding (ctypes) watching a set of directories"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._dirs: dict[int, str] = {}
+        self._wds: dict[str, int] = {}
+
+    def watch(self, directories: set[str]):
+        """Watch exactly these (existing) directories"""
+        for directory in set(self._wds) - directories:
+            self._libc.inotify_rm_watch(self.fd, self._wds.pop(directory))
+        for directory in directories - set(self._wds):
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd >= 0:
+                self._wds[directory] = wd
+                self._dirs[wd] = directory
+
+    def read(self, timeout: float) -> list[str] | None:
+        """
+        Paths touched by the events that arrive within `timeout` seconds (empty on
+        timeout), or None when events were lost and everything has to be checked
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths, offset = [], 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            directory = self._dirs.get(wd)
+            if mask & IN_IGNORED:
+                # The directory itself is gone
+                self._dirs.pop(wd, None)
+                if self._wds.get(directory) == wd:
+                    del self._wds[directory]
+            if directory is not None:
+                paths.append(os.path.join(directory, os.fsdecode(name)) if name else directory)
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+def inotify_available() -> bool:
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        _Inotify().close()
+    except (OSError, AttributeError):
+        return False
+    return True
+
+
+class ContextWatcher:
+    """
+    Keeps a store's published snapshot in step with the files on disk.
+
+    start() publishes a first snapshot of the whole tree (every shard loaded),
+    then a background thread waits for file events (inotify) or sweeps stat
+    signatures every `interval` seconds (poll) and calls reload(). reload()
+    re-reads only the files whose signature changed, prebuilds the keyword
+    matcher for a changed manifest and the snapshot's content index, and
+    publishes the new snapshot with one reference swap, all off the request
+    path.
+    """
+
+    def __init__(self, store, backend: str = "auto", interval: float | None = None):
+        if backend == "auto":
+            backend = "inotify" if inotify_available() else "poll"
+        if backend not in ("inotify", "poll"):
+            raise ValueError(f"Unknown watch backend: {backend}")
+        self.store = store
+        self.backend = backend
+        self.interval = interval if interval is not None else \
+            _env_number("CONTEXT_WATCH_INTERVAL", DEFAULT_POLL_INTERVAL, float)
+        self.reloads = 0
+        self._inotify: _Inotify | None = None
+        self._files: set[str] = set()
+        self._dirs: set[str] = set()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def start(self) -> "ContextWatcher":
+        if self.backend == "inotify":
+            self._inotify = _Inotify()
+        self.reload()
+        self._thread = threading.Thread(target=self._run, name="context-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def reload(self) -> bool:
+        """Rebuild and publish a new snapshot if anything changed; True when published"""
+        with self._lock:
+            store = self.store
+            previous = store.live
+            try:
+                snapshot = build_snapshot(store, previous)
+            except (OSError, ValueError) as e:
+                print(f"Context reload failed: {e}", file=sys.stderr)
+                return False
+            if snapshot is previous:
+                return False
+            if previous is None or snapshot.manifest is not previous.manifest:
+                # Compile the matchers now rather than in the first request that needs them
+                matcher_for(snapshot.manifest)
+                if previous is not None and fuzzy_matcher.is_built(previous.manifest):
+                    fuzzy_matcher.fuzzy_matcher_for(snapshot.manifest)
+            # A separate content index, published with the manifest and texts it covers
+            previous_index = previous.content_index if previous is not None else None
+            snapshot.content_index = (previous_index or ContentIndex(store)).for_snapshot(snapshot)
+            store.publish(snapshot)
+            self.reloads += 1
+            if self._inotify is not None:
+                self._watch(snapshot)
+            return True
+
+    def _watch(self, snapshot: Snapshot):
+        """Watch the directory of every file the snapshot depends on (or its nearest existing parent)"""
+        root = self.store.root.resolve()
+        files = {str(root / rel_path) for rel_path in snapshot.sources}
+        files.update(str(root / doc["path"]) for doc in snapshot.manifest.get("docs", []))
+        files.add(str(root / BASE_PATH))
+        dirs, parents = set(), set()
+        for path in files:
+            parent = Path(path).parent
+            while parent != root and root in parent.parents:
+                parents.add(str(parent))
+                if parent.is_dir():
+                    break
+                parent = parent.parent
+            dirs.add(str(parent) if parent.is_dir() else str(root))
+        self._files, self._dirs = files, parents | {str(root)}
+        self._inotify.watch(dirs)
+
+    def _relevant(self, paths: list[str] | None) -> bool:
+        if paths is None:
+            return True
+        return any(path in self._files or path in self._dirs for path in paths)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            if self._inotify is None:
+                if self._stopping.wait(self.interval):
+                    return
+            else:
+                if not self._relevant(self._inotify.read(0.5)):
+                    continue
+                # Let the burst settle before rebuilding
+                while self._inotify.read(DEBOUNCE_SECONDS):
+                    pass
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"Context reload failed: {e}", file=sys.stderr)
+
+
+def start(store, mode: str | None = None) -> ContextWatcher | None:
+    """
+    Start live reload for a store as set by `mode` or $CONTEXT_WATCH. Returns the
+    running watcher, or None when live reload is off.
+    """
+    if mode is None:
+        mode = os.environ.get(WATCH_ENV, "")
+    mode = mode.strip().lower()
+    if mode in ("", "0", "off", "no", "false"):
+        return None
+    if mode in ("1", "on", "yes", "true"):
+        mode = "auto"
+    if mode == "inotify" and not inotify_available():
+        print("inotify is not available, polling for context changes instead", file=sys.stderr)
+        mode = "poll"
+    return ContextWatcher(store, mode).start()
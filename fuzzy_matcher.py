@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Typo-tolerant keyword matching with MinHash signatures and an LSH index
+Used as a fallback when no manifest keyword occurs in the prompt verbatim
+"""
+
+import re
+import threading
+import zlib
+
+from search_index import STOPWORDS
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Minimum Jaccard similarity of character bigrams for a fuzzy match
+# ("gmok" ~ "gmock" is 0.57, "test" ~ "gtest" 0.57, "fun" ~ "run" 0.33)
+MIN_SIMILARITY = 0.5
+
+# Shortest prompt word considered for fuzzy matching
+MIN_WORD_LENGTH = 4
+
+# Longest keyword or title (in words) matched as a phrase
+MAX_PHRASE_WORDS = 3
+
+# MinHash signature length, split into LSH bands of ROWS values each. Two
+# strings with similarity s share a bucket with probability 1 - (1 - s^ROWS)^BANDS
+# (0.96 at s=0.5, 0.99 at s=0.57), while unrelated strings rarely collide, so a
+# lookup verifies tens of candidates even among tens of thousands of keywords
+BANDS = 24
+ROWS = 3
+SIGNATURE_LENGTH = BANDS * ROWS
+
+# Sets hashed per vectorized pass (bounds the temporary hash matrix to a few MB)
+CHUNK_SETS = 4096
+
+
+def normalize(text: str) -> list[str]:
+    """Lowercase words, splitting on anything else ("EXPECT_CALL" -> ["expect", "call"])"""
+    return WORD_RE.findall(text.lower())
+
+
+def bigrams(phrase: str) -> frozenset:
+    """Character bigrams of a phrase, padded so first and last letters count"""
+    padded = f" {phrase} "
+    return frozenset(padded[i:i + 2] for i in range(len(padded) - 1))
+
+
+def title_of(rel_path: str) -> str:
+    """A document's title as matched by the fuzzy stage: its file name ("GTest_Mock")"""
+    return rel_path.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+
+
+def _hash_params():
+    """Fixed multiply-shift hash functions, identical in every process"""
+    # Imported here so processes that never fall back to fuzzy matching do not load NumPy
+    import numpy as np
+
+    rng = np.random.default_rng(0x5EED)
+    a = rng.integers(1, 2 ** 63, SIGNATURE_LENGTH, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2 ** 63, SIGNATURE_LENGTH, dtype=np.uint64)
+    return a, b
+
+
+_params = None
+
+
+def signatures(gram_sets: list[frozenset]):
+    """
+    MinHash signatures (one row of SIGNATURE_LENGTH values per set), computed for
+    all sets in vectorized passes of at most CHUNK_SETS sets
+    """
+    import numpy as np
+
+    global _params
+    if _params is None:
+        _params = _hash_params()
+    a, b = _params
+
+    rows = []
+    for first in range(0, len(gram_sets), CHUNK_SETS):
+        chunk = gram_sets[first:first + CHUNK_SETS]
+        hashes = np.fromiter((zlib.crc32(gram.encode("utf-8")) for grams in chunk for gram in grams),
+                             dtype=np.uint64)
+        starts = np.cumsum([0] + [len(grams) for grams in chunk[:-1]], dtype=np.int64)
+        with np.errstate(over="ignore"):
+            values = (hashes[:, None] * a + b) >> np.uint64(32)
+        rows.append(np.minimum.reduceat(values, starts, axis=0))
+    return rows[0] if len(rows) == 1 else np.concatenate(rows)
+
+
+def band_keys(signature_rows):
+    """
+    One bucket key per LSH band for each signature row; keys of different bands
+    never collide, so every band can share one index
+    """
+    import numpy as np
+
+    bands = signature_rows.reshape(len(signature_rows), BANDS, ROWS)
+    keys = np.arange(1, BANDS + 1, dtype=np.uint64)[None, :] * np.uint64(0xD6E8FEB86659FD93)
+    with np.errstate(over="ignore"):
+        for row in range(ROWS):
+            keys = keys * np.uint64(0x9E3779B97F4A7C15) ^ bands[:, :, row]
+    return keys
+
+
+class FuzzyMatcher:
+    """
+    Per-document fuzzy scorer over manifest keywords and document titles.
+
+    Every keyword and title gets a MinHash signature of its character bigrams,
+    and its band keys go into one sorted array, once per manifest. A lookup
+    hashes the prompt's words and runs of consecutive words, binary-searches
+    their band keys to collect the entries sharing a bucket with any of them and
+    keeps those whose exact bigram similarity reaches MIN_SIMILARITY, so its cost
+    barely grows with the size of the manifest.
+    """
+
+    def __init__(self, docs: list[dict], titles: bool = True):
+        phrases: dict[str, int] = {}
+        self._owners: list[list[int]] = []
+        for doc_index, doc in enumerate(docs):
+            for text in [*doc.get("when", []), *([title_of(doc["path"])] if titles else [])]:
+                words = normalize(text)
+                if not words or len(words) > MAX_PHRASE_WORDS:
+                    continue
+                phrase = " ".join(words)
+                index = phrases.get(phrase)
+                if index is None:
+                    index = phrases[phrase] = len(self._owners)
+                    self._owners.append([])
+                if doc_index not in self._owners[index]:
+                    self._owners[index].append(doc_index)
+
+        self.phrases = list(phrases)
+        self._grams = [bigrams(phrase) for phrase in self.phrases]
+        self._keys = self._entries = None
+        if self.phrases:
+            import numpy as np
+
+            keys = band_keys(signatures(self._grams)).ravel()
+            order = np.argsort(keys, kind="stable")
+            self._keys = keys[order]
+            self._entries = (order // BANDS).astype(np.int32)
+
+    def candidates(self, prompt: str) -> list[str]:
+        """Prompt words and runs of consecutive words that could match a phrase"""
+        words = normalize(prompt)
+        found = {}
+        for start in range(len(words)):
+            for length in range(1, MAX_PHRASE_WORDS + 1):
+                run = words[start:start + length]
+                if len(run) < length or any(word in STOPWORDS for word in run):
+                    break
+                phrase = " ".join(run)
+                if len(phrase) >= MIN_WORD_LENGTH:
+                    found[phrase] = None
+        return list(found)
+
+    def matched_phrases(self, prompt: str) -> dict[int, float]:
+        """Return {phrase index: best similarity to any part of the prompt}"""
+        queries = self.candidates(prompt)
+        if not queries or not self.phrases:
+            return {}
+        grams = [bigrams(query) for query in queries]
+        keys = band_keys(signatures(grams))
+        starts = self._keys.searchsorted(keys, "left").tolist()
+        ends = self._keys.searchsorted(keys, "right").tolist()
+        best: dict[int, float] = {}
+        for query_grams, row_starts, row_ends in zip(grams, starts, ends):
+            seen = set()
+            for start, end in zip(row_starts, row_ends):
+                if start != end:
+                    seen.update(self._entries[start:end].tolist())
+            for index in seen:
+                phrase_grams = self._grams[index]
+                similarity = len(query_grams & phrase_grams) / len(query_grams | phrase_grams)
+                if similarity >= MIN_SIMILARITY and similarity > best.get(index, 0.0):
+                    best[index] = similarity
+        return best
+
+    def match(self, prompt: str) -> dict[int, float]:
+        """Return {doc_index: summed similarity of its fuzzily matched keywords and title}"""
+        scores: dict[int, float] = {}
+        for index, similarity in self.matched_phrases(prompt).items():
+            for doc_index in self._owners[index]:
+                scores[doc_index] = scores.get(doc_index, 0.0) + similarity
+        return {doc_index: round(score, 3) for doc_index, score in scores.items()}
+
+
+_compiled: dict[int, tuple] = {}
+_compiled_lock = threading.Lock()
+
+
+def fuzzy_matcher_for(manifest: dict) -> FuzzyMatcher:
+    """
+    Return the fuzzy matcher for a manifest, building it once per manifest version
+    (the store hands out a new manifest object whenever the file changes)
+    """
+    entry = _compiled.get(id(manifest))
+    if entry is not None and entry[0] is manifest:
+        return entry[1]
+
+    matcher = FuzzyMatcher(manifest.get("docs", []))
+    with _compiled_lock:
+        if len(_compiled) >= 8:
+            _compiled.clear()
+        # Keep a reference to the manifest so its id cannot be reused while cached
+        _compiled[id(manifest)] = (manifest, matcher)
+    return matcher
+
+
+def is_built(manifest: dict) -> bool:
+    """True when the fuzzy matcher for this manifest object has been built"""
+    entry = _compiled.get(id(manifest))
+    return entry is not None and entry[0] is manifest
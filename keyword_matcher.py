@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Aho-Corasick keyword matcher compiled from the manifest "when" lists
+Scans a prompt once and yields per-document keyword hit counts
+"""
+
+import threading
+from array import array
+from bisect import bisect_left
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class AhoCorasick:
+    """
+    Multi-pattern string matcher.
+
+    All patterns are compiled into one automaton so a text is scanned in a single
+    pass, independent of how many patterns there are.
+    """
+
+    def __init__(self, patterns: list[str]):
+        self.patterns = list(patterns)
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[tuple[int, ...]] = [()]
+
+        for index, pattern in enumerate(self.patterns):
+            if pattern:
+                self._insert(pattern, index)
+        self._link()
+
+    def _insert(self, pattern: str, index: int):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] = self._out[state] + (index,)
+
+    def _link(self):
+        """Compute failure links breadth-first and merge outputs along them"""
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                if self._out[self._fail[nxt]]:
+                    self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter_matches(self, text: str):
+        """Yield (start, end, pattern_index) for every occurrence in text"""
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self.patterns
+        state = 0
+        for pos, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                end = pos + 1
+                for index in out[state]:
+                    yield end - len(patterns[index]), end, index
+
+    def to_arrays(self) -> dict[str, array]:
+        """
+        Flatten the automaton into int32 arrays (see FlatAutomaton) so it can be
+        written to a file and used in place, e.g. from a memory-mapped snapshot.
+        """
+        edge_index, edge_chars, edge_targets = array("i", [0]), array("i"), array("i")
+        out_index, out_list = array("i", [0]), array("i")
+        for goto, out in zip(self._goto, self._out):
+            for ch, target in sorted(goto.items()):
+                edge_chars.append(ord(ch))
+                edge_targets.append(target)
+            edge_index.append(len(edge_chars))
+            out_list.extend(out)
+            out_index.append(len(out_list))
+        return {
+            "edge_index": edge_index,
+            "edge_chars": edge_chars,
+            "edge_targets": edge_targets,
+            "fail": array("i", self._fail),
+            "out_index": out_index,
+            "out_list": out_list,
+            "pattern_lengths": array("i", (len(pattern) for pattern in self.patterns)),
+        }
+
+
+class FlatAutomaton:
+    """
+    Aho-Corasick automaton over flat integer arrays (from AhoCorasick.to_arrays).
+
+    The arrays can be any int sequences, including memoryviews of a shared
+    read-only file, so several processes can match against one copy. Each
+    state's edges are sorted by character and found by binary search.
+    """
+
+    def __init__(self, arrays: dict):
+        self._edge_index = arrays["edge_index"]
+        self._edge_chars = arrays["edge_chars"]
+        self._edge_targets = arrays["edge_targets"]
+        self._fail = arrays["fail"]
+        self._out_index = arrays["out_index"]
+        self._out_list = arrays["out_list"]
+        self._lengths = arrays["pattern_lengths"]
+
+    def iter_matches(self, text: str):
+        """Yield (start, end, pattern_index) for every occurrence in text"""
+        edge_index, chars, targets = self._edge_index, self._edge_chars, self._edge_targets
+        fail, out_index, out_list, lengths = self._fail, self._out_index, self._out_list, self._lengths
+        state = 0
+        for pos, ch in enumerate(text):
+            code = ord(ch)
+            while True:
+                lo, hi = edge_index[state], edge_index[state + 1]
+                i = bisect_left(chars, code, lo, hi)
+                if i < hi and chars[i] == code:
+                    state = targets[i]
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            first, last = out_index[state], out_index[state + 1]
+            if first != last:
+                end = pos + 1
+                for k in range(first, last):
+                    index = out_list[k]
+                    yield end - lengths[index], end, index
+
+
+class _Ragged:
+    """Read-only list of lists stored as (offsets, values) arrays"""
+
+    def __init__(self, offsets, values):
+        self._offsets = offsets
+        self._values = values
+
+    def __getitem__(self, index: int):
+        return self._values[self._offsets[index]:self._offsets[index + 1]]
+
+
+class KeywordMatcher:
+    """
+    Per-document keyword scorer built from manifest docs.
+
+    With `word_boundary` a keyword only counts when it starts at a word boundary,
+    so "run" matches "run" and "running" but no longer "truncate".
+    """
+
+    def __init__(self, docs: list[dict], word_boundary: bool = False):
+        self.word_boundary = word_boundary
+        keywords: dict[str, int] = {}
+        self._owners: list[list[int]] = []
+
+        for doc_index, doc in enumerate(docs):
+            for keyword in doc.get("when", []):
+                key = keyword.lower()
+                if not key:
+                    continue
+                index = keywords.get(key)
+                if index is None:
+                    index = keywords[key] = len(self._owners)
+                    self._owners.append([])
+                self._owners[index].append(doc_index)
+
+        self.keywords = list(keywords)
+        self._automaton = AhoCorasick(self.keywords)
+        self._word_start = [_is_word_char(keyword[0]) for keyword in self.keywords]
+
+    @classmethod
+    def from_arrays(cls, arrays: dict, word_boundary: bool = False) -> "KeywordMatcher":
+        """Rebuild a matcher from to_arrays() output without recompiling it"""
+        matcher = cls.__new__(cls)
+        matcher.word_boundary = word_boundary
+        matcher.keywords = None
+        matcher._automaton = FlatAutomaton(arrays)
+        matcher._owners = _Ragged(arrays["owner_index"], arrays["owner_docs"])
+        matcher._word_start = arrays["word_start"]
+        return matcher
+
+    def to_arrays(self) -> dict[str, array]:
+        """Flatten the automaton and keyword -> document table into int32 arrays"""
+        arrays = self._automaton.to_arrays()
+        owner_index, owner_docs = array("i", [0]), array("i")
+        for owners in self._owners:
+            owner_docs.extend(owners)
+            owner_index.append(len(owner_docs))
+        arrays["owner_index"] = owner_index
+        arrays["owner_docs"] = owner_docs
+        arrays["word_start"] = array("i", self._word_start)
+        return arrays
+
+    def matched_keywords(self, prompt: str) -> set[int]:
+        """Return the indices of keywords present in the prompt"""
+        text = prompt.lower()
+        found = set()
+        for start, _, index in self._automaton.iter_matches(text):
+            if index in found:
+                continue
+            if self.word_boundary and start > 0 and _is_word_char(text[start - 1]) \
+                    and self._word_start[index]:
+                continue
+            found.add(index)
+        return found
+
+    def match(self, prompt: str) -> dict[int, int]:
+        """Return {doc_index: number of its keywords found in the prompt}"""
+        hits: dict[int, int] = {}
+        for index in self.matched_keywords(prompt):
+            for doc_index in self._owners[index]:
+                hits[doc_index] = hits.get(doc_index, 0) + 1
+        return hits
+
+
+_compiled: dict[tuple, tuple] = {}
+_compiled_lock = threading.Lock()
+
+# Matchers loaded from a context pack; never evicted while their manifest is in use
+_pinned: dict[tuple, tuple] = {}
+
+
+def register_matcher(manifest: dict, matcher: KeywordMatcher):
+    """Make matcher_for() return a prebuilt matcher for this manifest object"""
+    with _compiled_lock:
+        _pinned[(id(manifest), matcher.word_boundary)] = (manifest, matcher)
+
+
+def unregister_matcher(manifest: dict):
+    """Drop the prebuilt matchers registered for a manifest object"""
+    with _compiled_lock:
+        for key in [key for key, entry in _pinned.items() if entry[0] is manifest]:
+            del _pinned[key]
+
+
+def matcher_for(manifest: dict, word_boundary: bool | None = None) -> KeywordMatcher:
+    """
+    Return the compiled matcher for a manifest, building it once per manifest version.
+
+    The store hands out a new manifest object whenever the file changes, so the
+    object identity doubles as the version. When `word_boundary` is None the
+    manifest's own "word_boundary" setting is used.
+    """
+    if word_boundary is None:
+        word_boundary = bool(manifest.get("word_boundary", False))
+    key = (id(manifest), word_boundary)
+    entry = _pinned.get(key) or _compiled.get(key)
+    if entry is not None and entry[0] is manifest:
+        return entry[1]
+
+    matcher = KeywordMatcher(manifest.get("docs", []), word_boundary)
+    with _compiled_lock:
+        if len(_compiled) >= 8:
+            _compiled.clear()
+        # Keep a reference to the manifest so its id cannot be reused while cached
+        _compiled[key] = (manifest, matcher)
+    return matcher
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Concurrent load generator for the HTTP/SSE MCP server
+Runs N simulated MCP clients against mcp_server_http (started in-process on
+localhost, or an already running server) and reports per-tool latency percentiles
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import uvicorn
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+
+OPERATIONS = ("initialize", "list_tools", "load_context", "get_context_file")
+
+
+class LocalServer:
+    """An ASGI app (default: mcp_server_http.app) served by uvicorn on a free localhost port, in a background thread"""
+
+    def __init__(self, app=None, host: str = "127.0.0.1"):
+        if app is None:
+            import mcp_server_http
+            app = mcp_server_http.app
+        config = uvicorn.Config(app, host=host, port=0, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, name="loadgen-server", daemon=True)
+        self.host = host
+        self.url = None
+
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if not self.thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("In-process server failed to start")
+            time.sleep(0.01)
+        port = self.server.servers[0].sockets[0].getsockname()[1]
+        self.url = f"http://{self.host}:{port}"
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+class Recorder:
+    """Latency samples and error counts per operation"""
+
+    def __init__(self):
+        self.samples = {op: [] for op in OPERATIONS}
+        self.errors = {op: 0 for op in OPERATIONS}
+
+    async def time(self, op: str, awaitable):
+        started = time.perf_counter()
+        try:
+            result = await awaitable
+        except Exception:
+            self.errors[op] += 1
+            raise
+        self.samples[op].append(time.perf_counter() - started)
+        if getattr(result, "isError", False) or _is_error_text(result):
+            self.errors[op] += 1
+        return result
+
+    def summary(self, elapsed: float) -> dict:
+        report = {}
+        for op in OPERATIONS:
+            samples = sorted(self.samples[op])
+            if not samples:
+                continue
+            report[op] = {
+                "count": len(samples),
+                "errors": self.errors[op],
+                "per_second": round(len(samples) / elapsed, 2),
+                "p50_ms": round(percentile(samples, 50) * 1000, 3),
+                "p95_ms": round(percentile(samples, 95) * 1000, 3),
+                "p99_ms": round(percentile(samples, 99) * 1000, 3),
+                "max_ms": round(samples[-1] * 1000, 3),
+            }
+        return report
+
+
+def percentile(sorted_samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    rank = math.ceil(pct / 100 * len(sorted_samples))
+    return sorted_samples[min(max(rank, 1), len(sorted_samples)) - 1]
+
+
+def _is_error_text(result) -> bool:
+    content = getattr(result, "content", None)
+    return bool(content) and getattr(content[0], "text", "").startswith("Error")
+
+
+def workload(seed: int = 0) -> tuple[list[str], list[str]]:
+    """Prompts built from the manifest's keywords, and the document paths to fetch"""
+    from context_store import ROOT, get_store
+    docs = get_store(ROOT).manifest().get("docs", [])
+    rng = random.Random(seed)
+    keywords = sorted({kw for doc in docs for kw in doc.get("when", [])}) or ["context"]
+    prompts = [f"how do I {' and '.join(rng.sample(keywords, min(2, len(keywords))))} in this project"
+               for _ in range(64)]
+    return prompts, [doc["path"] for doc in docs] or ["context/base.md"]
+
+
+async def run_client(url: str, rounds: int, prompts: list[str], paths: list[str],
+                     recorder: Recorder, rng: random.Random):
+    """One MCP session: initialize, list tools, then `rounds` load_context + get_context_file calls"""
+    async with sse_client(f"{url}/sse", timeout=30) as (read, write):
+        async with ClientSession(read, write) as session:
+            await recorder.time("initialize", session.initialize())
+            await recorder.time("list_tools", session.list_tools())
+            for _ in range(rounds):
+                await recorder.time("load_context", session.call_tool(
+                    "load_context", {"prompt": rng.choice(prompts)}))
+                await recorder.time("get_context_file", session.call_tool(
+                    "get_context_file", {"file_path": rng.choice(paths)}))
+
+
+async def generate_load(url: str, clients: int = 10, rounds: int = 20, seed: int = 0,
+                        ramp: float = 0.0) -> dict:
+    """Run `clients` concurrent sessions against url and return the report"""
+    prompts, paths = workload(seed)
+    recorder = Recorder()
+
+    async def client(i: int):
+        await asyncio.sleep(ramp * i / max(clients, 1))
+        await run_client(url, rounds, prompts, paths, recorder, random.Random(seed + i))
+
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*(client(i) for i in range(clients)), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    failed = [repr(o) for o in outcomes if isinstance(o, BaseException)]
+    total = sum(len(s) for s in recorder.samples.values())
+    return {
+        "url": url,
+        "clients": clients,
+        "rounds": rounds,
+        "elapsed_s": round(elapsed, 3),
+        "requests": total,
+        "requests_per_second": round(total / elapsed, 2) if elapsed else 0.0,
+        "failed_clients": len(failed),
+        "failures": failed[:5],
+        "operations": recorder.summary(elapsed),
+    }
+
+
+def print_report(report: dict):
+    print(f"{report['clients']} clients x {report['rounds']} rounds against {report['url']}")
+    print(f"{report['requests']} requests in {report['elapsed_s']:.2f}s "
+          f"({report['requests_per_second']:.1f} req/s), {report['failed_clients']} failed clients")
+    print(f"\n{'operation':18} {'count':>7} {'errors':>7} {'req/s':>9} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for op, stats in report["operations"].items():
+        print(f"{op:18} {stats['count']:>7} {stats['errors']:>7} {stats['per_second']:>9.1f} "
+              f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+    for failure in report["failures"]:
+        print(f"✗ {failure}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the MCP HTTP/SSE server with concurrent clients")
+    parser.add_argument("--url", help="Base URL of a running server (default: start one in-process)")
+    parser.add_argument("--clients", type=int, default=10, help="Concurrent MCP sessions (default: 10)")
+    parser.add_argument("--rounds", type=int, default=20,
+                        help="load_context + get_context_file pairs per session (default: 20)")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Seconds over which to start the clients")
+    parser.add_argument("--seed", type=int, default=0, help="Prompt selection seed (default: 0)")
+    parser.add_argument("--output", help="Also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    if args.url:
+        report = asyncio.run(generate_load(args.url.rstrip("/"), args.clients, args.rounds,
+                                           args.seed, args.ramp))
+    else:
+        with LocalServer() as server:
+            report = asyncio.run(generate_load(server.url, args.clients, args.rounds,
+                                               args.seed, args.ramp))
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\nReport written to {args.output}")
+    return 1 if report["failed_clients"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
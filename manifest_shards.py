@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Sharded manifests: a root manifest can include per-team shard manifests
+A keyword -> shard routing table decides which shards a prompt can match, so
+shards are only loaded once a prompt needs them
+"""
+
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+from fuzzy_matcher import FuzzyMatcher, title_of
+from keyword_matcher import KeywordMatcher
+
+# The routing table sits next to the root manifest: context/manifest.json ->
+# context/manifest.routes.json (written by `skills.py build-routes`)
+ROUTES_SUFFIX = ".routes.json"
+
+
+def includes(manifest: dict) -> list[str]:
+    """Shard manifest paths (relative to the context root) listed under "include" """
+    return list(dict.fromkeys(manifest.get("include", [])))
+
+
+def routes_path(manifest_path: str) -> str:
+    path = Path(manifest_path)
+    return str(path.with_name(path.stem + ROUTES_SUFFIX)).replace(os.sep, "/")
+
+
+def _stat(path: Path) -> tuple:
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def read_shard(root: Path, rel_path: str) -> dict:
+    """Parse one shard; a missing or broken shard contributes no documents"""
+    try:
+        with open(Path(root) / rel_path, 'r', encoding='utf-8') as f:
+            shard = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Skipping manifest shard {rel_path}: {e}", file=sys.stderr)
+        return {"docs": []}
+    return shard if isinstance(shard, dict) else {"docs": []}
+
+
+def merge(manifest: dict, shards: list[dict]) -> dict:
+    """
+    The root manifest with the documents of `shards` appended, in include order.
+    Settings such as word_boundary come from the root; a path listed twice keeps
+    its first entry.
+    """
+    merged = {key: value for key, value in manifest.items() if key != "include"}
+    docs = list(manifest.get("docs", []))
+    seen = {doc["path"] for doc in docs}
+    for shard in shards:
+        for doc in shard.get("docs", []):
+            if doc["path"] not in seen:
+                seen.add(doc["path"])
+                docs.append(doc)
+    merged["docs"] = docs
+    return merged
+
+
+def load_all(root: Path, manifest: dict) -> dict:
+    """The root manifest merged with every shard it includes"""
+    return merge(manifest, [read_shard(root, rel_path) for rel_path in includes(manifest)])
+
+
+def fingerprint(root: Path, rel_path: str) -> tuple[dict, bytes | None]:
+    """Stat signature and content hash of a shard (both None when it is missing), and its bytes"""
+    try:
+        # Stat before reading: a shard changed meanwhile then no longer matches
+        signature = _stat(Path(root) / rel_path)
+        data = (Path(root) / rel_path).read_bytes()
+    except OSError:
+        return {"signature": None, "hash": None}, None
+    return {"signature": list(signature), "hash": hashlib.sha256(data).hexdigest()}, data
+
+
+def build_routes(root: Path, manifest_path: str) -> Path:
+    """
+    Write the routing table for a sharded manifest: per shard, its stat signature,
+    content hash and every keyword its documents are matched on
+    """
+    root = Path(root)
+    with open(root / manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    shards = {}
+    for rel_path in includes(manifest):
+        route, data = fingerprint(root, rel_path)
+        if data is None:
+            continue
+        shard = json.loads(data)
+        route["keywords"] = sorted({keyword for doc in shard.get("docs", [])
+                                    for keyword in doc.get("when", [])})
+        route["titles"] = sorted({title_of(doc["path"]) for doc in shard.get("docs", [])})
+        shards[rel_path] = route
+    path = root / routes_path(manifest_path)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps({"shards": shards}, indent=1), encoding="utf-8")
+    os.replace(tmp, path)
+    return path
+
+
+def is_current(root: Path, rel_path: str, recorded: dict) -> bool:
+    """
+    True when a shard is still the one `recorded` by fingerprint(). Stat first; a
+    touched but unchanged shard (e.g. a fresh checkout) is recognised by its hash
+    """
+    path = Path(root) / rel_path
+    try:
+        if list(_stat(path)) == recorded.get("signature"):
+            return True
+        return hashlib.sha256(path.read_bytes()).hexdigest() == recorded.get("hash")
+    except OSError:
+        return recorded.get("hash") is None
+
+
+class ShardRouter:
+    """
+    Picks the shards a prompt can possibly match. A shard's keywords are matched
+    exactly as its documents' keywords are, so a shard is skipped only when none
+    of its documents could get a keyword hit. A prompt that matches no shard
+    exactly is matched fuzzily (typos) against the shards' keywords and titles.
+    Shards missing from the routing table, or changed since it was built, are
+    always loaded.
+    """
+
+    def __init__(self, root: Path, manifest: dict, routes: dict):
+        self.shards = includes(manifest)
+        table = routes.get("shards", {})
+        routed, self.eager = [], []
+        for rel_path in self.shards:
+            route = table.get(rel_path)
+            if route is not None and is_current(root, rel_path, route):
+                routed.append({"path": rel_path, "when": route.get("keywords", []),
+                               "titles": route.get("titles", [])})
+            else:
+                self.eager.append(rel_path)
+        self._routed = routed
+        self._matcher = KeywordMatcher(routed, bool(manifest.get("word_boundary", False)))
+        self._fuzzy = None
+
+    def route(self, prompts) -> list[str]:
+        """Shards needed by any of the prompts, in include order"""
+        needed = set(self.eager)
+        for prompt in prompts:
+            matched = self._matcher.match(prompt) or self._fuzzy_matcher().match(prompt)
+            needed.update(self._routed[i]["path"] for i in matched)
+        return [rel_path for rel_path in self.shards if rel_path in needed]
+
+    def _fuzzy_matcher(self) -> FuzzyMatcher:
+        if self._fuzzy is None:
+            self._fuzzy = FuzzyMatcher([{"path": route["path"], "when": route["when"] + route["titles"]}
+                                        for route in self._routed], titles=False)
+        return self._fuzzy
+
+
+def read_routes(root: Path, manifest_path: str) -> dict:
+    try:
+        with open(Path(root) / routes_path(manifest_path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
@@ -4,7 +4,6 @@ MCP Server for Context-Aware Documentation Loading
 Automatically loads relevant markdown context files based on prompt keywords
 """
 
-import json
 import asyncio
 from pathlib import Path
 from typing import Any
@@ -13,73 +12,134 @@ from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent, EmbeddedResource
 
+from chunking import document_sections, find_section, render_section
+from context_builder import plan_context, prefetch_context, render_batch_context, render_context
+from context_store import configure_io, get_store
+import context_watcher
+from response_cache import ResponseCache
+from routing import rank_docs, rank_docs_batch
+import tracing
+from tracing import span
+
 # Root directory of the context files
 ROOT = Path(__file__).resolve().parent
 
+# Shared in-memory store: the manifest and documents are read once and kept warm
+STORE = get_store(ROOT)
+
+# Cache of prebuilt load_context responses, invalidated when any document changes
+RESPONSE_CACHE = ResponseCache()
+
+# Upper bound on prompts per load_context_batch call
+MAX_BATCH_PROMPTS = 64
+
 def read_text(rel_path: str) -> str:
-    """Read text file relative to ROOT"""
+    """Read text file relative to ROOT (served from the in-memory store)"""
     try:
-        return (ROOT / rel_path).read_text(encoding="utf-8")
+        return STORE.read_text(rel_path)
     except Exception as e:
         return f"Error reading {rel_path}: {str(e)}"
 
-def load_manifest() -> dict:
-    """Load the context manifest configuration"""
+def load_manifest(*prompts: str, all_shards: bool = False) -> dict:
+    """
+    Load the context manifest configuration (cached until the file changes)
+    For a sharded manifest, the shards the prompts can match (or all of them) are loaded first
+    """
+    try:
+        if all_shards:
+            return STORE.manifest_all()
+        return STORE.manifest_for(*prompts)
+    except Exception as e:
+        return {"docs": []}
+
+async def load_manifest_async() -> dict:
+    """load_manifest without blocking the event loop"""
     try:
-        manifest_path = ROOT / "context" / "manifest.json"
-        with open(manifest_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return await STORE.manifest_async()
     except Exception as e:
         return {"docs": []}
 
-def select_relevant_docs(prompt: str, max_docs: int = 3) -> list[dict]:
+def select_relevant_docs(prompt: str, max_docs: int = 3, word_boundary: bool | None = None) -> list[dict]:
     """
     Intelligently select relevant documentation files based on prompt keywords
     Returns list of matching documents with their metadata
     """
-    manifest = load_manifest()
-    p = prompt.lower()
-    
-    scored = []
-    for doc in manifest.get("docs", []):
-        # Count keyword matches
-        hits = sum(1 for keyword in doc.get("when", []) if keyword.lower() in p)
-        if hits > 0:
-            scored.append({
-                "score": hits,
-                "path": doc["path"],
-                "keywords": doc.get("when", [])
-            })
-    
-    # Sort by score (highest first) and return top matches
-    scored.sort(key=lambda x: x["score"], reverse=True)
+    with span("match"):
+        manifest = load_manifest(prompt)
+        
+        # Keyword hits (single automaton pass) blended with BM25 over document contents,
+        # sorted by score (highest first)
+        scored = rank_docs(STORE, manifest, prompt, word_boundary)
     return scored[:max_docs]
 
-def build_context_response(prompt: str, include_base: bool = True) -> str:
-    """Build complete context including base and relevant docs"""
-    parts = []
-    
-    # Always include base context if requested
-    if include_base:
-        base_content = read_text("context/base.md")
-        parts.append("=== Base Context ===\n" + base_content)
-    
-    # Add relevant documentation
-    relevant = select_relevant_docs(prompt)
-    
-    if relevant:
-        parts.append("\n=== Relevant Documentation ===")
-        for doc in relevant:
-            content = read_text(doc["path"])
-            parts.append(f"\n--- {doc['path']} (matched keywords: {', '.join(doc['keywords'])}) ---\n{content}")
-    else:
-        parts.append("\n=== No specific documentation matched your query ===")
-    
-    return "\n\n".join(parts)
+def build_context_response(prompt: str, include_base: bool = True,
+                           max_tokens: int | None = None, max_docs: int = 3,
+                           sections: bool = True) -> str:
+    """
+    Build complete context including base and relevant docs
+    With sections, each doc is narrowed to the headings that match the prompt.
+    With max_tokens, the highest-scoring content is packed into the budget and
+    anything truncated or left out is reported at the end
+    """
+    def make_plan():
+        relevant = select_relevant_docs(prompt, max_docs)
+        with span("plan"):
+            return plan_context(STORE, relevant, prompt if sections else None)
+
+    def render(plan):
+        with span("render"):
+            return render_context(STORE, plan, include_base, max_tokens)
+
+    # Identical (normalized) prompts reuse their plan, and prompts selecting the same
+    # docs and sections share one prebuilt response until a document changes
+    return RESPONSE_CACHE.build(
+        STORE, prompt,
+        select_options=(max_docs, sections),
+        render_options=(include_base, max_tokens),
+        plan=make_plan,
+        render=render,
+    )
+
+async def build_context_response_async(prompt: str, include_base: bool = True,
+                                       max_tokens: int | None = None, max_docs: int = 3,
+                                       sections: bool = True) -> str:
+    """build_context_response for async handlers: file I/O happens off the event loop first"""
+    with span("prefetch", profile=False):
+        await prefetch_context(STORE, [prompt])
+    return build_context_response(prompt, include_base, max_tokens, max_docs, sections)
+
+def select_relevant_docs_batch(prompts: list[str], max_docs: int = 3,
+                               word_boundary: bool | None = None) -> list[list[dict]]:
+    """select_relevant_docs for many prompts, scored together in one vectorized pass"""
+    with span("match"):
+        manifest = load_manifest(*prompts)
+        return [scored[:max_docs] for scored in rank_docs_batch(STORE, manifest, prompts, word_boundary)]
+
+def build_batch_context_response(prompts: list[str], include_base: bool = True,
+                                 max_tokens: int | None = None, max_docs: int = 3,
+                                 sections: bool = True) -> str:
+    """
+    Build one response for several prompts: every document is read and included
+    once however many prompts select it, followed by the documents per prompt
+    """
+    selected = select_relevant_docs_batch(prompts, max_docs)
+    with span("plan"):
+        plans = [plan_context(STORE, relevant, prompt if sections else None)
+                 for prompt, relevant in zip(prompts, selected)]
+    with span("render"):
+        return render_batch_context(STORE, prompts, plans, include_base, max_tokens)
+
+async def build_batch_context_response_async(prompts: list[str], include_base: bool = True,
+                                              max_tokens: int | None = None, max_docs: int = 3,
+                                              sections: bool = True) -> str:
+    """build_batch_context_response for async handlers: file I/O happens off the event loop first"""
+    with span("prefetch", profile=False):
+        await prefetch_context(STORE, prompts)
+    return build_batch_context_response(prompts, include_base, max_tokens, max_docs, sections)
 
 def list_all_contexts() -> str:
     """List all available context files"""
-    manifest = load_manifest()
+    manifest = load_manifest(all_shards=True)
     
     result = ["Available Context Documents:\n"]
     for doc in manifest.get("docs", []):
@@ -112,11 +172,69 @@ async def list_tools() -> list[Tool]:
                         "type": "boolean",
                         "description": "Whether to include base.md context (default: true)",
                         "default": True
+                    },
+                    "max_tokens": {
+                        "type": "integer",
+                        "description": "Approximate token budget for the returned context. "
+                                       "The most relevant content is kept and anything cut is reported (default: no limit)",
+                        "minimum": 1
+                    },
+                    "max_docs": {
+                        "type": "integer",
+                        "description": "Maximum number of matched documents to include (default: 3)",
+                        "default": 3,
+                        "minimum": 1
+                    },
+                    "sections": {
+                        "type": "boolean",
+                        "description": "Return only the sections of each document that match the prompt, "
+                                       "with their heading breadcrumbs (default: true). Set false for whole documents",
+                        "default": True
                     }
                 },
                 "required": ["prompt"]
             }
         ),
+        Tool(
+            name="load_context_batch",
+            description="Load context for several prompts (e.g. the sub-tasks of a larger task) in one call. "
+                       "Documents needed by more than one prompt are returned once, followed by which "
+                       "documents and sections answer each prompt.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "prompts": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Questions or task descriptions, matched independently against available documentation.",
+                        "minItems": 1,
+                        "maxItems": MAX_BATCH_PROMPTS
+                    },
+                    "include_base": {
+                        "type": "boolean",
+                        "description": "Whether to include base.md context once (default: true)",
+                        "default": True
+                    },
+                    "max_tokens": {
+                        "type": "integer",
+                        "description": "Approximate token budget for the whole response (default: no limit)",
+                        "minimum": 1
+                    },
+                    "max_docs": {
+                        "type": "integer",
+                        "description": "Maximum number of matched documents per prompt (default: 3)",
+                        "default": 3,
+                        "minimum": 1
+                    },
+                    "sections": {
+                        "type": "boolean",
+                        "description": "Return only the matching sections of each document (default: true)",
+                        "default": True
+                    }
+                },
+                "required": ["prompts"]
+            }
+        ),
         Tool(
             name="list_contexts",
             description="List all available context/guideline documents and their trigger keywords. "
@@ -136,6 +254,11 @@ async def list_tools() -> list[Tool]:
                     "file_path": {
                         "type": "string",
                         "description": "Relative path to the context file (e.g., 'context/design/Design.md')"
+                    },
+                    "section": {
+                        "type": "string",
+                        "description": "Optional section ID (as shown by load_context, e.g. "
+                                       "'gtest-mock/common-matchers/cardinality') or heading title to fetch only that section"
                     }
                 },
                 "required": ["file_path"]
@@ -145,11 +268,26 @@ async def list_tools() -> list[Tool]:
 
 @app.call_tool()
 async def call_tool(name: str, arguments: Any) -> list[TextContent]:
-    """Handle tool calls"""
+    """
+    Handle tool calls, each against one consistent snapshot of the context (and,
+    with $CONTEXT_TRACE, traced stage by stage)
+    """
+    with tracing.request(name) as trace, STORE.pinned():
+        result = await dispatch_tool(name, arguments)
+        if trace is not None:
+            trace.set(status="error" if result[0].text.startswith("Error") else "ok",
+                      bytes=sum(len(content.text.encode("utf-8")) for content in result))
+        return result
+
+async def dispatch_tool(name: str, arguments: Any) -> list[TextContent]:
+    """Run a tool call"""
     
     if name == "load_context":
         prompt = arguments.get("prompt", "")
         include_base = arguments.get("include_base", True)
+        max_tokens = arguments.get("max_tokens")
+        max_docs = arguments.get("max_docs", 3)
+        sections = arguments.get("sections", True)
         
         if not prompt:
             return [TextContent(
@@ -157,10 +295,63 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
                 text="Error: Please provide a prompt to match against context files."
             )]
         
-        context = build_context_response(prompt, include_base)
+        try:
+            max_tokens = int(max_tokens) if max_tokens is not None else None
+            max_docs = int(max_docs)
+        except (TypeError, ValueError):
+            return [TextContent(
+                type="text",
+                text="Error: max_tokens and max_docs must be integers."
+            )]
+        if (max_tokens is not None and max_tokens < 1) or max_docs < 1:
+            return [TextContent(
+                type="text",
+                text="Error: max_tokens and max_docs must be at least 1."
+            )]
+        
+        context = await build_context_response_async(prompt, include_base, max_tokens, max_docs, sections)
+        return [TextContent(type="text", text=context)]
+    
+    elif name == "load_context_batch":
+        prompts = arguments.get("prompts")
+        include_base = arguments.get("include_base", True)
+        max_tokens = arguments.get("max_tokens")
+        max_docs = arguments.get("max_docs", 3)
+        sections = arguments.get("sections", True)
+        
+        if (not isinstance(prompts, list) or not prompts
+                or not all(isinstance(prompt, str) and prompt for prompt in prompts)):
+            return [TextContent(
+                type="text",
+                text="Error: Please provide prompts as a non-empty list of non-empty strings."
+            )]
+        if len(prompts) > MAX_BATCH_PROMPTS:
+            return [TextContent(
+                type="text",
+                text=f"Error: At most {MAX_BATCH_PROMPTS} prompts can be loaded in one call."
+            )]
+        
+        try:
+            max_tokens = int(max_tokens) if max_tokens is not None else None
+            max_docs = int(max_docs)
+        except (TypeError, ValueError):
+            return [TextContent(
+                type="text",
+                text="Error: max_tokens and max_docs must be integers."
+            )]
+        if (max_tokens is not None and max_tokens < 1) or max_docs < 1:
+            return [TextContent(
+                type="text",
+                text="Error: max_tokens and max_docs must be at least 1."
+            )]
+        
+        context = await build_batch_context_response_async(prompts, include_base, max_tokens,
+                                                           max_docs, sections)
         return [TextContent(type="text", text=context)]
     
     elif name == "list_contexts":
+        # Revalidate the manifest off the event loop; listing then reads it from memory
+        await load_manifest_async()
         contexts = list_all_contexts()
         return [TextContent(type="text", text=contexts)]
     
@@ -173,7 +364,30 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
                 text="Error: Please provide a file_path."
             )]
         
-        content = read_text(file_path)
+        try:
+            content = await STORE.read_text_async(file_path)
+        except Exception as e:
+            # Reported as the read error, whether or not a section was asked for
+            return [TextContent(
+                type="text",
+                text=f"=== {file_path} ===\n\nError reading {file_path}: {str(e)}"
+            )]
+        
+        section_id = arguments.get("section")
+        if section_id:
+            sections = document_sections(STORE, file_path, content)
+            section = find_section(content, section_id, sections)
+            if section is None:
+                available = ", ".join(s.id for s in sections) or "none"
+                return [TextContent(
+                    type="text",
+                    text=f"Error: Section '{section_id}' not found in {file_path}. Available sections: {available}"
+                )]
+            return [TextContent(
+                type="text",
+                text=f"=== {file_path} ({section.id}) ===\n\n{render_section(section)}"
+            )]
+        
         return [TextContent(
             type="text",
             text=f"=== {file_path} ===\n\n{content}"
@@ -185,14 +399,30 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
             text=f"Error: Unknown tool '{name}'"
         )]
 
-async def main():
+async def main(io_workers: int | None = None, watch: str | None = None):
     """Run the MCP server"""
-    async with stdio_server() as (read_stream, write_stream):
-        await app.run(
-            read_stream,
-            write_stream,
-            app.create_initialization_options()
-        )
+    configure_io(io_workers)
+    watcher = context_watcher.start(STORE, watch)
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await app.run(
+                read_stream,
+                write_stream,
+                app.create_initialization_options()
+            )
+    finally:
+        if watcher is not None:
+            watcher.stop()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="MCP Context Loader Server (stdio)")
+    parser.add_argument("--io-workers", type=int, default=None,
+                        help="Threads for file I/O (default: $CONTEXT_IO_WORKERS or 8)")
+    parser.add_argument("--watch", nargs="?", const="auto", default=None,
+                        choices=["auto", "inotify", "poll", "off"],
+                        help="Reload context files as they change (default: $CONTEXT_WATCH or off)")
+    args = parser.parse_args()
+    
+    asyncio.run(main(args.io_workers, args.watch))
@@ -4,85 +4,246 @@ MCP Server with HTTP/SSE transport for remote access
 Run this on a central server and clients can connect remotely
 """
 
-import json
 import asyncio
+import contextlib
+import os
+import shutil
+import tempfile
+import time
+import weakref
 from pathlib import Path
 from typing import Any
 
 from mcp.server import Server
 from mcp.server.sse import SseServerTransport
-from mcp.types import Tool, TextContent
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+from mcp.types import CallToolRequest, Tool, TextContent
 from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import PlainTextResponse
 from starlette.routing import Route
 import uvicorn
 
+from admission import Admission, AdmissionMiddleware, release_slot
+from chunking import document_sections, find_section, render_section
+from context_builder import (DeliveryLog, plan_context, prefetch_context, render_batch_context,
+                             render_context)
+from context_pack import build_pack
+from context_store import PACK_ENV, _env_number, configure_io, get_store
+import context_watcher
+from metrics import (COUNT_BUCKETS, LATENCY_BUCKETS, SIZE_BUCKETS, Counter, Gauge, Registry,
+                     monitor_loop_lag, text_size)
+from response_cache import ResponseCache
+from routing import rank_docs, rank_docs_batch
+from session_relay import RUN_DIR_ENV, SessionRelay
+import tracing
+from tracing import span
+
 # Root directory of the context files
 ROOT = Path(__file__).resolve().parent
 
+# Shared in-memory store: the manifest and documents are read once and kept warm
+STORE = get_store(ROOT)
+
+# Cache of prebuilt load_context responses, invalidated when any document changes
+RESPONSE_CACHE = ResponseCache()
+
+# Stateless streamable-HTTP endpoint: every POST is a complete exchange answered
+# with plain JSON, so any worker or replica behind a load balancer can serve it
+STREAMABLE_HTTP_PATH = "/mcp"
+
+# Limits on sessions, in-flight tool calls and per-client request rate, enforced
+# ahead of the endpoints (MCP_MAX_SESSIONS, MCP_MAX_TOOL_CALLS, MCP_RATE_LIMIT, ...)
+ADMISSION = Admission()
+
+# Upper bound on prompts per load_context_batch call
+MAX_BATCH_PROMPTS = 64
+
+# Per MCP session: the document versions it has already received. Entries go away
+# with the session object when its SSE connection closes
+DELIVERED: "weakref.WeakKeyDictionary[object, DeliveryLog]" = weakref.WeakKeyDictionary()
+
+# Number of worker processes serving the app (set by main() for --workers)
+WORKERS = _env_number("MCP_HTTP_WORKERS", 1, int)
+WORKER_ID = str(os.getpid())
+
+# Metrics served at /metrics. With several workers each one reports its own series,
+# labelled by worker
+METRICS = Registry({"worker": WORKER_ID} if WORKERS > 1 else None)
+TOOL_CALLS = METRICS.counter("mcp_tool_calls_total", "Tool calls by tool and outcome", ("tool", "status"))
+TOOL_LATENCY = METRICS.histogram("mcp_tool_latency_seconds", "Tool call latency",
+                                 LATENCY_BUCKETS, ("tool",))
+TOOL_BYTES = METRICS.histogram("mcp_tool_response_bytes", "UTF-8 size of tool responses",
+                               SIZE_BUCKETS, ("tool",))
+MATCHED_DOCS = METRICS.histogram("mcp_load_context_matched_docs",
+                                 "Documents included per load_context call", COUNT_BUCKETS)
+SSE_SESSIONS = METRICS.gauge("mcp_sse_sessions", "Open SSE sessions")
+SSE_SESSIONS_TOTAL = METRICS.counter("mcp_sse_sessions_total", "SSE sessions opened")
+LOOP_LAG = METRICS.gauge("mcp_event_loop_lag_seconds", "Most recent event loop wake-up delay")
+LOOP_LAG_SECONDS = METRICS.histogram("mcp_event_loop_lag_seconds_distribution",
+                                     "Event loop wake-up delay", LATENCY_BUCKETS)
+
+@METRICS.collector
+def cache_metrics():
+    """Cache counters are kept by the caches themselves and only read when scraped"""
+    hits = Counter("mcp_cache_hits_total", "Cache hits", ("cache",))
+    misses = Counter("mcp_cache_misses_total", "Cache misses", ("cache",))
+    ratio = Gauge("mcp_cache_hit_ratio", "Hits per lookup since start", ("cache",))
+    responses, documents = RESPONSE_CACHE.stats(), STORE.stats()
+    for cache, hit, miss in (("plan", responses["plan_hits"], responses["plan_misses"]),
+                             ("response", responses["response_hits"], responses["response_misses"]),
+                             ("document", documents["hits"], documents["misses"])):
+        hits.inc(cache, amount=hit)
+        misses.inc(cache, amount=miss)
+        ratio.set(hit / (hit + miss) if hit + miss else 0.0, cache)
+    cached = Gauge("mcp_document_cache_bytes", "Bytes of documents held in memory")
+    cached.set(documents["bytes"])
+    return hits, misses, ratio, cached
+
+@METRICS.collector
+def admission_metrics():
+    """Admission counters are kept by ADMISSION and only read when scraped"""
+    in_flight = Gauge("mcp_tool_calls_in_flight", "Tool calls holding an admission slot")
+    in_flight.set(ADMISSION.in_flight)
+    queued = Gauge("mcp_tool_calls_queued", "Tool calls waiting for an admission slot")
+    queued.set(ADMISSION.queued)
+    rejected = Counter("mcp_admission_rejected_total", "Requests rejected by admission control",
+                       ("reason",))
+    for reason, count in ADMISSION.rejected.items():
+        rejected.inc(reason, amount=count)
+    return in_flight, queued, rejected
+
 def read_text(rel_path: str) -> str:
-    """Read text file relative to ROOT"""
+    """Read text file relative to ROOT (served from the in-memory store)"""
     try:
-        return (ROOT / rel_path).read_text(encoding="utf-8")
+        return STORE.read_text(rel_path)
     except Exception as e:
         return f"Error reading {rel_path}: {str(e)}"
 
-def load_manifest() -> dict:
-    """Load the context manifest configuration"""
+def load_manifest(*prompts: str, all_shards: bool = False) -> dict:
+    """
+    Load the context manifest configuration (cached until the file changes)
+    For a sharded manifest, the shards the prompts can match (or all of them) are loaded first
+    """
+    try:
+        if all_shards:
+            return STORE.manifest_all()
+        return STORE.manifest_for(*prompts)
+    except Exception as e:
+        return {"docs": []}
+
+async def load_manifest_async() -> dict:
+    """load_manifest without blocking the event loop"""
     try:
-        manifest_path = ROOT / "context" / "manifest.json"
-        with open(manifest_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return await STORE.manifest_async()
     except Exception as e:
         return {"docs": []}
 
-def select_relevant_docs(prompt: str, max_docs: int = 3) -> list[dict]:
+def select_relevant_docs(prompt: str, max_docs: int = 3, word_boundary: bool | None = None) -> list[dict]:
     """
     Intelligently select relevant documentation files based on prompt keywords
     Returns list of matching documents with their metadata
     """
-    manifest = load_manifest()
-    p = prompt.lower()
-    
-    scored = []
-    for doc in manifest.get("docs", []):
-        # Count keyword matches
-        hits = sum(1 for keyword in doc.get("when", []) if keyword.lower() in p)
-        if hits > 0:
-            scored.append({
-                "score": hits,
-                "path": doc["path"],
-                "keywords": doc.get("when", [])
-            })
-    
-    # Sort by score (highest first) and return top matches
-    scored.sort(key=lambda x: x["score"], reverse=True)
+    with span("match"):
+        manifest = load_manifest(prompt)
+        
+        # Keyword hits (single automaton pass) blended with BM25 over document contents,
+        # sorted by score (highest first)
+        scored = rank_docs(STORE, manifest, prompt, word_boundary)
     return scored[:max_docs]
 
-def build_context_response(prompt: str, include_base: bool = True) -> str:
-    """Build complete context including base and relevant docs"""
-    parts = []
-    
-    # Always include base context if requested
-    if include_base:
-        base_content = read_text("context/base.md")
-        parts.append("=== Base Context ===\n" + base_content)
-    
-    # Add relevant documentation
-    relevant = select_relevant_docs(prompt)
-    
-    if relevant:
-        parts.append("\n=== Relevant Documentation ===")
-        for doc in relevant:
-            content = read_text(doc["path"])
-            parts.append(f"\n--- {doc['path']} (matched keywords: {', '.join(doc['keywords'])}) ---\n{content}")
-    else:
-        parts.append("\n=== No specific documentation matched your query ===")
-    
-    return "\n\n".join(parts)
+def plan_and_build_context(prompt: str, include_base: bool = True,
+                           max_tokens: int | None = None, max_docs: int = 3,
+                           sections: bool = True,
+                           delivered: DeliveryLog | None = None) -> tuple[tuple, str]:
+    """
+    Build complete context including base and relevant docs
+    With sections, each doc is narrowed to the headings that match the prompt.
+    With max_tokens, the highest-scoring content is packed into the budget and
+    anything truncated or left out is reported at the end
+    With a delivery log, documents the session already has are only referenced
+    Returns (plan, response); the plan lists the docs and sections included
+    """
+    def make_plan():
+        relevant = select_relevant_docs(prompt, max_docs)
+        with span("plan"):
+            return plan_context(STORE, relevant, prompt if sections else None)
+
+    def render(plan, delivered=None):
+        with span("render"):
+            return render_context(STORE, plan, include_base, max_tokens, delivered)
+
+    if delivered is not None:
+        # The response depends on what this session has seen, so only the plan is shared
+        plan = RESPONSE_CACHE.plan(STORE, prompt, (max_docs, sections), make_plan)
+        return plan, render(plan, delivered)
+
+    # Identical (normalized) prompts reuse their plan, and prompts selecting the same
+    # docs and sections share one prebuilt response until a document changes
+    return RESPONSE_CACHE.build_planned(
+        STORE, prompt,
+        select_options=(max_docs, sections),
+        render_options=(include_base, max_tokens),
+        plan=make_plan,
+        render=render,
+    )
+
+def build_context_response(prompt: str, include_base: bool = True,
+                           max_tokens: int | None = None, max_docs: int = 3,
+                           sections: bool = True) -> str:
+    """Build complete context including base and relevant docs (see plan_and_build_context)"""
+    return plan_and_build_context(prompt, include_base, max_tokens, max_docs, sections)[1]
+
+async def plan_and_build_context_async(prompt: str, include_base: bool = True,
+                                       max_tokens: int | None = None, max_docs: int = 3,
+                                       sections: bool = True,
+                                       delivered: DeliveryLog | None = None) -> tuple[tuple, str]:
+    """plan_and_build_context for async handlers: file I/O happens off the event loop first"""
+    with span("prefetch", profile=False):
+        await prefetch_context(STORE, [prompt])
+    return plan_and_build_context(prompt, include_base, max_tokens, max_docs, sections, delivered)
+
+async def build_context_response_async(prompt: str, include_base: bool = True,
+                                       max_tokens: int | None = None, max_docs: int = 3,
+                                       sections: bool = True) -> str:
+    """build_context_response for async handlers: file I/O happens off the event loop first"""
+    return (await plan_and_build_context_async(prompt, include_base, max_tokens, max_docs, sections))[1]
+
+def select_relevant_docs_batch(prompts: list[str], max_docs: int = 3,
+                               word_boundary: bool | None = None) -> list[list[dict]]:
+    """select_relevant_docs for many prompts, scored together in one vectorized pass"""
+    with span("match"):
+        manifest = load_manifest(*prompts)
+        return [scored[:max_docs] for scored in rank_docs_batch(STORE, manifest, prompts, word_boundary)]
+
+def plan_and_build_batch_context(prompts: list[str], include_base: bool = True,
+                                 max_tokens: int | None = None, max_docs: int = 3,
+                                 sections: bool = True,
+                                 delivered: DeliveryLog | None = None) -> tuple[list[tuple], str]:
+    """
+    Build one response for several prompts: every document is read and included
+    once however many prompts select it, followed by the documents per prompt
+    Returns (plans, response), one plan per prompt
+    """
+    selected = select_relevant_docs_batch(prompts, max_docs)
+    with span("plan"):
+        plans = [plan_context(STORE, relevant, prompt if sections else None)
+                 for prompt, relevant in zip(prompts, selected)]
+    with span("render"):
+        return plans, render_batch_context(STORE, prompts, plans, include_base, max_tokens, delivered)
+
+async def plan_and_build_batch_context_async(prompts: list[str], include_base: bool = True,
+                                             max_tokens: int | None = None, max_docs: int = 3,
+                                             sections: bool = True,
+                                             delivered: DeliveryLog | None = None) -> tuple[list[tuple], str]:
+    """plan_and_build_batch_context for async handlers: file I/O happens off the event loop first"""
+    with span("prefetch", profile=False):
+        await prefetch_context(STORE, prompts)
+    return plan_and_build_batch_context(prompts, include_base, max_tokens, max_docs, sections, delivered)
 
 def list_all_contexts() -> str:
     """List all available context files"""
-    manifest = load_manifest()
+    manifest = load_manifest(all_shards=True)
     
     result = ["Available Context Documents:\n"]
     for doc in manifest.get("docs", []):
@@ -95,6 +256,27 @@ def list_all_contexts() -> str:
 # Create MCP server instance
 mcp_server = Server("context-loader")
 
+def session_delivery_log(full: bool = False) -> DeliveryLog | None:
+    """
+    The delivery log of the MCP session making the current request, or None for
+    full output (requested, or no session, e.g. when called directly)
+    """
+    if full:
+        return None
+    try:
+        context = mcp_server.request_context
+    except LookupError:
+        return None
+    request = context.request
+    if request is not None and request.url.path == STREAMABLE_HTTP_PATH:
+        # Stateless: the session ends with the request, so there is nothing to diff against
+        return None
+    session = context.session
+    log = DELIVERED.get(session)
+    if log is None:
+        log = DELIVERED[session] = DeliveryLog()
+    return log
+
 @mcp_server.list_tools()
 async def list_tools() -> list[Tool]:
     """List available MCP tools"""
@@ -103,7 +285,8 @@ async def list_tools() -> list[Tool]:
             name="load_context",
             description="Automatically load relevant context/guideline markdown files based on your prompt. "
                        "The system intelligently matches keywords in your query to select the most relevant documentation. "
-                       "Use this when you need design guidelines, testing instructions, or architectural context.",
+                       "Use this when you need design guidelines, testing instructions, or architectural context. "
+                       "Documents already sent unchanged earlier in this session are referred to instead of repeated.",
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -115,11 +298,80 @@ async def list_tools() -> list[Tool]:
                         "type": "boolean",
                         "description": "Whether to include base.md context (default: true)",
                         "default": True
+                    },
+                    "max_tokens": {
+                        "type": "integer",
+                        "description": "Approximate token budget for the returned context. "
+                                       "The most relevant content is kept and anything cut is reported (default: no limit)",
+                        "minimum": 1
+                    },
+                    "max_docs": {
+                        "type": "integer",
+                        "description": "Maximum number of matched documents to include (default: 3)",
+                        "default": 3,
+                        "minimum": 1
+                    },
+                    "sections": {
+                        "type": "boolean",
+                        "description": "Return only the sections of each document that match the prompt, "
+                                       "with their heading breadcrumbs (default: true). Set false for whole documents",
+                        "default": True
+                    },
+                    "full": {
+                        "type": "boolean",
+                        "description": "Resend documents this session has already received unchanged "
+                                       "instead of referring to them (default: false)",
+                        "default": False
                     }
                 },
                 "required": ["prompt"]
             }
         ),
+        Tool(
+            name="load_context_batch",
+            description="Load context for several prompts (e.g. the sub-tasks of a larger task) in one call. "
+                       "Documents needed by more than one prompt are returned once, followed by which "
+                       "documents and sections answer each prompt.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "prompts": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Questions or task descriptions, matched independently against available documentation.",
+                        "minItems": 1,
+                        "maxItems": MAX_BATCH_PROMPTS
+                    },
+                    "include_base": {
+                        "type": "boolean",
+                        "description": "Whether to include base.md context once (default: true)",
+                        "default": True
+                    },
+                    "max_tokens": {
+                        "type": "integer",
+                        "description": "Approximate token budget for the whole response (default: no limit)",
+                        "minimum": 1
+                    },
+                    "max_docs": {
+                        "type": "integer",
+                        "description": "Maximum number of matched documents per prompt (default: 3)",
+                        "default": 3,
+                        "minimum": 1
+                    },
+                    "sections": {
+                        "type": "boolean",
+                        "description": "Return only the matching sections of each document (default: true)",
+                        "default": True
+                    },
+                    "full": {
+                        "type": "boolean",
+                        "description": "Resend documents this session has already received unchanged (default: false)",
+                        "default": False
+                    }
+                },
+                "required": ["prompts"]
+            }
+        ),
         Tool(
             name="list_contexts",
             description="List all available context/guideline documents and their trigger keywords. "
@@ -139,6 +391,11 @@ async def list_tools() -> list[Tool]:
                     "file_path": {
                         "type": "string",
                         "description": "Relative path to the context file (e.g., 'context/design/Design.md')"
+                    },
+                    "section": {
+                        "type": "string",
+                        "description": "Optional section ID (as shown by load_context, e.g. "
+                                       "'gtest-mock/common-matchers/cardinality') or heading title to fetch only that section"
                     }
                 },
                 "required": ["file_path"]
@@ -146,13 +403,81 @@ async def list_tools() -> list[Tool]:
         )
     ]
 
+TOOL_NAMES = ("load_context", "load_context_batch", "list_contexts", "get_context_file")
+
 @mcp_server.call_tool()
 async def call_tool(name: str, arguments: Any) -> list[TextContent]:
-    """Handle tool calls"""
+    """
+    Handle tool calls, recording count, latency and response size for /metrics
+    (and, with $CONTEXT_TRACE, a trace of the call's stages)
+    """
+    tool = name if name in TOOL_NAMES else "unknown"
+    status = "error"
+    started = time.perf_counter()
+    with tracing.request(tool) as trace:
+        if trace is not None:
+            trace.set(**request_ids())
+        try:
+            # One consistent snapshot of the context for the whole call, even if the
+            # watcher publishes a new one meanwhile
+            with STORE.pinned():
+                result = await dispatch_tool(name, arguments)
+            if not result[0].text.startswith("Error"):
+                status = "ok"
+            size = sum(text_size(content.text) for content in result)
+            TOOL_BYTES.observe(size, tool)
+            if trace is not None:
+                trace.set(status=status, bytes=size)
+            return result
+        finally:
+            TOOL_LATENCY.observe(time.perf_counter() - started, tool)
+            TOOL_CALLS.inc(tool, status)
+
+def request_ids() -> dict:
+    """
+    Session and JSON-RPC id of the current call, the same ids the sse_write trace
+    records carry, so a call's trace line joins with the write-out of its response
+    """
+    try:
+        context = mcp_server.request_context
+    except LookupError:
+        return {}
+    ids = {"request_id": context.request_id}
+    request = context.request
+    if request is not None and "session_id" in request.query_params:
+        ids["session"] = request.query_params["session_id"]
+    return ids
+
+def release_admission_slot():
+    """Free the tool call slot the admission middleware reserved for this call"""
+    try:
+        request = mcp_server.request_context.request
+    except LookupError:
+        return
+    if request is not None:
+        release_slot(request.scope)
+
+# The slot is released around the SDK's handler rather than in call_tool, so calls
+# the SDK answers itself (arguments failing the input schema) release it too
+_handle_call_tool = mcp_server.request_handlers[CallToolRequest]
+
+async def handle_call_tool(request: CallToolRequest):
+    try:
+        return await _handle_call_tool(request)
+    finally:
+        release_admission_slot()
+
+mcp_server.request_handlers[CallToolRequest] = handle_call_tool
+
+async def dispatch_tool(name: str, arguments: Any) -> list[TextContent]:
+    """Run a tool call"""
     
     if name == "load_context":
         prompt = arguments.get("prompt", "")
         include_base = arguments.get("include_base", True)
+        max_tokens = arguments.get("max_tokens")
+        max_docs = arguments.get("max_docs", 3)
+        sections = arguments.get("sections", True)
         
         if not prompt:
             return [TextContent(
@@ -160,10 +485,68 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
                 text="Error: Please provide a prompt to match against context files."
             )]
         
-        context = build_context_response(prompt, include_base)
+        try:
+            max_tokens = int(max_tokens) if max_tokens is not None else None
+            max_docs = int(max_docs)
+        except (TypeError, ValueError):
+            return [TextContent(
+                type="text",
+                text="Error: max_tokens and max_docs must be integers."
+            )]
+        if (max_tokens is not None and max_tokens < 1) or max_docs < 1:
+            return [TextContent(
+                type="text",
+                text="Error: max_tokens and max_docs must be at least 1."
+            )]
+        
+        plan, context = await plan_and_build_context_async(prompt, include_base, max_tokens, max_docs, sections,
+                                                           session_delivery_log(arguments.get("full", False)))
+        MATCHED_DOCS.observe(len(plan))
+        return [TextContent(type="text", text=context)]
+    
+    elif name == "load_context_batch":
+        prompts = arguments.get("prompts")
+        include_base = arguments.get("include_base", True)
+        max_tokens = arguments.get("max_tokens")
+        max_docs = arguments.get("max_docs", 3)
+        sections = arguments.get("sections", True)
+        
+        if (not isinstance(prompts, list) or not prompts
+                or not all(isinstance(prompt, str) and prompt for prompt in prompts)):
+            return [TextContent(
+                type="text",
+                text="Error: Please provide prompts as a non-empty list of non-empty strings."
+            )]
+        if len(prompts) > MAX_BATCH_PROMPTS:
+            return [TextContent(
+                type="text",
+                text=f"Error: At most {MAX_BATCH_PROMPTS} prompts can be loaded in one call."
+            )]
+        
+        try:
+            max_tokens = int(max_tokens) if max_tokens is not None else None
+            max_docs = int(max_docs)
+        except (TypeError, ValueError):
+            return [TextContent(
+                type="text",
+                text="Error: max_tokens and max_docs must be integers."
+            )]
+        if (max_tokens is not None and max_tokens < 1) or max_docs < 1:
+            return [TextContent(
+                type="text",
+                text="Error: max_tokens and max_docs must be at least 1."
+            )]
+        
+        plans, context = await plan_and_build_batch_context_async(
+            prompts, include_base, max_tokens, max_docs, sections,
+            session_delivery_log(arguments.get("full", False)))
+        for plan in plans:
+            MATCHED_DOCS.observe(len(plan))
         return [TextContent(type="text", text=context)]
     
     elif name == "list_contexts":
+        # Revalidate the manifest off the event loop; listing then reads it from memory
+        await load_manifest_async()
         contexts = list_all_contexts()
         return [TextContent(type="text", text=contexts)]
     
@@ -176,7 +559,30 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
                 text="Error: Please provide a file_path."
             )]
         
-        content = read_text(file_path)
+        try:
+            content = await STORE.read_text_async(file_path)
+        except Exception as e:
+            # Reported as the read error, whether or not a section was asked for
+            return [TextContent(
+                type="text",
+                text=f"=== {file_path} ===\n\nError reading {file_path}: {str(e)}"
+            )]
+        
+        section_id = arguments.get("section")
+        if section_id:
+            sections = document_sections(STORE, file_path, content)
+            section = find_section(content, section_id, sections)
+            if section is None:
+                available = ", ".join(s.id for s in sections) or "none"
+                return [TextContent(
+                    type="text",
+                    text=f"Error: Section '{section_id}' not found in {file_path}. Available sections: {available}"
+                )]
+            return [TextContent(
+                type="text",
+                text=f"=== {file_path} ({section.id}) ===\n\n{render_section(section)}"
+            )]
+        
         return [TextContent(
             type="text",
             text=f"=== {file_path} ===\n\n{content}"
@@ -188,48 +594,150 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
             text=f"Error: Unknown tool '{name}'"
         )]
 
-# Create Starlette app for SSE transport
-sse = SseServerTransport("/messages")
+# Create Starlette app for SSE transport. With several workers the message endpoint
+# names the worker holding the session, so POSTs can be relayed to it
+sse = SseServerTransport(f"/messages/{WORKER_ID}/" if WORKERS > 1 else "/messages")
 
 class SSEHandler:
     """ASGI app for SSE endpoint"""
     async def __call__(self, scope, receive, send):
-        async with sse.connect_sse(scope, receive, send) as streams:
-            await mcp_server.run(
-                streams[0],
-                streams[1],
-                mcp_server.create_initialization_options(),
-            )
+        SSE_SESSIONS.inc()
+        SSE_SESSIONS_TOTAL.inc()
+        try:
+            # With tracing on, every SSE write is timed (the response write-out)
+            async with sse.connect_sse(scope, receive, tracing.wrap_send(send)) as streams:
+                await mcp_server.run(
+                    streams[0],
+                    streams[1],
+                    mcp_server.create_initialization_options(),
+                )
+        finally:
+            SSE_SESSIONS.dec()
 
 class MessagesHandler:
     """ASGI app for messages endpoint"""
     async def __call__(self, scope, receive, send):
         await sse.handle_post_message(scope, receive, send)
 
-app = Starlette(
-    routes=[
-        Route("/sse", endpoint=SSEHandler()),
-        Route("/messages", endpoint=MessagesHandler(), methods=["POST"]),
-    ],
-)
+class StreamableHTTPHandler:
+    """ASGI app for the stateless streamable-HTTP endpoint"""
+    async def __call__(self, scope, receive, send):
+        # The session manager of this server run (see lifespan)
+        await scope["state"]["streamable_http"].handle_request(scope, receive, send)
+
+def relayed(scope) -> bool:
+    """True for a message POST to a session held by another worker"""
+    return WORKERS > 1 and scope["path"].startswith("/messages/") and \
+        not scope["path"].startswith(f"/messages/{WORKER_ID}/")
+
+# Relayed POSTs are admitted by the worker that runs them (their rate was charged
+# by the worker the client reached)
+RELAY = SessionRelay(os.environ[RUN_DIR_ENV], WORKER_ID,
+                     AdmissionMiddleware(MessagesHandler(), ADMISSION, limit_rate=False)) \
+    if WORKERS > 1 else None
+
+class WorkerMessagesHandler:
+    """ASGI app for /messages/{worker}/: handle locally or relay to the session's worker"""
+    async def __call__(self, scope, receive, send):
+        worker = scope["path_params"]["worker"]
+        if worker == WORKER_ID:
+            await sse.handle_post_message(scope, receive, send)
+        else:
+            await RELAY.forward(worker, scope, receive, send)
+
+async def metrics(request):
+    """Prometheus text exposition of the server metrics"""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    lag_monitor = asyncio.create_task(monitor_loop_lag(LOOP_LAG, LOOP_LAG_SECONDS))
+    if RELAY is not None:
+        await RELAY.start()
+    # Live reload ($CONTEXT_WATCH), one watcher per worker process
+    watcher = context_watcher.start(STORE)
+    # A session manager runs only once, so each server run gets its own
+    streamable_http = StreamableHTTPSessionManager(app=mcp_server, stateless=True, json_response=True)
+    try:
+        async with streamable_http.run():
+            yield {"streamable_http": streamable_http}
+    finally:
+        lag_monitor.cancel()
+        if watcher is not None:
+            watcher.stop()
+        if RELAY is not None:
+            await RELAY.stop()
 
-def main(host: str = "0.0.0.0", port: int = 7000):
+routes = [
+    Route("/sse", endpoint=SSEHandler()),
+    Route("/messages", endpoint=MessagesHandler(), methods=["POST"]),
+    Route(STREAMABLE_HTTP_PATH, endpoint=StreamableHTTPHandler(), methods=["GET", "POST", "DELETE"]),
+    Route("/metrics", endpoint=metrics),
+]
+if WORKERS > 1:
+    routes.append(Route("/messages/{worker}/", endpoint=WorkerMessagesHandler(), methods=["POST"]))
+
+# Admission control runs ahead of SSEHandler, MessagesHandler and the /mcp endpoint
+app = Starlette(routes=routes, lifespan=lifespan,
+                middleware=[Middleware(AdmissionMiddleware, admission=ADMISSION, relayed=relayed)])
+
+def serve_workers(host: str, port: int, workers: int, io_workers: int | None = None):
+    """
+    Run `workers` uvicorn processes. The manifest, documents and matching indexes
+    are compiled once into a snapshot pack that every worker memory-maps.
+    """
+    run_dir = tempfile.mkdtemp(prefix="mcp-context-")
+    try:
+        pack = build_pack(Path(run_dir) / "snapshot.pack", ROOT, STORE.manifest_path)
+        os.environ[PACK_ENV] = str(pack)
+        os.environ[RUN_DIR_ENV] = run_dir
+        os.environ["MCP_HTTP_WORKERS"] = str(workers)
+        if io_workers is not None:
+            os.environ["CONTEXT_IO_WORKERS"] = str(io_workers)
+        uvicorn.run("mcp_server_http:app", host=host, port=port, workers=workers,
+                    app_dir=str(ROOT))
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+def main(host: str = "0.0.0.0", port: int = 7000, io_workers: int | None = None,
+         workers: int = 1, watch: str | None = None):
     """Run the MCP server over HTTP"""
+    configure_io(io_workers)
+    if watch is not None:
+        # Read by every worker's lifespan
+        os.environ[context_watcher.WATCH_ENV] = watch
+    
     print(f"🚀 Starting MCP Context Loader Server")
     print(f"📡 Server running at: http://{host}:{port}")
     print(f"🔗 SSE Endpoint: http://{host}:{port}/sse")
-    print(f"📋 Loaded {len(load_manifest().get('docs', []))} context documents")
+    print(f"🔗 Streamable HTTP Endpoint (stateless): http://{host}:{port}{STREAMABLE_HTTP_PATH}")
+    print(f"📈 Metrics: http://{host}:{port}/metrics")
+    print(f"📋 Loaded {len(load_manifest(all_shards=True).get('docs', []))} context documents")
+    if workers > 1:
+        print(f"⚙️  Worker processes: {workers} (sharing one snapshot)")
     print("\nClients should configure:")
     print(f'  "url": "http://{host}:{port}/sse"')
     print("\nPress Ctrl+C to stop")
     
-    uvicorn.run(app, host=host, port=port)
+    if workers > 1:
+        serve_workers(host, port, workers, io_workers)
+    else:
+        uvicorn.run(app, host=host, port=port)
 
 if __name__ == "__main__":
-    import sys
+    import argparse
     
     # Parse command line arguments
-    host = sys.argv[1] if len(sys.argv) > 1 else "0.0.0.0"
-    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8000
+    parser = argparse.ArgumentParser(description="MCP Context Loader Server (HTTP/SSE)")
+    parser.add_argument("host", nargs="?", default="0.0.0.0", help="Interface to bind (default: 0.0.0.0)")
+    parser.add_argument("port", nargs="?", type=int, default=8000, help="Port to listen on (default: 8000)")
+    parser.add_argument("--io-workers", type=int, default=None,
+                        help="Threads for file I/O (default: $CONTEXT_IO_WORKERS or 8)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes sharing one snapshot of the context (default: 1)")
+    parser.add_argument("--watch", nargs="?", const="auto", default=None,
+                        choices=["auto", "inotify", "poll", "off"],
+                        help="Reload context files as they change (default: $CONTEXT_WATCH or off)")
+    args = parser.parse_args()
     
-    main(host, port)
+    main(args.host, args.port, args.io_workers, args.workers, args.watch)
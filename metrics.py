@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Minimal Prometheus-style metrics for the HTTP server
+Counters, gauges and histograms rendered in the Prometheus text exposition format
+"""
+
+import asyncio
+import math
+import time
+from bisect import bisect_left
+
+# Seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# Documents
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        # Unlabelled metrics are exported as 0 before their first update
+        self._values: dict[tuple, float] = {} if self.labels else {(): 0}
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self, const: tuple = ((), ())) -> list[str]:
+        names, values = const
+        lines = self.header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(names + self.labels, values + key)} "
+                         f"{_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic count. Updated from the event loop thread only, so no lock is taken"""
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    """Distribution over fixed buckets: one bisect and two additions per observation"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: tuple, labels: tuple = ()):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self, const: tuple = ((), ())) -> list[str]:
+        names, values = const
+        names = names + self.labels
+        lines = self.header()
+        for key, (counts, total) in sorted(self._series.items()):
+            labels = values + key
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(names, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(names, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    A set of metrics plus collectors. Collectors are called at scrape time to
+    read values kept elsewhere (e.g. cache counters), so they cost nothing
+    between scrapes.
+    """
+
+    def __init__(self, const_labels: dict | None = None):
+        self._metrics: list[_Metric] = []
+        self._collectors = []
+        const_labels = const_labels or {}
+        self._const = (tuple(const_labels), tuple(str(v) for v in const_labels.values()))
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: tuple = ()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: tuple = ()) -> Gauge:
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, buckets: tuple, labels: tuple = ()) -> Histogram:
+        return self.register(Histogram(name, help_text, buckets, labels))
+
+    def collector(self, func):
+        """Register func() -> iterable of metrics, rebuilt on every scrape"""
+        self._collectors.append(func)
+        return func
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(self._const))
+        for collect in self._collectors:
+            for metric in collect():
+                lines.extend(metric.render(self._const))
+        return "\n".join(lines) + "\n"
+
+
+def text_size(text: str) -> int:
+    """UTF-8 size of a string; free for ASCII text, which is most context"""
+    return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+
+async def monitor_loop_lag(gauge: Gauge, histogram: Histogram | None = None,
+                           interval: float = 0.5):
+    """
+    Measure how late the event loop wakes up from a sleep. Lag means something
+    is blocking the loop (CPU-heavy work or blocking I/O in a handler).
+    """
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(time.perf_counter() - started - interval, 0.0)
+        gauge.set(lag)
+        if histogram is not None:
+            histogram.observe(lag)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+LRU + TTL cache in front of build_context_response
+Prompts are mapped to a context plan, and identical plans share one prebuilt response
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from context_store import _env_number
+
+# Entries kept per cache level (override with CONTEXT_RESPONSE_CACHE_SIZE, 0 disables)
+DEFAULT_MAX_ENTRIES = 1024
+
+# Seconds an entry stays valid (override with CONTEXT_RESPONSE_CACHE_TTL)
+DEFAULT_TTL = 300.0
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case and whitespace do not change matching, so they do not split the cache"""
+    return _WHITESPACE_RE.sub(" ", prompt).strip().lower()
+
+
+class LRUCache:
+    """Thread-safe LRU mapping whose entries also expire after `ttl` seconds"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key):
+        """Return the cached value or None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class ResponseCache:
+    """
+    Two-level cache for load_context responses.
+
+    1. (normalized prompt, options, store version) -> plan (docs and sections chosen)
+    2. (plan, render options, store version) -> response string
+
+    Different prompts that select the same plan share one response string. The
+    store version changes whenever a document or the manifest changes on disk, so
+    stale entries are never served; they simply age out.
+    """
+
+    def __init__(self, max_entries: int | None = None, ttl: float | None = None):
+        if max_entries is None:
+            max_entries = _env_number("CONTEXT_RESPONSE_CACHE_SIZE", DEFAULT_MAX_ENTRIES, int)
+        if ttl is None:
+            ttl = _env_number("CONTEXT_RESPONSE_CACHE_TTL", DEFAULT_TTL, float)
+        self.plans = LRUCache(max_entries, ttl)
+        self.responses = LRUCache(max_entries, ttl)
+
+    def build(self, store, prompt: str, select_options: tuple, render_options: tuple,
+              plan, render) -> str:
+        """
+        Return the response for a prompt, calling plan() and render(plan) only on misses.
+
+        `select_options` are the arguments that influence which docs/sections are
+        chosen, `render_options` those that only influence how they are rendered.
+        """
+        return self.build_planned(store, prompt, select_options, render_options, plan, render)[1]
+
+    def build_planned(self, store, prompt: str, select_options: tuple, render_options: tuple,
+                      plan, render) -> tuple[tuple, str]:
+        """build(), also returning the plan the response was rendered from"""
+        version = store.refresh()
+        planned = self._plan(prompt, select_options, version, plan)
+
+        response_key = (planned, render_options, version)
+        response = self.responses.get(response_key)
+        if response is None:
+            response = render(planned)
+            self.responses.put(response_key, response)
+        return planned, response
+
+    def plan(self, store, prompt: str, select_options: tuple, plan) -> tuple:
+        """Only the first level: the (cached) plan for a prompt, for callers that render it themselves"""
+        return self._plan(prompt, select_options, store.refresh(), plan)
+
+    def _plan(self, prompt: str, select_options: tuple, version, plan) -> tuple:
+        plan_key = (normalize_prompt(prompt), select_options, version)
+        planned = self.plans.get(plan_key)
+        if planned is None:
+            planned = plan()
+            self.plans.put(plan_key, planned)
+        return planned
+
+    def clear(self):
+        self.plans.clear()
+        self.responses.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters for both levels"""
+        return {
+            "plan_hits": self.plans.hits,
+            "plan_misses": self.plans.misses,
+            "response_hits": self.responses.hits,
+            "response_misses": self.responses.misses,
+            "plans": len(self.plans),
+            "responses": len(self.responses),
+        }
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Document ranking shared by the MCP servers and the agent
+Blends manifest keyword hits with BM25 scores over document contents
+"""
+
+from itertools import chain
+
+from fuzzy_matcher import fuzzy_matcher_for
+from keyword_matcher import matcher_for
+from search_index import content_index_for
+
+# Weight of the (saturated) content score relative to one keyword hit
+CONTENT_WEIGHT = 1.0
+
+# Half-saturation point of the content score: bm25 / (bm25 + CONTENT_SATURATION)
+CONTENT_SATURATION = 4.0
+
+# Minimum raw BM25 score for a document with no keyword hits to be selected
+CONTENT_MIN_SCORE = 3.0
+
+
+def rank_docs(store, manifest: dict, prompt: str, word_boundary: bool | None = None,
+              use_content: bool = True, fuzzy: bool = True) -> list[dict]:
+    """
+    Score every manifest document against a prompt, best first.
+
+    A document is selected when one of its keywords matches, or when its content
+    alone scores at least CONTENT_MIN_SCORE. Keyword hits dominate the ranking;
+    the content score adds less than one hit and breaks ties. When no keyword
+    matches exactly, keywords and titles matched despite typos ("gmok", "expect
+    call") count instead: each adds its similarity (below one hit), so a document
+    with several near matches can score more than one.
+    """
+    docs = manifest.get("docs", [])
+    hits = matcher_for(manifest, word_boundary).match(prompt)
+    near = fuzzy_matcher_for(manifest).match(prompt) if fuzzy and not hits else {}
+    content = content_index_for(store).scores(manifest, prompt) if use_content else {}
+
+    scored = []
+    for doc_index, doc in enumerate(docs):
+        keyword_hits = hits.get(doc_index, 0)
+        fuzzy_score = near.get(doc_index, 0.0)
+        bm25 = content.get(doc["path"], 0.0)
+        if not keyword_hits and not fuzzy_score and bm25 < CONTENT_MIN_SCORE:
+            continue
+        score = keyword_hits + fuzzy_score + CONTENT_WEIGHT * bm25 / (bm25 + CONTENT_SATURATION)
+        scored.append({
+            "score": round(score, 3),
+            "path": doc["path"],
+            "keywords": doc.get("when", []),
+            "keyword_hits": keyword_hits,
+            "fuzzy_score": fuzzy_score,
+            "content_score": round(bm25, 3),
+        })
+
+    scored.sort(key=lambda x: x["score"], reverse=True)
+    return scored
+
+
+def rank_docs_batch(store, manifest: dict, prompts: list[str], word_boundary: bool | None = None,
+                    use_content: bool = True, fuzzy: bool = True) -> list[list[dict]]:
+    """
+    rank_docs for many prompts at once. The matchers return sparse per-prompt
+    results, which are gathered into coordinate arrays and scattered into a
+    prompt x document matrix in one assignment each; blending and selection then
+    run over the whole matrix, and only the few selected documents per prompt are
+    sorted.
+    """
+    # Imported here so processes that never batch do not pay for loading NumPy
+    import numpy as np
+
+    docs = manifest.get("docs", [])
+    matcher = matcher_for(manifest, word_boundary)
+    index = content_index_for(store) if use_content else None
+    column = {doc["path"]: doc_index for doc_index, doc in enumerate(docs)}
+
+    matched = [matcher.match(prompt) for prompt in prompts]
+    fuzzy_matcher = fuzzy_matcher_for(manifest) if fuzzy and not all(matched) else None
+    near_matched = [fuzzy_matcher.match(prompt) if fuzzy_matcher is not None and not hit else {}
+                    for prompt, hit in zip(prompts, matched)]
+    content_matched = [{column[path]: bm25 for path, bm25 in index.scores(manifest, prompt).items()
+                        if path in column} if index is not None else {}
+                       for prompt in prompts]
+
+    def scatter(results: list[dict], dtype):
+        matrix = np.zeros((len(prompts), len(docs)), dtype=dtype)
+        sizes = np.fromiter(map(len, results), dtype=np.intp, count=len(results))
+        if sizes.sum():
+            rows = np.repeat(np.arange(len(results)), sizes)
+            cols = np.fromiter(chain.from_iterable(results), dtype=np.intp, count=int(sizes.sum()))
+            values = np.fromiter(chain.from_iterable(result.values() for result in results),
+                                 dtype=dtype, count=int(sizes.sum()))
+            matrix[rows, cols] = values
+        return matrix
+
+    hits = scatter(matched, np.int32)
+    near = scatter(near_matched, np.float64)
+    content = scatter(content_matched, np.float64)
+
+    # Same arithmetic as rank_docs, so both give identical scores
+    scores = hits + near + CONTENT_WEIGHT * content / (content + CONTENT_SATURATION)
+    selected = (hits > 0) | (near > 0) | (content >= CONTENT_MIN_SCORE)
+
+    ranked = []
+    for row in range(len(prompts)):
+        scored = [{
+            "score": round(float(scores[row, doc_index]), 3),
+            "path": docs[doc_index]["path"],
+            "keywords": docs[doc_index].get("when", []),
+            "keyword_hits": int(hits[row, doc_index]),
+            "fuzzy_score": float(near[row, doc_index]),
+            "content_score": round(float(content[row, doc_index]), 3),
+        } for doc_index in np.flatnonzero(selected[row])]
+        scored.sort(key=lambda x: x["score"], reverse=True)
+        ranked.append(scored)
+    return ranked
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+BM25 full-text inverted index over context document contents
+Postings are updated per document, so a single changed file is re-indexed on its own
+"""
+
+import math
+import re
+import threading
+import time
+import weakref
+from array import array
+from functools import lru_cache
+
+TOKEN_RE = re.compile(r"[a-z0-9_]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its
+me my no not of on or our so such that the their then there these they this to was we
+what when where which who why will with would you your
+""".split())
+
+_VOWELS = set("aeiouy")
+
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """Light suffix-stripping stemmer (plurals, -ing, -ed)"""
+    if len(word) <= 3 or not word.isalpha():
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("sses") or word.endswith(("ches", "shes", "xes", "zes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix):
+            base = word[:-len(suffix)]
+            if len(base) >= 3 and _VOWELS.intersection(base):
+                # running -> runn -> run
+                if len(base) > 3 and base[-1] == base[-2] and base[-1] not in "lsz":
+                    base = base[:-1]
+                return base
+    return word
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase, split on non-word characters, drop stopwords and stem"""
+    return [stem(token) for token in TOKEN_RE.findall(text.lower())
+            if len(token) > 1 and token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Inverted index with Okapi BM25 scoring.
+
+    Documents can be added, replaced or removed one at a time; only the postings
+    of the affected document are touched.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, dict[str, int]] = {}
+        self._doc_terms: dict[str, dict[str, int]] = {}
+        self._doc_len: dict[str, int] = {}
+        self._total_len = 0
+        # Per-document length normalisation, recomputed lazily after changes
+        self._norm: dict[str, float] | None = None
+        # In a copy, the terms whose postings it owns (None: all of them); the
+        # others are still shared with the index it was copied from
+        self._owned: set[str] | None = None
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_len
+
+    def copy(self) -> "BM25Index":
+        """
+        An independent copy, cheap to make: postings are shared until the copy
+        changes them, then copied term by term, so the original is never touched
+        """
+        clone = BM25Index(self.k1, self.b)
+        clone._postings = dict(self._postings)
+        # Per-document term counts are replaced, never changed in place
+        clone._doc_terms = dict(self._doc_terms)
+        clone._doc_len = dict(self._doc_len)
+        clone._total_len = self._total_len
+        clone._norm = self._norm
+        clone._owned = set()
+        return clone
+
+    def _own(self, term: str) -> dict[str, int]:
+        """The postings of a term, ready to be changed"""
+        postings = self._postings.get(term)
+        if postings is None:
+            postings = self._postings[term] = {}
+        elif self._owned is not None and term not in self._owned:
+            postings = self._postings[term] = dict(postings)
+        if self._owned is not None:
+            self._owned.add(term)
+        return postings
+
+    def add(self, doc_id: str, text: str):
+        """Index (or re-index) one document"""
+        if doc_id in self._doc_len:
+            self.remove(doc_id)
+        terms: dict[str, int] = {}
+        tokens = tokenize(text)
+        for token in tokens:
+            terms[token] = terms.get(token, 0) + 1
+        for term, tf in terms.items():
+            self._own(term)[doc_id] = tf
+        self._doc_terms[doc_id] = terms
+        self._doc_len[doc_id] = len(tokens)
+        self._total_len += len(tokens)
+        self._norm = None
+
+    def remove(self, doc_id: str):
+        """Drop one document from the index"""
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._own(term)
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+        self._total_len -= self._doc_len.pop(doc_id)
+        self._norm = None
+
+    def _normalisation(self) -> dict[str, float]:
+        norm = self._norm
+        if norm is None:
+            avgdl = (self._total_len / len(self._doc_len)) if self._doc_len else 1.0
+            k1, b = self.k1, self.b
+            norm = {doc_id: k1 * (1 - b + b * length / (avgdl or 1.0))
+                    for doc_id, length in self._doc_len.items()}
+            self._norm = norm
+        return norm
+
+    def scores(self, query: str, corpus: "OverlayStats | None" = None) -> dict[str, float]:
+        """
+        Return {doc_id: BM25 score} for every document sharing a term with the query.
+
+        With `corpus`, this index holds a few documents overlaid on a larger packed
+        index, and scores them with the statistics of the combined corpus so they
+        rank on the same scale as the packed documents.
+        """
+        k1 = self.k1
+        if corpus is None:
+            norm = self._normalisation()
+            n = len(self._doc_len)
+        else:
+            avgdl, b = corpus.avgdl or 1.0, self.b
+            norm = {doc_id: k1 * (1 - b + b * length / avgdl)
+                    for doc_id, length in self._doc_len.items()}
+            n = corpus.doc_count
+        result: dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            df = corpus.df(term) if corpus is not None else len(postings)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            weight = idf * (k1 + 1)
+            for doc_id, tf in postings.items():
+                result[doc_id] = result.get(doc_id, 0.0) + weight * tf / (tf + norm[doc_id])
+        return result
+
+    def search(self, query: str, limit: int = 10) -> list[tuple[str, float]]:
+        """Return the top `limit` (doc_id, score) pairs, best first"""
+        ranked = sorted(self.scores(query).items(), key=lambda item: item[1], reverse=True)
+        return ranked[:limit]
+
+    def to_arrays(self, doc_ids: list[str]) -> dict[str, array]:
+        """
+        Flatten the index into arrays for PackedBM25Index. Documents are numbered
+        by their position in `doc_ids`; terms are sorted by their UTF-8 bytes.
+        """
+        ordinals = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+        terms, term_index = bytearray(), array("i", [0])
+        post_index, post_docs, post_tf = array("i", [0]), array("i"), array("i")
+        for encoded, term in sorted((term.encode("utf-8"), term) for term in self._postings):
+            terms += encoded
+            term_index.append(len(terms))
+            for doc_id, tf in self._postings[term].items():
+                if doc_id in ordinals:
+                    post_docs.append(ordinals[doc_id])
+                    post_tf.append(tf)
+            post_index.append(len(post_docs))
+        return {
+            "terms": array("B", terms),
+            "term_index": term_index,
+            "post_index": post_index,
+            "post_docs": post_docs,
+            "post_tf": post_tf,
+            "doc_len": array("i", (self._doc_len.get(doc_id, 0) for doc_id in doc_ids)),
+            "stats": array("q", [len(self._doc_len), self._total_len]),
+            "params": array("d", [self.k1, self.b]),
+        }
+
+
+class PackedBM25Index:
+    """
+    Read-only BM25 index over flat arrays (from BM25Index.to_arrays).
+
+    The arrays can be memoryviews of a shared read-only file, so worker processes
+    score against one copy instead of each building its own postings. Terms are
+    found by binary search over the sorted term table.
+    """
+
+    def __init__(self, arrays: dict, doc_ids: list[str], indexed: frozenset | None = None):
+        self.doc_ids = doc_ids
+        # The doc_ids that were indexed (None: all of them); the others are only numbered
+        self.indexed = indexed
+        self._terms = arrays["terms"]
+        self._term_index = arrays["term_index"]
+        self._post_index = arrays["post_index"]
+        self._post_docs = arrays["post_docs"]
+        self._post_tf = arrays["post_tf"]
+        self._doc_len = arrays["doc_len"]
+        self.doc_count, self.total_len = arrays["stats"]
+        self.k1, self.b = arrays["params"]
+        self.avgdl = self.total_len / self.doc_count if self.doc_count else 1.0
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    def _find(self, term: str) -> int:
+        """Return the position of a term in the term table, or -1"""
+        key = term.encode("utf-8")
+        terms, index = self._terms, self._term_index
+        lo, hi = 0, len(index) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(terms[index[mid]:index[mid + 1]]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(index) - 1 and bytes(terms[index[lo]:index[lo + 1]]) == key:
+            return lo
+        return -1
+
+    def df(self, term: str, skip=frozenset()) -> int:
+        """Number of documents containing a (tokenized) term, not counting those in `skip`"""
+        position = self._find(term)
+        if position < 0:
+            return 0
+        first, last = self._post_index[position], self._post_index[position + 1]
+        if not skip:
+            return last - first
+        doc_ids, post_docs = self.doc_ids, self._post_docs
+        return sum(1 for k in range(first, last) if doc_ids[post_docs[k]] not in skip)
+
+    def scores(self, query: str, skip=frozenset(), corpus: "OverlayStats | None" = None) -> dict[str, float]:
+        """
+        Return {doc_id: BM25 score}, leaving out the doc_ids in `skip`. With
+        `corpus`, scored with the statistics of the combined corpus (see OverlayStats)
+        """
+        k1, b = self.k1, self.b
+        avgdl = (corpus.avgdl if corpus is not None else self.avgdl) or 1.0
+        n = corpus.doc_count if corpus is not None else self.doc_count
+        doc_ids, doc_len = self.doc_ids, self._doc_len
+        post_docs, post_tf = self._post_docs, self._post_tf
+        result: dict[str, float] = {}
+        for term in set(tokenize(query)):
+            position = self._find(term)
+            if position < 0:
+                continue
+            first, last = self._post_index[position], self._post_index[position + 1]
+            df = corpus.df(term) if corpus is not None else last - first
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            weight = idf * (k1 + 1)
+            for k in range(first, last):
+                doc_id = doc_ids[post_docs[k]]
+                if doc_id in skip:
+                    continue
+                tf = post_tf[k]
+                norm = k1 * (1 - b + b * doc_len[post_docs[k]] / avgdl)
+                result[doc_id] = result.get(doc_id, 0.0) + weight * tf / (tf + norm)
+        return result
+
+
+class OverlayStats:
+    """
+    Corpus statistics of a packed index whose documents in `skip` were replaced
+    by (or dropped in favour of) the documents of an overlay index: document
+    count, average length and document frequencies count every document once
+    """
+
+    def __init__(self, base: PackedBM25Index, skip: frozenset, overlay: BM25Index):
+        self._base = base
+        self._skip = skip
+        self._overlay = overlay
+        doc_len = base._doc_len
+        indexed = base.indexed
+        skipped = [doc_len[i] for i, doc_id in enumerate(base.doc_ids)
+                   if doc_id in skip and (indexed is None or doc_id in indexed)]
+        self.doc_count = base.doc_count - len(skipped) + len(overlay)
+        total_len = base.total_len - sum(skipped) + overlay._total_len
+        self.avgdl = total_len / self.doc_count if self.doc_count else 1.0
+
+    def df(self, term: str) -> int:
+        return self._base.df(term, self._skip) + len(self._overlay._postings.get(term, ()))
+
+
+class ContentIndex:
+    """
+    BM25 index kept in sync with the documents listed in a store's manifest.
+
+    Syncing runs when the store's version or the manifest changes: it compares
+    the stat signature the store last saw for each document with the one that
+    was indexed, so only documents that actually changed are read and
+    re-tokenized, and the stat sweep itself is left to DocumentStore.refresh()
+    (done in the I/O pool by prefetch_context in the servers).
+
+    When the store has a context pack attached, documents still served from the
+    pack are scored by the pack's prebuilt index and only documents that changed
+    since the pack was built are indexed here.
+
+    When a watcher publishes snapshots to the store, each snapshot carries its own
+    index, derived from the previous one by for_snapshot() before it is published
+    and never changed afterwards, so requests never re-index and always rank with
+    the postings of the documents they see.
+    """
+
+    def __init__(self, store, snapshot=None):
+        self.store = store
+        self.snapshot = snapshot
+        self.index = BM25Index()
+        # Stat signature each indexed document was indexed at
+        self._indexed: dict[str, tuple | None] = {}
+        self._manifest = None
+        self._version = None
+        self._lock = threading.Lock()
+        self._base: PackedBM25Index | None = None
+        # Packed documents that are shadowed by self.index or left the manifest
+        self._skip: frozenset = frozenset()
+        self._corpus: OverlayStats | None = None
+
+    def for_snapshot(self, snapshot) -> "ContentIndex":
+        """
+        A separate index over a snapshot that is about to be published. Postings
+        of unchanged documents are carried over from this index (which is left
+        untouched) and only changed documents are re-tokenized.
+        """
+        index = ContentIndex(self.store, snapshot)
+        with self._lock:
+            index.index = self.index.copy()
+            index._indexed = dict(self._indexed)
+        index.sync(snapshot.manifest, force=True)
+        return index
+
+    def _pack_index(self) -> "PackedBM25Index | None":
+        pack = getattr(self.store, "pack", None)
+        return pack.bm25 if pack is not None else None
+
+    def _signature(self, path: str) -> tuple | None:
+        """Last known stat signature of a document (no stat)"""
+        if self.snapshot is not None:
+            return self.snapshot.signatures.get(path)
+        return self.store._signatures.get(path)
+
+    def _is_packed(self, path: str) -> bool:
+        if self.snapshot is None:
+            return self.store.is_packed(path)
+        signature = self.store._pack_signatures.get(path)
+        return signature is not None and self.snapshot.signatures.get(path) == signature
+
+    def _read(self, path: str) -> str | None:
+        if self.snapshot is not None:
+            return self.snapshot.texts.get(path, "")
+        try:
+            return self.store.read_text(path)
+        except OSError:
+            return None
+
+    def is_due(self, manifest: dict) -> bool:
+        if self.snapshot is not None:
+            return self._manifest is None
+        return manifest is not self._manifest or self._base is not self._pack_index() or \
+            self.store.version != self._version
+
+    def _unpacked(self, manifest: dict) -> list[str]:
+        """Manifest paths whose text has to be indexed locally"""
+        paths = [doc["path"] for doc in manifest.get("docs", [])]
+        if self._pack_index() is None:
+            return paths
+        return [path for path in paths if not self._is_packed(path)]
+
+    def _stale(self, paths: list[str]) -> list[str]:
+        """The paths not indexed at the signature the store knows them by"""
+        indexed, stale = self._indexed, []
+        for path in paths:
+            signature = self._signature(path)
+            if signature is None or path not in indexed or indexed[path] != signature:
+                stale.append(path)
+        return stale
+
+    def sync(self, manifest: dict, force: bool = False):
+        if not force and not self.is_due(manifest):
+            return
+        with self._lock:
+            # Taken first: a change noticed while syncing triggers another pass
+            version = self.store.version if self.snapshot is None else None
+            base = self._pack_index()
+            paths = self._unpacked(manifest)
+            for path in self._stale(paths):
+                text = self._read(path)
+                if text is None:
+                    # Unreadable: dropped, and retried on the next pass
+                    if path in self._indexed:
+                        self.index.remove(path)
+                        del self._indexed[path]
+                    continue
+                if base is not None and self._is_packed(path):
+                    # Only its mtime changed: the packed index still covers it
+                    continue
+                self.index.add(path, text)
+                self._indexed[path] = self._signature(path)
+            listed = set(paths)
+            for path in [path for path in self._indexed if path not in listed or
+                         (base is not None and self._is_packed(path))]:
+                self.index.remove(path)
+                del self._indexed[path]
+            if base is not None:
+                listed = {doc["path"] for doc in manifest.get("docs", [])}
+                self._skip = frozenset(path for path in base.doc_ids
+                                       if path in self._indexed or path not in listed)
+                self._corpus = OverlayStats(base, self._skip, self.index)
+            self._base = base
+            self._manifest = manifest
+            self._version = version
+
+    async def sync_async(self, manifest: dict):
+        """sync(), with the documents that changed read concurrently off the event loop"""
+        if not self.is_due(manifest):
+            return
+        await self.store.read_many_async(self._stale(self._unpacked(manifest)))
+        self.sync(manifest)
+
+    def scores(self, manifest: dict, query: str) -> dict[str, float]:
+        """Return {path: BM25 score} for the manifest's documents"""
+        if self.snapshot is None:
+            # A no-op within the revalidation interval, so in the servers, where
+            # prefetch_context swept in the I/O pool, nothing is stat'ed here
+            self.store.refresh()
+        self.sync(manifest)
+        base = self._base
+        if base is None:
+            return self.index.scores(query)
+        corpus = self._corpus
+        result = base.scores(query, self._skip, corpus)
+        if self._indexed:
+            result.update(self.index.scores(query, corpus=corpus))
+        return result
+
+
+_indexes: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def content_index_for(store) -> ContentIndex:
+    """
+    Return the content index attached to a document store, or with a published
+    snapshot, the one of the snapshot pinned for the current request
+    """
+    snapshot = store.snapshot() if hasattr(store, "snapshot") else None
+    if snapshot is not None:
+        index = snapshot.content_index
+        if index is None:
+            # Published without one (not by the watcher): build it once
+            with _indexes_lock:
+                index = snapshot.content_index
+                if index is None:
+                    index = snapshot.content_index = ContentIndex(store, snapshot)
+                    index.sync(snapshot.manifest, force=True)
+        return index
+    index = _indexes.get(store)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(store)
+            if index is None:
+                index = _indexes[store] = ContentIndex(store)
+    return index
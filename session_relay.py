@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Session affinity for the multi-worker HTTP server
+An SSE session lives in the worker that accepted /sse; message POSTs that land on
+another worker are relayed to it over a private localhost socket
+"""
+
+import asyncio
+import json
+import os
+import struct
+from pathlib import Path
+
+from starlette.responses import Response
+
+# Directory where each worker registers the port of its relay listener
+RUN_DIR_ENV = "MCP_HTTP_RUN_DIR"
+
+# Header length, body length
+_FRAME = struct.Struct("<II")
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> tuple[dict, bytes]:
+    header_len, body_len = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+    header = json.loads(await reader.readexactly(header_len))
+    return header, await reader.readexactly(body_len)
+
+
+def _write_frame(writer: asyncio.StreamWriter, header: dict, body: bytes):
+    encoded = json.dumps(header).encode("utf-8")
+    writer.write(_FRAME.pack(len(encoded), len(body)) + encoded + body)
+
+
+class SessionRelay:
+    """
+    Forwards POSTs between worker processes.
+
+    Every worker listens on an ephemeral 127.0.0.1 port, registered as
+    `<run_dir>/<worker_id>.port`. `forward()` replays a request to the owning
+    worker, where `handler` (the local message endpoint) answers it.
+    """
+
+    def __init__(self, run_dir, worker_id: str, handler):
+        self.run_dir = Path(run_dir)
+        self.worker_id = worker_id
+        self.handler = handler
+        self._server: asyncio.AbstractServer | None = None
+        self._ports: dict[str, int] = {}
+
+    def _port_file(self, worker_id: str) -> Path:
+        return self.run_dir / f"{worker_id}.port"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        path = self._port_file(self.worker_id)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(str(port))
+        os.replace(tmp, path)
+
+    async def stop(self):
+        self._port_file(self.worker_id).unlink(missing_ok=True)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _port(self, worker_id: str) -> int:
+        port = self._ports.get(worker_id)
+        if port is None:
+            port = self._ports[worker_id] = int(self._port_file(worker_id).read_text())
+        return port
+
+    async def forward(self, worker_id: str, scope, receive, send):
+        """Answer a request with the response of worker `worker_id`"""
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        if not worker_id.isdigit():
+            return await Response("Could not find session", status_code=404)(scope, receive, send)
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", self._port(worker_id))
+        except (OSError, ValueError):
+            # The worker exited (or never existed): its sessions are gone with it
+            self._ports.pop(worker_id, None)
+            return await Response("Could not find session", status_code=404)(scope, receive, send)
+
+        try:
+            _write_frame(writer, {
+                "path": scope["path"],
+                "query_string": scope.get("query_string", b"").decode("latin-1"),
+                "headers": [[k.decode("latin-1"), v.decode("latin-1")] for k, v in scope["headers"]],
+                "client": list(scope["client"]) if scope.get("client") else None,
+            }, body)
+            await writer.drain()
+            header, response_body = await _read_frame(reader)
+        finally:
+            writer.close()
+
+        await send({
+            "type": "http.response.start",
+            "status": header["status"],
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in header["headers"]],
+        })
+        await send({"type": "http.response.body", "body": response_body})
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request, body = await _read_frame(reader)
+        except (asyncio.IncompleteReadError, ValueError):
+            writer.close()
+            return
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": request["path"],
+            "raw_path": request["path"].encode("latin-1"),
+            "root_path": "",
+            "query_string": request["query_string"].encode("latin-1"),
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in request["headers"]],
+            "client": tuple(request["client"]) if request["client"] else None,
+            "server": None,
+            "path_params": {},
+        }
+        delivered = False
+
+        async def receive():
+            nonlocal delivered
+            if delivered:
+                return {"type": "http.disconnect"}
+            delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        response = {"status": 500, "headers": []}
+        chunks = []
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [[k.decode("latin-1"), v.decode("latin-1")]
+                                       for k, v in message.get("headers", [])]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        try:
+            await self.handler(scope, receive, send)
+            _write_frame(writer, response, b"".join(chunks))
+            await writer.drain()
+        finally:
+            writer.close()
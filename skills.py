@@ -7,86 +7,194 @@ import json
 import sys
 from pathlib import Path
 import argparse
-import pyperclip  # For clipboard operations
-import subprocess
 import os
 
+# Imports of the pack reader, shard loader, clipboard and subprocess are deferred
+# to the commands that need them: a keyboard shortcut should only pay for what it uses
+
+# Same as context_pack.DEFAULT_PACK_PATH
+DEFAULT_PACK_PATH = "context/context.pack"
+
+# Cached {skill name: path} index written next to the manifest (manifest.names.json),
+# so `load` and `show` find a skill without parsing the manifest
+NAMES_SUFFIX = ".names.json"
+
+# Unix socket of `skills.py serve` (--socket or SKILLS_SOCKET), relative to the base directory
+DEFAULT_SOCKET = ".skills.sock"
+
+# Seconds the client waits for the daemon before running the command itself
+DAEMON_TIMEOUT = 2.0
+
+
+def _signature(path):
+    """Stat signature of a file, or None when it is missing"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
 
 class SkillsManager:
-    def __init__(self, manifest_path="context/manifest.json"):
-        self.base_dir = Path(__file__).parent
+    def __init__(self, manifest_path="context/manifest.json", pack_path=None, base_dir=None):
+        self.base_dir = Path(base_dir) if base_dir is not None else Path(__file__).parent
         self.manifest_path = self.base_dir / manifest_path
-        self.manifest = self._load_manifest()
+        self.names_path = self.manifest_path.with_name(self.manifest_path.stem + NAMES_SUFFIX)
+        self._manifest_rel = manifest_path
+        self._pack_path = pack_path or self.base_dir / DEFAULT_PACK_PATH
+        self._pack = None
+        self._pack_opened = False
+        self._manifest = None
+        self._signatures = None
+        self._names = None
+        self._docs_by_path = None
+    
+    @property
+    def pack(self):
+        """The compiled context pack (see build-pack), opened on first use"""
+        if not self._pack_opened:
+            # Without a pack file the pack reader is not even imported
+            if os.path.exists(self._pack_path):
+                self._pack = self._open_pack(self._pack_path, self._manifest_rel)
+            self._pack_opened = True
+        return self._pack
+    
+    def _open_pack(self, pack_path, manifest_path):
+        """Use the compiled context pack (see build-pack) if it matches the current manifest"""
+        from context_pack import open_pack
+        
+        pack = open_pack(pack_path)
+        if pack is None or pack.manifest_path != manifest_path or \
+                not pack.manifest_is_current(self.base_dir):
+            return None
+        return pack
+    
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            self._manifest = self._load_manifest()
+        return self._manifest
     
     def _load_manifest(self):
-        """Load the skills manifest"""
+        """Load the skills manifest, from the pack when it is current"""
+        pack = self.pack
+        if pack is not None:
+            return pack.manifest
         if not self.manifest_path.exists():
             print(f"Error: Manifest not found at {self.manifest_path}", file=sys.stderr)
             sys.exit(1)
         
+        # Each file is stat'ed before it is read, so an edit made meanwhile leaves
+        # the name index stale rather than wrong
+        signatures = {self._manifest_rel: _signature(self.manifest_path)}
         with open(self.manifest_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+            manifest = json.load(f)
+        if not manifest.get('include'):
+            self._signatures = signatures
+            return manifest
+        
+        from manifest_shards import includes, merge, read_shard
+        shards = []
+        for rel_path in includes(manifest):
+            signatures[rel_path] = _signature(self.base_dir / rel_path)
+            shards.append(read_shard(self.base_dir, rel_path))
+        self._signatures = signatures
+        return merge(manifest, shards)
+    
+    def name_index(self):
+        """{lowercase skill name: path}, from the cached index while the manifest is unchanged"""
+        if self._names is None:
+            self._names = self._read_name_index()
+        if self._names is None:
+            self._names = self._build_name_index()
+        return self._names
+    
+    def _read_name_index(self):
+        try:
+            with open(self.names_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        signatures = index.get('signatures') or {}
+        if self._manifest_rel not in signatures:
+            return None
+        for rel_path, signature in signatures.items():
+            if _signature(self.base_dir / rel_path) != signature:
+                return None
+        return index.get('names')
+    
+    def _build_name_index(self):
+        pack = self.pack
+        if pack is not None:
+            # Paths come straight from the (current) pack, without parsing the manifest
+            signatures = {rel_path: _signature(self.base_dir / rel_path)
+                          for rel_path in [self._manifest_rel, *pack.shards]}
+            paths = pack.manifest_doc_paths()
+        else:
+            paths = [doc['path'] for doc in self.manifest.get('docs', [])]
+            signatures = self._signatures
+        names = {}
+        for path in paths:
+            names.setdefault(Path(path).stem.lower(), path)
+        
+        if signatures is not None and None not in signatures.values():
+            tmp = self.names_path.with_name(self.names_path.name + f".{os.getpid()}.tmp")
+            try:
+                tmp.write_text(json.dumps({'signatures': signatures, 'names': names}), encoding='utf-8')
+                os.replace(tmp, self.names_path)
+            except OSError:
+                # A read-only checkout just rebuilds the index per run
+                pass
+        return names
     
     def list_skills(self):
         """List all available skills"""
-        print("Available Skills:")
-        print("=" * 60)
-        for doc in self.manifest.get('docs', []):
-            path = doc['path']
-            keywords = ', '.join(doc['when'])
-            skill_name = Path(path).stem
-            print(f"\n📚 {skill_name}")
-            print(f"   Path: {path}")
-            print(f"   Keywords: {keywords}")
-        print("\n" + "=" * 60)
-        print(f"Total: {len(self.manifest.get('docs', []))} skills")
+        print(format_skill_list(self.manifest.get('docs', [])))
+    
+    def skill_path(self, skill_name):
+        """Path of a skill by its name, from the name index (without parsing the manifest)"""
+        return self.name_index().get(skill_name.lower())
     
     def get_skill_by_name(self, skill_name):
         """Find a skill by its name"""
-        skill_name_lower = skill_name.lower()
-        for doc in self.manifest.get('docs', []):
-            if Path(doc['path']).stem.lower() == skill_name_lower:
-                return doc
-        return None
+        path = self.skill_path(skill_name)
+        if path is None:
+            return None
+        if self._docs_by_path is None:
+            self._docs_by_path = {doc['path']: doc for doc in self.manifest.get('docs', [])}
+        return self._docs_by_path.get(path)
     
     def load_skill(self, skill_name, output='copilot'):
         """Load a skill and output it"""
-        skill = self.get_skill_by_name(skill_name)
-        if not skill:
-            print(f"Error: Skill '{skill_name}' not found", file=sys.stderr)
-            print("\nAvailable skills:", file=sys.stderr)
-            for doc in self.manifest.get('docs', []):
-                print(f"  - {Path(doc['path']).stem}", file=sys.stderr)
-            sys.exit(1)
-        
-        skill_path = self.base_dir / skill['path']
-        if not skill_path.exists():
-            print(f"Error: Skill file not found at {skill_path}", file=sys.stderr)
+        path = self.skill_path(skill_name)
+        if path is None:
+            print(missing_skill_message(skill_name, self.manifest.get('docs', [])), file=sys.stderr)
             sys.exit(1)
         
-        with open(skill_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
+        content = self._read_skill(path)
+        self.output_skill(skill_name, content, output)
+        return content
+    
+    def output_skill(self, skill_name, content, output='copilot'):
+        """Send a skill's content to the chosen output (also used for content from the daemon)"""
         if output == 'copilot':
             # Save to temp file and open in Copilot chat using #file reference
             temp_file = self.base_dir / '.copilot_context.md'
             with open(temp_file, 'w', encoding='utf-8') as f:
                 f.write(f"# Context: {skill_name}\n\n{content}")
             
-            # Open the temp file in editor (Copilot can reference it)
+            # Open the temp file in editor (Copilot can reference it), without
+            # waiting for the editor to start
             try:
-                subprocess.run(['code', str(temp_file)], check=True, 
-                             capture_output=True, timeout=5)
+                open_in_editor(temp_file)
                 print(f"✓ Skill '{skill_name}' loaded ({len(content)} chars)")
                 print(f"  Opening in editor for Copilot context...")
                 print(f"  Use @workspace or reference this file in Copilot chat")
-            except subprocess.TimeoutExpired:
-                print(f"✓ Skill '{skill_name}' saved to {temp_file}")
-                print(f"  File opened in editor for Copilot context")
             except Exception as e:
                 print(f"Note: Saved to {temp_file}")
                 print(f"  You can reference it in Copilot with @workspace")
         elif output == 'clipboard':
+            import pyperclip  # For clipboard operations
             pyperclip.copy(content)
             print(f"✓ Skill '{skill_name}' loaded to clipboard ({len(content)} chars)")
             print(f"  Use Ctrl+V to paste into Copilot chat")
@@ -97,24 +205,210 @@ class SkillsManager:
             with open(temp_file, 'w', encoding='utf-8') as f:
                 f.write(content)
             print(f"✓ Skill '{skill_name}' written to {temp_file}")
+    
+    def _read_skill(self, rel_path):
+        """Skill text from the pack while the file is unchanged, otherwise from disk"""
+        pack = self.pack
+        if pack is not None:
+            content = pack.text_if_current(self.base_dir, rel_path)
+            if content is not None:
+                return content
         
-        return content
+        skill_path = self.base_dir / rel_path
+        if not skill_path.exists():
+            print(f"Error: Skill file not found at {skill_path}", file=sys.stderr)
+            sys.exit(1)
+        
+        with open(skill_path, 'r', encoding='utf-8') as f:
+            return f.read()
     
     def show_skill(self, skill_name):
         """Show skill content directly"""
         self.load_skill(skill_name, output='stdout')
 
 
-def main():
+def format_skill_list(docs):
+    """The `list` output for the manifest's documents"""
+    lines = ["Available Skills:", "=" * 60]
+    for doc in docs:
+        path = doc['path']
+        keywords = ', '.join(doc['when'])
+        skill_name = Path(path).stem
+        lines.append(f"\n📚 {skill_name}")
+        lines.append(f"   Path: {path}")
+        lines.append(f"   Keywords: {keywords}")
+    lines.append("\n" + "=" * 60)
+    lines.append(f"Total: {len(docs)} skills")
+    return "\n".join(lines)
+
+
+def missing_skill_message(skill_name, docs):
+    lines = [f"Error: Skill '{skill_name}' not found", "\nAvailable skills:"]
+    lines += [f"  - {Path(doc['path']).stem}" for doc in docs]
+    return "\n".join(lines)
+
+
+class SkillsDaemon:
+    """
+    Answers `skills.py serve` requests from a warm in-memory store (see
+    context_store), so every request skips interpreter startup and file reads.
+    Files are re-checked at most once per CONTEXT_REVALIDATE_SECONDS.
+
+    The protocol is one request line (`list`, `show <skill>`, `load <skill>` or
+    `ping`) answered with an `OK` or `ERROR` line followed by the text, so
+    `printf 'show GTest_Mock\\n' | nc -U .skills.sock` works as a client too.
+    """
+    
+    def __init__(self, base_dir, store=None):
+        from context_store import get_store
+        self.store = store if store is not None else get_store(Path(base_dir))
+        self._names = (None, {})
+    
+    def _docs(self):
+        return self.store.manifest_all().get('docs', [])
+    
+    def _path(self, skill_name):
+        manifest = self.store.manifest_all()
+        if self._names[0] is not manifest:
+            names = {}
+            for doc in manifest.get('docs', []):
+                names.setdefault(Path(doc['path']).stem.lower(), doc['path'])
+            self._names = (manifest, names)
+        return self._names[1].get(skill_name.lower())
+    
+    def handle(self, line):
+        """Answer one request line with (ok, text)"""
+        command, _, skill_name = line.strip().partition(' ')
+        try:
+            if command == 'ping':
+                return True, ''
+            if command == 'list':
+                return True, format_skill_list(self._docs())
+            if command in ('show', 'load') and skill_name:
+                path = self._path(skill_name)
+                if path is None:
+                    return False, missing_skill_message(skill_name, self._docs())
+                return True, self.store.read_text(path)
+        except (OSError, ValueError) as e:
+            return False, f"Error: {e}"
+        return False, f"Error: unknown request {line.strip()!r}"
+
+
+def make_server(base_dir, socket_path, store=None):
+    """A threaded Unix socket server for SkillsDaemon, bound and ready to serve_forever()"""
+    import socketserver
+    
+    daemon = SkillsDaemon(base_dir, store)
+    
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            line = self.rfile.readline(4096).decode('utf-8', 'replace')
+            ok, text = daemon.handle(line)
+            self.wfile.write(f"{'OK' if ok else 'ERROR'}\n{text}".encode('utf-8'))
+    
+    class Server(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+    
+    # Owner-only socket: the daemon serves files its owner can read
+    umask = os.umask(0o177)
+    try:
+        return Server(str(socket_path), Handler)
+    finally:
+        os.umask(umask)
+
+
+def serve(base_dir, socket_path):
+    """Run the daemon until interrupted"""
+    import socket
+    
+    if not hasattr(socket, 'AF_UNIX'):
+        print("Error: skills.py serve needs Unix domain sockets; commands run in-process instead",
+              file=sys.stderr)
+        return 1
+    if os.path.exists(socket_path):
+        if daemon_request(socket_path, 'ping') is not None:
+            print(f"Error: a skills daemon is already listening on {socket_path}", file=sys.stderr)
+            return 1
+        # Left behind by a daemon that did not shut down cleanly
+        os.unlink(socket_path)
+    
+    import signal
+    
+    server = make_server(base_dir, socket_path)
+    # Stopped with SIGTERM (e.g. by a service manager) as cleanly as with Ctrl+C
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"✓ Serving skills from {base_dir} on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+    return 0
+
+
+def daemon_request(socket_path, request, timeout=DAEMON_TIMEOUT):
+    """
+    Send one request to a running `skills.py serve`. Returns (ok, text), or None
+    when no daemon answers (the caller then runs the command itself).
+    """
+    if not os.path.exists(socket_path):
+        return None
+    import socket
+    
+    chunks = []
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(socket_path))
+            sock.sendall(request.encode('utf-8') + b"\n")
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+    except (OSError, AttributeError):
+        return None
+    status, _, text = b"".join(chunks).decode('utf-8', 'replace').partition("\n")
+    if status not in ('OK', 'ERROR'):
+        return None
+    return status == 'OK', text
+
+
+def open_in_editor(path):
+    """Start VS Code on a file and return at once (raises OSError if `code` is missing)"""
+    import subprocess
+    
+    options = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP} if os.name == 'nt' \
+        else {'start_new_session': True}
+    subprocess.Popen(['code', str(path)], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, **options)
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(
         description='Skills CLI - Load context documentation for Copilot',
         epilog='Examples:\n'
                '  skills.py list                    # List all skills\n'
                '  skills.py load GTest_Mock         # Load Google Mock skill to clipboard\n'
-               '  skills.py show GTest_Execute      # Display skill content\n',
+               '  skills.py show GTest_Execute      # Display skill content\n'
+               '  skills.py build-pack              # Compile context/ for fast startup\n'
+               '  skills.py build-routes            # Index a sharded manifest\'s keywords\n'
+               '  skills.py serve                   # Keep skills in memory for instant loads\n',
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
     
+    parser.add_argument('--base-dir', default=None,
+                        help='Directory holding context/ (default: next to skills.py)')
+    parser.add_argument('--socket', default=None,
+                        help=f'Daemon socket (default: $SKILLS_SOCKET or <base-dir>/{DEFAULT_SOCKET})')
+    parser.add_argument('--no-daemon', action='store_true',
+                        help='Run list/load/show in this process even if a daemon is running')
+    
     subparsers = parser.add_subparsers(dest='command', help='Commands')
     
     # List command
@@ -130,13 +424,63 @@ def main():
     show_parser = subparsers.add_parser('show', help='Show skill content')
     show_parser.add_argument('skill_name', help='Name of the skill to show')
     
-    args = parser.parse_args()
+    # Build-pack command
+    pack_parser = subparsers.add_parser('build-pack',
+                                        help='Compile context/ into a pack file for fast startup')
+    pack_parser.add_argument('--output', default=None,
+                             help=f'Pack file to write (default: {DEFAULT_PACK_PATH})')
+    
+    # Build-routes command
+    subparsers.add_parser('build-routes',
+                          help='Write the keyword routing table of a sharded manifest')
+    
+    # Serve command
+    subparsers.add_parser('serve', help='Keep skills in memory and answer list/load/show over a Unix socket')
+    
+    args = parser.parse_args(argv)
+    base_dir = Path(args.base_dir) if args.base_dir else Path(__file__).parent
+    socket_path = args.socket or os.environ.get('SKILLS_SOCKET') or str(base_dir / DEFAULT_SOCKET)
     
     if not args.command:
         parser.print_help()
         sys.exit(1)
     
-    manager = SkillsManager()
+    if args.command == 'build-pack':
+        from context_pack import build_pack, open_pack
+        pack_path = build_pack(args.output, base_dir)
+        pack = open_pack(pack_path)
+        print(f"✓ Built context pack {pack_path}")
+        print(f"  {len(pack.paths)} documents, {pack_path.stat().st_size} bytes")
+        return
+    
+    if args.command == 'build-routes':
+        from manifest_shards import build_routes
+        routes_path = build_routes(base_dir, 'context/manifest.json')
+        with open(routes_path, 'r', encoding='utf-8') as f:
+            shards = json.load(f)['shards']
+        print(f"✓ Built routing table {routes_path}")
+        print(f"  {len(shards)} shards, {sum(len(s['keywords']) for s in shards.values())} keywords")
+        return
+    
+    if args.command == 'serve':
+        sys.exit(serve(base_dir, socket_path))
+    
+    if not args.no_daemon and '\n' not in getattr(args, 'skill_name', ''):
+        request = 'list' if args.command == 'list' else f"{args.command} {args.skill_name}"
+        reply = daemon_request(socket_path, request)
+        if reply is not None:
+            ok, text = reply
+            if not ok:
+                print(text, file=sys.stderr)
+                sys.exit(1)
+            if args.command == 'list':
+                print(text)
+            else:
+                output = args.output if args.command == 'load' else 'stdout'
+                SkillsManager(base_dir=base_dir).output_skill(args.skill_name, text, output)
+            return
+    
+    manager = SkillsManager(base_dir=base_dir)
     
     if args.command == 'list':
         manager.list_skills()
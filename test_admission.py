@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Tests for admission control: session caps, the bounded tool call queue,
+per-client rate limits and the middleware in front of the HTTP server
+"""
+
+import asyncio
+import gc
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import httpx
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+
+import admission
+import mcp_server_http
+from admission import Admission, AdmissionMiddleware, Rejected
+from loadgen import LocalServer
+from session_relay import SessionRelay
+
+TOOL_CALL = json.dumps({"jsonrpc": "2.0", "id": 1, "method": "tools/call",
+                        "params": {"name": "load_context", "arguments": {"prompt": "mock"}}}).encode()
+
+
+def test_tool_call_queue():
+    """Slots are handed out in order; a full queue or a long wait is rejected"""
+    async def run():
+        admission = Admission(max_tool_calls=1, queue_size=1, queue_timeout=0.2, rate=0)
+        first = await admission.acquire()
+        waiting = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        assert admission.queued == 1
+        try:
+            await admission.acquire()
+            raise AssertionError("queue should be full")
+        except Rejected as e:
+            assert (e.status, e.reason, e.retry_after) == (503, "queue_full", 1)
+
+        first.release()
+        first.release()
+        second = await waiting
+        assert admission.in_flight == 1 and admission.queued == 0
+        try:
+            await admission.acquire()
+            raise AssertionError("wait should time out")
+        except Rejected as e:
+            assert e.reason == "queue_timeout" and admission.queued == 0
+
+        # A slot nobody released is returned when it is dropped
+        del second, waiting
+        gc.collect()
+        assert admission.in_flight == 0
+        assert admission.rejected["queue_full"] == 1 and admission.rejected["queue_timeout"] == 1
+    asyncio.run(run())
+    print("✓ Tool calls queue for slots, boundedly")
+
+
+def test_rate_limit():
+    admission = Admission(rate=2, burst=3)
+    for _ in range(3):
+        admission.check_rate("10.0.0.1", now=100.0)
+    try:
+        admission.check_rate("10.0.0.1", now=100.0)
+        raise AssertionError("should be rate limited")
+    except Rejected as e:
+        assert e.status == 429 and e.retry_after == 1
+    admission.check_rate("10.0.0.2", now=100.0)
+    admission.check_rate("10.0.0.1", now=100.6)
+    print("✓ Clients are rate limited one by one")
+
+
+async def asgi_call(app, path: str, method: str = "POST", body: bytes = b"", client: str = "10.0.0.1",
+                    headers: list | None = None):
+    """Run one request through an ASGI app; returns (status, headers)"""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "headers": headers or [], "query_string": b"",
+             "client": (client, 1234)}
+    await app(scope, receive, send)
+    start = next(message for message in sent if message["type"] == "http.response.start")
+    return start["status"], dict(start.get("headers", []))
+
+
+def test_middleware():
+    """The middleware answers over-limit requests itself, before the endpoint runs"""
+    async def run():
+        release = asyncio.Event()
+        seen = []
+
+        async def endpoint(scope, receive, send):
+            seen.append((scope["path"], (await receive())["body"]))
+            if scope["path"] == "/sse":
+                await release.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        admission = Admission(max_sessions=1, max_tool_calls=1, queue_size=0, rate=0)
+        app = AdmissionMiddleware(endpoint, admission)
+        session = asyncio.create_task(asgi_call(app, "/sse", "GET"))
+        await asyncio.sleep(0.01)
+        status, headers = await asgi_call(app, "/sse", "GET")
+        assert status == 503 and headers[b"retry-after"] == b"1"
+        release.set()
+        assert (await session)[0] == 200 and admission.sessions == 0
+
+        assert (await asgi_call(app, "/mcp", body=TOOL_CALL))[0] == 200
+        assert seen[-1] == ("/mcp", TOOL_CALL)
+        assert admission.in_flight == 0
+
+        limited = AdmissionMiddleware(endpoint, Admission(rate=1, burst=1))
+        assert (await asgi_call(limited, "/messages", body=b"{}"))[0] == 200
+        status, headers = await asgi_call(limited, "/messages", body=b"{}")
+        assert status == 429 and b"retry-after" in headers
+        assert (await asgi_call(limited, "/metrics", "GET"))[0] == 200
+
+        # Bodies are capped (declared or not), and a batch of tool calls gets no single slot
+        small = AdmissionMiddleware(endpoint, Admission(max_tool_calls=1, queue_size=0, rate=0,
+                                                        max_body_bytes=len(TOOL_CALL)))
+        assert (await asgi_call(small, "/messages", body=TOOL_CALL))[0] == 200
+        status, headers = await asgi_call(small, "/messages", body=TOOL_CALL + b" ")
+        assert status == 413 and b"retry-after" not in headers
+        status, _ = await asgi_call(small, "/mcp", body=b"{}", headers=[(b"content-length", b"99999")])
+        assert status == 413 and small.admission.rejected["body_size"] == 2
+        batch = b"[" + TOOL_CALL + b"," + TOOL_CALL + b"]"
+        status, _ = await asgi_call(AdmissionMiddleware(endpoint, admission), "/mcp", body=batch)
+        assert status == 400 and admission.rejected["batch"] == 1 and admission.in_flight == 0
+    asyncio.run(run())
+    print("✓ Middleware rejects over-limit requests with a retry hint")
+
+
+def test_relayed_calls_are_admitted_by_owner():
+    """With several workers, the worker running a relayed tool call holds its slot"""
+    async def run(run_dir):
+        running, release = asyncio.Event(), asyncio.Event()
+
+        async def messages(scope, receive, send):
+            await receive()
+            running.set()
+            await release.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        front, owner = Admission(rate=0), Admission(max_tool_calls=1, queue_size=0, rate=0)
+        relay = SessionRelay(run_dir, "101", AdmissionMiddleware(messages, owner, limit_rate=False))
+        front_relay = SessionRelay(run_dir, "202", messages)
+        await relay.start()
+
+        async def forward(scope, receive, send):
+            await front_relay.forward("101", scope, receive, send)
+
+        app = AdmissionMiddleware(forward, front, relayed=lambda scope: True)
+        try:
+            call = asyncio.create_task(asgi_call(app, "/messages/101/", body=TOOL_CALL))
+            await running.wait()
+            assert front.in_flight == 0 and owner.in_flight == 1
+            # The owner is full: its 503 reaches the client
+            status, headers = await asgi_call(app, "/messages/101/", body=TOOL_CALL)
+            assert status == 503 and headers[b"retry-after"] == b"1"
+            release.set()
+            assert (await call)[0] == 200 and owner.in_flight == 0
+        finally:
+            await relay.stop()
+
+    with tempfile.TemporaryDirectory() as run_dir:
+        asyncio.run(run(run_dir))
+    print("✓ Relayed tool calls hold a slot in the worker that runs them")
+
+
+def test_server_limits():
+    """Against the real server: SSE tool calls hold a slot until they finish, sessions are capped"""
+    async def run(url):
+        async with sse_client(f"{url}/sse") as streams, ClientSession(*streams) as session:
+            await session.initialize()
+            result = await session.call_tool("load_context", {"prompt": "write a gmock test"})
+            assert "GTest_Mock.md" in result.content[0].text
+            assert ADMISSION.in_flight == 0
+            # Answered by the SDK without reaching call_tool: released all the same
+            result = await session.call_tool("load_context", {})
+            assert result.isError and ADMISSION.in_flight == 0
+
+            ADMISSION.max_sessions = ADMISSION.sessions
+            async with httpx.AsyncClient() as client:
+                response = await client.get(f"{url}/sse")
+            assert response.status_code == 503 and response.headers["retry-after"] == "1"
+            async with httpx.AsyncClient() as client:
+                metrics = (await client.get(f"{url}/metrics")).text
+            assert 'mcp_admission_rejected_total{reason="sessions"}' in metrics
+
+    ADMISSION = mcp_server_http.ADMISSION
+    max_sessions = ADMISSION.max_sessions
+    # Slots have to be released explicitly, not when they are dropped
+    finalizer = admission.Slot.__del__
+    admission.Slot.__del__ = lambda slot: None
+    try:
+        with LocalServer() as server:
+            asyncio.run(run(server.url))
+    finally:
+        ADMISSION.max_sessions = max_sessions
+        admission.Slot.__del__ = finalizer
+    print("✓ The HTTP server enforces the limits")
+
+
+def main():
+    """Run all tests"""
+    test_tool_call_queue()
+    test_rate_limit()
+    test_middleware()
+    test_relayed_calls_are_admitted_by_owner()
+    test_server_limits()
+    print("✓ ALL ADMISSION TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
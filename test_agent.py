@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Tests for the async /ask agent against a local stand-in for the OpenAI API
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from agent.answer_cache import AnswerCache, answer_key
+from agent.llm_agent import AsyncAgent
+from loadgen import LocalServer
+
+
+@contextlib.contextmanager
+def environ(**values):
+    """Set environment variables for the duration of the block, with a private answer cache"""
+    saved = {key: os.environ.get(key) for key in [*values, "AGENT_CACHE_PATH"]}
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["AGENT_CACHE_PATH"] = str(Path(tmp) / "answers.sqlite3")
+        os.environ.update(values)
+        try:
+            yield
+        finally:
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+
+class StandInModel:
+    """Minimal OpenAI-compatible chat completions endpoint that echoes the request"""
+
+    def __init__(self, delay: float = 0.05, stream_delay: float = 0.0):
+        self.delay = delay
+        self.stream_delay = stream_delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = []
+        self.app = Starlette(routes=[Route("/v1/chat/completions", self.completions, methods=["POST"])])
+
+    async def completions(self, request):
+        body = await request.json()
+        self.requests.append(body)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        system, user = body["messages"][0]["content"], body["messages"][-1]["content"]
+        answer = f"{body['model']}|{len(system)}|{user}"
+        if body.get("stream"):
+            return StreamingResponse(self.chunks(body["model"], answer), media_type="text/event-stream")
+        return JSONResponse({
+            "id": f"chatcmpl-{len(self.requests)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant",
+                                     "content": answer}}],
+        })
+
+    async def chunks(self, model, answer):
+        """The answer as chat.completion.chunk events, a few characters at a time"""
+        deltas = [{"role": "assistant", "content": ""}]
+        deltas += [{"content": answer[i:i + 4]} for i in range(0, len(answer), 4)]
+        for i, delta in enumerate(deltas):
+            yield "data: " + json.dumps({
+                "id": "chatcmpl-stream", "object": "chat.completion.chunk", "created": 0, "model": model,
+                "choices": [{"index": 0, "delta": delta,
+                             "finish_reason": "stop" if i == len(deltas) - 1 else None}],
+            }) + "\n\n"
+            await asyncio.sleep(self.stream_delay)
+        yield "data: [DONE]\n\n"
+
+
+def test_concurrency_limit():
+    """Concurrent asks share one pool and never exceed the configured limit"""
+    model = StandInModel()
+    with LocalServer(model.app) as server:
+        async def run():
+            agent = AsyncAgent(max_concurrency=2, base_url=f"{server.url}/v1", api_key="test", cache=False)
+            try:
+                return await asyncio.gather(*(agent.ask(f"write a gmock test {i}") for i in range(6)))
+            finally:
+                await agent.aclose()
+        answers = asyncio.run(run())
+    assert [a.split("|")[2] for a in answers] == [f"write a gmock test {i}" for i in range(6)]
+    assert all(a.startswith("gpt-4o-mini|") for a in answers)
+    assert model.max_in_flight == 2
+    assert "GTest" in model.requests[0]["messages"][0]["content"]
+    print(f"✓ {len(answers)} concurrent asks, at most {model.max_in_flight} in flight")
+
+
+def test_ask_endpoint():
+    """/ask answers through the async agent and maps model timeouts to 504"""
+    from agent.server import app
+
+    model = StandInModel()
+    with LocalServer(model.app) as server, environ(OPENAI_BASE_URL=f"{server.url}/v1", OPENAI_API_KEY="test"):
+        with TestClient(app) as client:
+            response = client.post("/ask", json={"prompt": "how do I run tests", "model": "stand-in"})
+            assert response.status_code == 200
+            assert response.json()["answer"].startswith("stand-in|")
+            assert response.json()["answer"].endswith("|how do I run tests")
+
+        model.delay = 1.0
+        with environ(AGENT_TIMEOUT="0.2", AGENT_MAX_RETRIES="0"), TestClient(app) as client:
+            response = client.post("/ask", json={"prompt": "slow"})
+            assert response.status_code == 504
+            response = client.post("/ask/stream", json={"prompt": "slow"})
+            assert response.status_code == 504
+    print("✓ /ask endpoint answers and times out cleanly")
+
+
+def test_ask_stream_endpoint():
+    """/ask/stream forwards the answer as SSE deltas ending with [DONE]"""
+    from agent.server import app
+
+    model = StandInModel(delay=0, stream_delay=0.01)
+    with LocalServer(model.app) as server, environ(OPENAI_BASE_URL=f"{server.url}/v1", OPENAI_API_KEY="test",
+                                                   AGENT_CACHE_MAX_BYTES="0"):
+        with TestClient(app) as client:
+            with client.stream("POST", "/ask/stream", json={"prompt": "how do I run tests"}) as response:
+                assert response.status_code == 200
+                assert response.headers["content-type"].startswith("text/event-stream")
+                events = [line[len("data: "):] for line in response.iter_lines() if line.startswith("data: ")]
+            non_streaming = client.post("/ask", json={"prompt": "how do I run tests"}).json()["answer"]
+    assert events[-1] == "[DONE]" and len(events) > 3
+    assert "".join(json.loads(event)["delta"] for event in events[:-1]) == non_streaming
+    assert model.requests[0]["stream"] is True
+    print(f"✓ /ask/stream delivered the answer in {len(events) - 1} events")
+
+
+def test_answer_cache():
+    """Entries expire, the cache stays under its size bound, and a new context misses"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = AnswerCache(Path(tmp) / "answers.sqlite3", ttl=60, max_bytes=100)
+        key = answer_key("m", "context v1", "how  do I mock?")
+        assert key == answer_key("m", "context v1", "how do I mock?")
+        assert key != answer_key("m", "context v2", "how do I mock?")
+        assert key != answer_key("other", "context v1", "how do I mock?")
+
+        assert cache.get(key) is None
+        cache.put(key, "use gmock")
+        assert cache.get(key) == "use gmock"
+
+        for i in range(5):
+            cache.put(f"k{i}", "x" * 30)
+        stats = cache.stats()
+        assert stats["bytes"] <= 100 and cache.get("k4") == "x" * 30 and cache.get(key) is None
+
+        cache.ttl = 0.01
+        time.sleep(0.02)
+        assert cache.get("k4") is None
+        cache.close()
+    print("✓ Answer cache honours TTL, size bound and context changes")
+
+
+def test_agent_uses_cache():
+    """Repeated questions are answered from disk; streaming replays cached answers"""
+    model = StandInModel(delay=0)
+    with LocalServer(model.app) as server, tempfile.TemporaryDirectory() as tmp:
+        async def run():
+            agent = AsyncAgent(base_url=f"{server.url}/v1", api_key="test",
+                               cache=AnswerCache(Path(tmp) / "answers.sqlite3"))
+            try:
+                first = await agent.ask("how do I run tests")
+                second = await agent.ask("how do I  run tests")
+                streamed = [piece async for piece in agent.stream("how do I run tests")]
+                fresh = [piece async for piece in agent.stream("write a gmock test")]
+                again = await agent.ask("write a gmock test")
+                return first, second, streamed, fresh, again, agent.cache.stats()
+            finally:
+                await agent.aclose()
+        first, second, streamed, fresh, again, stats = asyncio.run(run())
+    assert first == second == "".join(streamed) and len(streamed) == 1
+    assert "".join(fresh) == again
+    assert len(model.requests) == 2
+    assert stats["hits"] == 3 and stats["entries"] == 2
+    print("✓ Agent answers repeated questions from the cache")
+
+
+def main():
+    """Run all tests"""
+    test_concurrency_limit()
+    test_ask_endpoint()
+    test_ask_stream_endpoint()
+    test_answer_cache()
+    test_agent_uses_cache()
+    print("✓ ALL AGENT TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
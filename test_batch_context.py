@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tests for batch routing and the load_context_batch tool
+"""
+
+import asyncio
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from context_builder import merge_plans
+from context_store import DocumentStore
+from routing import rank_docs, rank_docs_batch
+from test_context_store import make_corpus
+
+WORDS = ["mock", "test", "design", "module", "filter", "run", "call", "return", "value", "class"]
+
+
+def test_batch_matches_single():
+    """The vectorized ranking gives exactly what rank_docs gives per prompt"""
+    rng = random.Random(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        docs = {f"context/d{i}.md": " ".join(rng.choice(WORDS) for _ in range(40)) for i in range(30)}
+        when = {path: rng.sample(WORDS, 2) for path in docs}
+        make_corpus(root, docs, when)
+        store = DocumentStore(root)
+        manifest = store.manifest()
+        prompts = [" ".join(rng.choice(WORDS + ["zebra"]) for _ in range(rng.randint(1, 6)))
+                   for _ in range(50)] + ["", "zebra", "desgin modle"]
+        for word_boundary in (None, True):
+            batch = rank_docs_batch(store, manifest, prompts, word_boundary)
+            assert batch == [rank_docs(store, manifest, prompt, word_boundary) for prompt in prompts]
+        assert rank_docs_batch(store, manifest, []) == []
+    print("✓ Batch ranking matches rank_docs for every prompt")
+
+
+def test_merge_plans():
+    plans = [
+        (("a.md", ("x",), 1.0, ("a/one",)), ("b.md", ("y",), 2.0, None)),
+        (("a.md", ("x",), 3.0, ("a/two", "a/one")), ("b.md", ("y",), 1.0, ("b/one",))),
+        (),
+    ]
+    assert merge_plans(plans) == (("a.md", ("x",), 3.0, ("a/one", "a/two")),
+                                  ("b.md", ("y",), 2.0, None))
+    print("✓ Shared documents are merged with the union of their sections")
+
+
+def test_batch_tool():
+    """load_context_batch returns every document once plus the documents per prompt"""
+    import mcp_server_http as server
+
+    prompts = ["write a gmock test", "how do I mock a method with gmock", "zzzz qqqq"]
+    result = asyncio.run(server.call_tool("load_context_batch", {"prompts": prompts}))
+    text = result[0].text
+    assert text.count("=== Base Context ===") == 1
+    assert text.count("--- context/testing/GTest_Mock.md") == 1
+    results = text[text.index("=== Results per Prompt ==="):]
+    assert results.count("context/testing/GTest_Mock.md") == 2
+    assert "[3] zzzz qqqq\n  (no specific documentation matched)" in results
+
+    single = asyncio.run(server.call_tool("load_context_batch", {"prompts": prompts[:1]}))[0].text
+    assert single.startswith(server.build_context_response(prompts[0]))
+
+    for bad in ({}, {"prompts": []}, {"prompts": "text"}, {"prompts": ["ok", ""]},
+                {"prompts": ["x"] * (server.MAX_BATCH_PROMPTS + 1)}, {"prompts": ["x"], "max_docs": 0}):
+        assert asyncio.run(server.call_tool("load_context_batch", bad))[0].text.startswith("Error"), bad
+    print("✓ load_context_batch deduplicates shared documents")
+
+
+def main():
+    """Run all tests"""
+    test_batch_matches_single()
+    test_merge_plans()
+    test_batch_tool()
+    print("✓ ALL BATCH CONTEXT TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for the synthetic corpus generator and baseline comparison of benchmark.py
+"""
+
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import mcp_server
+from benchmark import find_regressions, generate_corpus, make_prompts, run_benchmarks
+
+
+def test_corpus_is_reproducible():
+    with tempfile.TemporaryDirectory() as a, tempfile.TemporaryDirectory() as b:
+        pool = generate_corpus(Path(a), docs=20, doc_size=600, keywords_per_doc=3, seed=7)
+        assert generate_corpus(Path(b), docs=20, doc_size=600, keywords_per_doc=3, seed=7) == pool
+        manifest = json.loads((Path(a) / "context" / "manifest.json").read_text(encoding="utf-8"))
+        assert len(manifest["docs"]) == 20
+        assert all(len(doc["when"]) == 3 for doc in manifest["docs"])
+        first = manifest["docs"][0]["path"]
+        assert (Path(a) / first).read_bytes() == (Path(b) / first).read_bytes()
+        assert len((Path(a) / first).read_text(encoding="utf-8")) >= 600
+        prompts = make_prompts(pool, 5, prompt_words=8, seed=7)
+        assert prompts == make_prompts(pool, 5, prompt_words=8, seed=7)
+        assert all(len(prompt.split()) == 8 for prompt in prompts)
+    print("✓ Synthetic corpus and prompts are reproducible")
+
+
+def test_run_restores_server():
+    store = mcp_server.STORE
+    run = run_benchmarks(docs=30, doc_size=500, iterations=10, use_pack=True)
+    assert mcp_server.STORE is store
+    assert run["config"]["docs"] == 30
+    for name in ("select_relevant_docs", "build_context_response", "list_all_contexts",
+                 "skills_lookup", "skills_cold_start", "agent_select_docs"):
+        assert run["results"][name]["p50_ms"] >= 0, name
+    print("✓ Benchmarks run on a small corpus and leave the server untouched")
+
+
+def test_regression_check():
+    config = {"docs": 10}
+    baseline = {"config": config, "results": {"a": {"p50_ms": 1.0}, "b": {"p50_ms": 2.0}}}
+    run = {"config": config, "results": {"a": {"p50_ms": 1.2}, "b": {"p50_ms": 3.0}, "c": {"p50_ms": 9.0}}}
+    regressions = find_regressions(run, baseline, threshold=0.25)
+    assert len(regressions) == 1 and regressions[0].startswith("b:")
+
+    # Cold start and process spawn timings get the wider allowance
+    baseline["results"]["python_startup"] = {"p50_ms": 10.0}
+    run["results"]["python_startup"] = {"p50_ms": 18.0}
+    assert [line.split(":")[0] for line in find_regressions(run, baseline, 0.25)] == ["b"]
+    run["results"]["python_startup"] = {"p50_ms": 21.0}
+    assert [line.split(":")[0] for line in find_regressions(run, baseline, 0.25)] == ["b", "python_startup"]
+    assert [line.split(":")[0] for line in find_regressions(run, baseline, 0.25, 1.5)] == ["b"]
+    try:
+        find_regressions({"config": {"docs": 20}, "results": {}}, baseline)
+        raise AssertionError("expected a configuration mismatch")
+    except ValueError:
+        pass
+    print("✓ Regressions beyond the threshold are reported")
+
+
+def main():
+    """Run all tests"""
+    test_corpus_is_reproducible()
+    test_run_restores_server()
+    test_regression_check()
+    print("✓ ALL BENCHMARK TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for section-level markdown chunking
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import chunking
+import context_builder
+import mcp_server
+import mcp_server_http
+from chunking import content_digest, find_section, select_sections, split_sections
+from context_builder import estimate_tokens
+
+DOC = """# Guide
+Intro text – with a non-ASCII dash.
+
+## Setup
+Install the tools.
+
+```bash
+# not a heading
+make install
+```
+
+## Usage
+### Return Values
+Use WillOnce to return a value.
+
+### Cardinality
+Use Times to limit calls.
+
+## Usage
+Second section with the same title.
+"""
+
+
+def test_split_by_heading():
+    """Headings inside code fences are ignored and IDs follow the heading path"""
+    ids = [s.id for s in split_sections(DOC)]
+    assert ids == ["guide", "guide/setup", "guide/usage", "guide/usage/return-values",
+                   "guide/usage/cardinality", "guide/usage-2"]
+    setup = find_section(DOC, "guide/setup")
+    assert "make install" in setup.text
+    assert setup.breadcrumb == ("Guide", "Setup")
+    print(f"✓ Section IDs: {ids}")
+
+
+def test_byte_offsets():
+    """Offsets index into the UTF-8 encoded document"""
+    data = DOC.encode("utf-8")
+    for section in split_sections(DOC):
+        assert data[section.start:section.end].decode("utf-8") == section.text
+    assert split_sections(DOC)[-1].end == len(data)
+    print("✓ Byte offsets round-trip")
+
+
+def test_select_sections():
+    """Only the matching sections are selected, in document order"""
+    selected = select_sections(DOC, "how do I return a value with WillOnce")
+    assert [s.id for s in selected] == ["guide/usage/return-values"]
+    assert select_sections(DOC, "completely unrelated words") is None
+    assert find_section(DOC, "Cardinality").id == "guide/usage/cardinality"
+    print("✓ Relevant sections selected")
+
+
+def test_caches_hold_no_text():
+    """Section layouts and token estimates are cached by digest, without the document text"""
+    text = DOC + "\n".join(f"filler line {i} with words" for i in range(200))
+    first, second = split_sections(text), split_sections(text)
+    assert first == second and first is not second
+    layout = chunking._layouts.get(content_digest(text.encode("utf-8")))
+    assert [entry[0] for entry in layout] == [section.id for section in first]
+    assert not any(isinstance(value, str) and len(value) > 100 for entry in layout for value in entry)
+
+    tokens = estimate_tokens(text)
+    assert tokens > 0 and context_builder._long_estimates.get(content_digest(text.encode("utf-8"))) == tokens
+    print("✓ Section and token caches are keyed by digest and hold no text")
+
+
+def test_get_context_file_reports_read_errors():
+    """A section of an unreadable file is reported as the read error, not as a missing section"""
+    for server in (mcp_server, mcp_server_http):
+        (result,) = asyncio.run(server.call_tool(
+            "get_context_file", {"file_path": "context/missing.md", "section": "setup"}))
+        assert "Error reading context/missing.md" in result.text, result.text
+        assert "Available sections" not in result.text
+        (whole,) = asyncio.run(server.call_tool("get_context_file", {"file_path": "context/missing.md"}))
+        assert whole.text == result.text
+    print("✓ get_context_file reports read errors for sections too")
+
+
+def main():
+    """Run all tests"""
+    test_split_by_heading()
+    test_byte_offsets()
+    test_select_sections()
+    test_caches_hold_no_text()
+    test_get_context_file_reports_read_errors()
+    print("✓ ALL CHUNKING TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
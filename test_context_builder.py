@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Tests for token-budgeted context assembly
+"""
+
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import tempfile
+
+from context_builder import (ALREADY_SENT_MARKER, DeliveryLog, PackItem, estimate_tokens, pack_items,
+                             render_context, truncate_to_tokens)
+from context_store import DocumentStore
+from test_context_store import make_corpus, touch
+
+
+def test_estimate_tokens():
+    """Estimates scale with text length and count punctuation"""
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("hello world") == 4
+    assert estimate_tokens("EXPECT_CALL(mock, run());") > estimate_tokens("expect call mock run")
+    print("✓ Token estimates")
+
+
+def test_truncate_at_line_boundary():
+    """Truncation keeps whole lines and stays within the budget"""
+    text = "\n".join(f"line number {i}" for i in range(100))
+    cut, tokens = truncate_to_tokens(text, 60)
+    assert tokens <= 60
+    assert cut.endswith("truncated to fit the token budget ...]")
+    assert all(line.startswith("line number") for line in cut.splitlines()[:-1])
+    print(f"✓ Truncated to {tokens} tokens")
+
+
+def test_pack_prefers_high_scores():
+    """Whole items are taken by score, leftover room goes to truncated prefixes"""
+    big = "word " * 400
+    items = [
+        PackItem("base", "", "base rules", required=True),
+        PackItem("low", "", "small low value doc", score=1),
+        PackItem("high", "", big, score=3),
+        PackItem("mid", "", "medium value doc " * 10, score=2),
+    ]
+    packed = pack_items(items, 200)
+
+    keys = [item.key for item, _ in packed.included]
+    assert keys == ["base", "low", "high", "mid"]
+    assert [key for key, _, _ in packed.truncated] == ["high"]
+    assert packed.used_tokens <= 200
+    assert "truncated high" in packed.report()
+
+    packed = pack_items(items, 40)
+    assert "high" in packed.omitted
+    assert pack_items(items, None).report() == ""
+    print("✓ Packing respects score order and budget")
+
+
+def test_delivery_log_skips_sent_documents():
+    """Unchanged documents are referenced on repeat; edited or truncated ones are resent"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, {"context/a.md": "alpha " * 50, "context/b.md": "beta " * 50})
+        store = DocumentStore(root, revalidate_interval=0)
+        plan = (("context/a.md", ("a",), 1.0, None), ("context/b.md", ("b",), 0.5, None))
+        log = DeliveryLog()
+
+        first = render_context(store, plan, delivered=log)
+        assert first == render_context(store, plan) and ALREADY_SENT_MARKER not in first
+        second = render_context(store, plan, delivered=log)
+        assert second.count(ALREADY_SENT_MARKER) == 3 and len(second) < len(first) / 2
+
+        touch(root / "context" / "b.md", "beta changed")
+        store.refresh()
+        third = render_context(store, plan, delivered=log)
+        assert "beta changed" in third and third.count(ALREADY_SENT_MARKER) == 2
+
+        fresh = DeliveryLog()
+        render_context(store, plan[:1], max_tokens=30, delivered=fresh)
+        assert not fresh.has("context/a.md", store.read_text("context/a.md"))
+    print("✓ Delivery log references unchanged documents")
+
+
+def main():
+    """Run all tests"""
+    test_estimate_tokens()
+    test_truncate_at_line_boundary()
+    test_pack_prefers_high_scores()
+    test_delivery_log_skips_sent_documents()
+    print("✓ ALL CONTEXT BUILDER TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Tests for the compiled context pack
+"""
+
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import chunking
+from chunking import content_digest, document_sections, split_sections
+from context_pack import ContextPack, attach_pack, build_pack
+from context_store import DocumentStore
+from keyword_matcher import KeywordMatcher, matcher_for
+from routing import rank_docs
+from search_index import BM25Index, PackedBM25Index
+from skills import SkillsManager
+from test_context_store import make_corpus, touch
+from test_skills import run_cli
+
+WORDS = ["mock", "test", "design", "module", "filter", "run", "call", "return", "value", "class"]
+
+
+def corpus(root: Path):
+    rng = random.Random(5)
+    docs = {f"context/d{i}.md": " ".join(rng.choice(WORDS) for _ in range(30)) for i in range(12)}
+    docs["context/mock.md"] = ("# Mocks\n\nEXPECT_CALL sets expectations on a mock method.\n\n"
+                               "## Matchers\n\nUse Eq() and _ to match arguments.\n")
+    make_corpus(root, docs, when={"context/mock.md": ["gmock", "mock"]})
+
+
+def test_flat_matcher_agrees():
+    """The array form of the automaton finds exactly what the dict form finds"""
+    rng = random.Random(11)
+    docs = [{"path": f"d{i}", "when": ["".join(rng.choice("abc_") for _ in range(rng.randint(1, 4)))
+                                       for _ in range(3)]} for i in range(25)]
+    for word_boundary in (False, True):
+        matcher = KeywordMatcher(docs, word_boundary)
+        flat = KeywordMatcher.from_arrays(matcher.to_arrays(), word_boundary)
+        for _ in range(200):
+            prompt = "".join(rng.choice("abc _") for _ in range(rng.randint(0, 30)))
+            assert flat.match(prompt) == matcher.match(prompt), prompt
+    print("✓ Flat automaton agrees with the compiled one")
+
+
+def test_packed_bm25_agrees():
+    rng = random.Random(2)
+    texts = {f"d{i}": " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40))) for i in range(20)}
+    index = BM25Index()
+    for doc_id, text in texts.items():
+        index.add(doc_id, text)
+    packed = PackedBM25Index(index.to_arrays(list(texts)), list(texts))
+    for query in ["mock test", "design class value", "missing words"]:
+        expected, actual = index.scores(query), packed.scores(query)
+        assert expected.keys() == actual.keys()
+        assert all(abs(expected[k] - actual[k]) < 1e-9 for k in expected)
+    print("✓ Packed BM25 scores match the in-memory index")
+
+
+def test_attached_store_serves_from_pack():
+    """Ranking on a pack gives the same result as loose files, without reading them"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        corpus(root)
+        loose = DocumentStore(root, revalidate_interval=60)
+        packed = DocumentStore(root, revalidate_interval=60)
+        pack = attach_pack(packed, build_pack(root / "snapshot.pack", root))
+        assert pack is not None
+
+        for prompt in ["write a gmock test", "EXPECT_CALL expectations", "design module filter"]:
+            assert rank_docs(packed, packed.manifest(), prompt) == \
+                rank_docs(loose, loose.manifest(), prompt), prompt
+        assert packed.misses == 0
+        assert matcher_for(packed.manifest()) is pack.matcher
+        assert packed.read_text("context/mock.md").startswith("# Mocks")
+        # Packed documents are decoded from the shared pack on each read, not cached per worker
+        assert packed.read_text("context/mock.md") == loose.read_text("context/mock.md")
+        assert packed.misses == 1 and packed.stats()["bytes"] == 0
+        print(f"✓ Pack serves ranking and reads: {packed.stats()}")
+
+
+def test_stale_pack_falls_back():
+    """Documents edited after the pack was built are read and indexed from disk"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        corpus(root)
+        store = DocumentStore(root, revalidate_interval=0)
+        attach_pack(store, build_pack(root / "snapshot.pack", root))
+
+        touch(root / "context" / "d3.md", "zebra zebra zebra crossing")
+        store.refresh()
+        assert not store.is_packed("context/d3.md")
+        assert store.read_text("context/d3.md") == "zebra zebra zebra crossing"
+        ranked = rank_docs(store, store.manifest(), "zebra crossing")
+        assert ranked and ranked[0]["path"] == "context/d3.md"
+
+        # The edited copy replaces the packed one in the corpus statistics too
+        loose = DocumentStore(root, revalidate_interval=0)
+        for prompt in ["zebra crossing", "mock test design", "EXPECT_CALL expectations"]:
+            expected, actual = rank_docs(loose, loose.manifest(), prompt), \
+                rank_docs(store, store.manifest(), prompt)
+            assert [d["path"] for d in actual] == [d["path"] for d in expected], prompt
+            assert all(abs(a["content_score"] - e["content_score"]) <= 0.001
+                       for a, e in zip(actual, expected)), prompt
+        print("✓ Stale documents fall back to the loose files")
+
+
+def test_touched_files_stay_packed():
+    """A file whose mtime changed but whose content did not keeps using the pack"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        corpus(root)
+        store = DocumentStore(root, revalidate_interval=0)
+        attach_pack(store, build_pack(root / "snapshot.pack", root))
+
+        path = root / "context" / "mock.md"
+        touch(path, path.read_text(encoding="utf-8"))
+        store.refresh()
+        assert not store.is_packed("context/mock.md")
+        store.read_text("context/mock.md")
+        assert store.is_packed("context/mock.md")
+        print("✓ Unchanged content is recognised by its hash")
+
+
+def test_sections_and_newlines():
+    """Packed section offsets equal split_sections(), and CRLF files match read_text()"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        corpus(root)
+        (root / "context" / "d0.md").write_bytes(b"# Title\r\n\r\nBody\r\n## Sub\r\nMore\r\n")
+        pack = ContextPack(build_pack(root / "snapshot.pack", root))
+        store = DocumentStore(root)
+        store.attach_pack(pack)
+
+        chunking._layouts.clear()
+        for rel_path in pack.paths:
+            text = store.read_text(rel_path)
+            assert text == (root / rel_path).read_text(encoding="utf-8")
+            # Served from the packed offsets, without splitting the text
+            sections = document_sections(store, rel_path, text)
+            assert chunking._layouts.get(content_digest(text.encode("utf-8"))) is None
+            assert sections == pack.sections(rel_path) == split_sections(text)
+        assert len(pack.content_hash("context/mock.md")) == 32
+        print("✓ Packed sections and newline handling")
+
+
+def test_rejects_changed_manifest():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        corpus(root)
+        pack = build_pack(root / "snapshot.pack", root)
+        make_corpus(root, {"context/other.md": "other"})
+        store = DocumentStore(root)
+        assert attach_pack(store, pack) is None and store.pack is None
+        assert attach_pack(store, root / "missing.pack") is None
+        for junk in (b"", b"short", b"not a pack at all"):
+            (root / "broken.pack").write_bytes(junk)
+            assert attach_pack(store, root / "broken.pack") is None
+        print("✓ Stale or broken packs are ignored")
+
+
+def test_skills_cli_uses_pack():
+    """skills.py show and load read skills from the pack while the files are unchanged"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, {"context/testing/GTest_Mock.md": "# Mock\nEXPECT_CALL\n"})
+        build_pack(None, root)
+        # Same size and mtime as when it was packed: only the pack has the old text
+        path = root / "context" / "testing" / "GTest_Mock.md"
+        st = path.stat()
+        path.write_text("# Mock\nON_CALL_XYZ\n", encoding="utf-8")
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        assert run_cli("--base-dir", tmp, "--no-daemon", "show", "gtest_mock") == \
+            (0, "# Mock\nEXPECT_CALL\n\n", "")
+        status, _, _ = run_cli("--base-dir", tmp, "--no-daemon", "load", "GTest_Mock", "--output", "file")
+        assert status == 0 and (root / ".skill_temp.md").read_text(encoding="utf-8") == "# Mock\nEXPECT_CALL\n"
+        assert SkillsManager(base_dir=root).get_skill_by_name("gtest_mock")["when"] == ["gtest_mock"]
+
+        # Edited since the pack was built: read from disk
+        touch(path, "# Mock\nON_CALL\n")
+        assert run_cli("--base-dir", tmp, "--no-daemon", "show", "gtest_mock")[1] == "# Mock\nON_CALL\n\n"
+        print("✓ skills.py reads skills from the pack")
+
+
+def main():
+    """Run all tests"""
+    test_flat_matcher_agrees()
+    test_packed_bm25_agrees()
+    test_attached_store_serves_from_pack()
+    test_stale_pack_falls_back()
+    test_touched_files_stay_packed()
+    test_sections_and_newlines()
+    test_rejects_changed_manifest()
+    test_skills_cli_uses_pack()
+    print("✓ ALL CONTEXT PACK TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared in-memory document store
+"""
+
+import asyncio
+import json
+import os
+import threading
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from context_store import DocumentStore, configure_io
+
+
+def make_corpus(root: Path, docs: dict[str, str], when: dict[str, list] | None = None):
+    """Write a small context tree with a manifest listing `docs`"""
+    (root / "context").mkdir(parents=True, exist_ok=True)
+    (root / "context" / "base.md").write_text("# Base\n", encoding="utf-8")
+    manifest = {"docs": []}
+    for rel, text in docs.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+        manifest["docs"].append({"path": rel, "when": (when or {}).get(rel, [Path(rel).stem.lower()])})
+    (root / "context" / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+
+
+def touch(path: Path, text: str):
+    """Rewrite a file and push its mtime forward so the change is always visible"""
+    path.write_text(text, encoding="utf-8")
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_serves_from_memory():
+    """Repeated reads hit the cache"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, {"context/a.md": "alpha"})
+        store = DocumentStore(root, revalidate_interval=60)
+        store.warm()
+        misses = store.misses
+
+        assert store.read_text("context/a.md") == "alpha"
+        assert store.misses == misses
+        assert store.hits >= 1
+        print(f"✓ Cache stats: {store.stats()}")
+
+
+def test_revalidates_on_change():
+    """A changed file is re-read and bumps the store version"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, {"context/a.md": "alpha"})
+        store = DocumentStore(root, revalidate_interval=0)
+        assert store.read_text("context/a.md") == "alpha"
+        version = store.version
+
+        touch(root / "context" / "a.md", "alpha v2")
+        assert store.read_text("context/a.md") == "alpha v2"
+        assert store.version > version
+
+        store.manifest()
+        manifest_version = store.manifest_version
+        touch(root / "context" / "manifest.json", json.dumps({"docs": []}))
+        assert store.manifest() == {"docs": []}
+        assert store.manifest_version > manifest_version
+        print("✓ Changed documents and manifest are picked up")
+
+
+def test_lru_byte_budget():
+    """Least recently used documents are evicted once over budget"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, {f"context/d{i}.md": "x" * 100 for i in range(5)})
+        store = DocumentStore(root, max_bytes=250, revalidate_interval=60)
+        for i in range(5):
+            store.read_text(f"context/d{i}.md")
+
+        stats = store.stats()
+        assert stats["bytes"] <= 250
+        assert stats["documents"] == 2
+        assert stats["evictions"] == 3
+        print(f"✓ Budget respected: {stats}")
+
+
+def test_async_reads_off_event_loop():
+    """Disk reads from async code run concurrently in the I/O pool; cached reads do not hop"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, {f"context/d{i}.md": f"doc {i}" for i in range(4)})
+        store = DocumentStore(root, revalidate_interval=60)
+        configure_io(4)
+
+        threads = set()
+        read_text = store.read_text
+
+        def recording_read(rel_path):
+            threads.add(threading.current_thread().name)
+            return read_text(rel_path)
+
+        store.read_text = recording_read
+        paths = [f"context/d{i}.md" for i in range(4)] + ["context/missing.md"]
+
+        async def run():
+            loop_thread = threading.current_thread().name
+            first = await store.read_many_async(paths)
+            cold_threads = set(threads)
+            threads.clear()
+            second = await store.read_many_async(paths[:4])
+            return loop_thread, first, cold_threads, second
+
+        loop_thread, first, cold_threads, second = asyncio.run(run())
+        assert first[:4] == [f"doc {i}" for i in range(4)]
+        assert isinstance(first[4], OSError)
+        assert loop_thread not in cold_threads
+        assert all(name.startswith("context-io") for name in cold_threads)
+        assert second == first[:4] and threads == {loop_thread}
+        print(f"✓ Cold reads ran on {sorted(cold_threads)}")
+
+
+def main():
+    """Run all tests"""
+    test_serves_from_memory()
+    test_revalidates_on_change()
+    test_lru_byte_budget()
+    test_async_reads_off_event_loop()
+    print("✓ ALL DOCUMENT STORE TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
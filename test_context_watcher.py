@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Tests for live reload: snapshot building, the atomic swap, pinned requests and
+both watcher backends
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from context_store import DocumentStore
+from context_watcher import ContextWatcher, build_snapshot, inotify_available
+from routing import rank_docs
+from test_context_store import make_corpus, touch
+
+DOCS = {"context/testing/mock.md": "# Mocks\nEXPECT_CALL sets expectations.\n",
+        "context/design/modules.md": "# Modules\nOne module per feature.\n"}
+
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_snapshot_reuses_unchanged_files():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, DOCS)
+        store = DocumentStore(root)
+        first = build_snapshot(store)
+        assert set(first.texts) == {"context/base.md", *DOCS}
+        assert build_snapshot(store, first) is first
+
+        touch(root / "context" / "testing" / "mock.md", "# Mocks\nON_CALL sets defaults.\n")
+        second = build_snapshot(store, first)
+        assert second.manifest is first.manifest
+        assert second.texts["context/design/modules.md"] is first.texts["context/design/modules.md"]
+        assert "ON_CALL" in second.texts["context/testing/mock.md"]
+    print("✓ Snapshots only re-read changed files")
+
+
+def test_publish_serves_without_stat():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, DOCS)
+        store = DocumentStore(root, revalidate_interval=0)
+        ContextWatcher(store, "poll").reload()
+
+        stats = []
+        original = store._stat
+        store._stat = lambda rel_path: stats.append(rel_path) or original(rel_path)
+        manifest = store.manifest_for("gmock")
+        for doc in manifest["docs"]:
+            store.read_text(doc["path"])
+        version = store.refresh()
+        assert stats == [] and version == store.live.version
+        ranked = rank_docs(store, manifest, "expectations for a mock")
+        assert ranked[0]["path"] == "context/testing/mock.md"
+    print("✓ A published snapshot is served without touching the disk")
+
+
+def test_pinned_request_sees_one_version():
+    """A request pinned before a swap keeps reading the old manifest and documents"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, DOCS)
+        store = DocumentStore(root)
+        watcher = ContextWatcher(store, "poll")
+        watcher.reload()
+
+        with store.pinned() as snapshot:
+            touch(root / "context" / "testing" / "mock.md", "# Mocks v2\n")
+            manifest = json.loads((root / "context" / "manifest.json").read_text(encoding="utf-8"))
+            manifest["docs"].pop()
+            touch(root / "context" / "manifest.json", json.dumps(manifest))
+            assert watcher.reload()
+
+            assert store.manifest() is snapshot.manifest and len(store.manifest()["docs"]) == 2
+            assert store.read_text("context/testing/mock.md") == DOCS["context/testing/mock.md"]
+            assert store.refresh() == snapshot.version
+        assert len(store.manifest()["docs"]) == 1
+        assert store.read_text("context/testing/mock.md") == "# Mocks v2\n"
+        assert store.refresh() > snapshot.version
+    print("✓ Pinned requests finish on the snapshot they started with")
+
+
+def test_swap_is_atomic_under_load():
+    """Readers never see a manifest from one version with a document from another"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, {"context/a.md": "0"}, {"context/a.md": ["v0"]})
+        store = DocumentStore(root)
+        watcher = ContextWatcher(store, "poll")
+        watcher.reload()
+
+        stop, mismatches, reads = threading.Event(), [], [0]
+
+        def reader():
+            while not stop.is_set():
+                with store.pinned():
+                    keyword = store.manifest()["docs"][0]["when"][0]
+                    text = store.read_text("context/a.md")
+                if keyword != f"v{text}":
+                    mismatches.append((keyword, text))
+                reads[0] += 1
+
+        threads = [threading.Thread(target=reader) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for version in range(1, 30):
+            touch(root / "context" / "a.md", str(version))
+            touch(root / "context" / "manifest.json",
+                  json.dumps({"docs": [{"path": "context/a.md", "when": [f"v{version}"]}]}))
+            watcher.reload()
+        stop.set()
+        for thread in threads:
+            thread.join()
+        assert not mismatches, mismatches[:3]
+        assert store.read_text("context/a.md") == "29"
+    print(f"✓ {reads[0]} concurrent reads saw consistent snapshots across 29 swaps")
+
+
+def test_ranking_is_atomic_under_load():
+    """Ranking during reloads uses the content index of the pinned snapshot"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+
+        def version_text(version: int) -> str:
+            return f"marker{version} " + " ".join(f"word{version}x{i}" for i in range(200))
+
+        make_corpus(root, {"context/a.md": version_text(0), "context/b.md": "unrelated"},
+                    {"context/a.md": ["alpha"], "context/b.md": ["beta"]})
+        store = DocumentStore(root)
+        watcher = ContextWatcher(store, "poll")
+        watcher.reload()
+
+        stop, problems, ranks = threading.Event(), [], [0]
+
+        def reader():
+            while not stop.is_set():
+                try:
+                    with store.pinned():
+                        version = store.read_text("context/a.md").split()[0][len("marker"):]
+                        ranked = rank_docs(store, store.manifest(), f"alpha marker{version}")
+                    if not ranked or ranked[0]["content_score"] <= 0:
+                        problems.append((version, ranked))
+                except Exception as e:
+                    problems.append(repr(e))
+                ranks[0] += 1
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        threads = [threading.Thread(target=reader) for _ in range(4)]
+        try:
+            for thread in threads:
+                thread.start()
+            for version in range(1, 30):
+                touch(root / "context" / "a.md", version_text(version))
+                watcher.reload()
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            sys.setswitchinterval(interval)
+        assert not problems, problems[:3]
+        assert rank_docs(store, store.manifest(), "alpha marker29")[0]["content_score"] > 0
+    print(f"✓ {ranks[0]} concurrent rankings matched their snapshot across 29 swaps")
+
+
+def test_broken_manifest_keeps_previous():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, DOCS)
+        store = DocumentStore(root)
+        watcher = ContextWatcher(store, "poll")
+        watcher.reload()
+        manifest_path = root / "context" / "manifest.json"
+        good = manifest_path.read_text(encoding="utf-8")
+
+        touch(manifest_path, good[:10])
+        watcher.reload()
+        assert len(store.manifest()["docs"]) == 2
+        touch(manifest_path, good.replace("modules.md", "missing.md"))
+        assert watcher.reload()
+        assert [doc["path"] for doc in store.manifest()["docs"]][-1] == "context/design/missing.md"
+    print("✓ A half-written manifest keeps the previous one")
+
+
+def check_backend(backend: str):
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, DOCS)
+        store = DocumentStore(root)
+        watcher = ContextWatcher(store, backend, interval=0.05).start()
+        try:
+            started = time.perf_counter()
+            touch(root / "context" / "testing" / "mock.md", "# Mocks v2\n")
+            assert wait_for(lambda: store.read_text("context/testing/mock.md") == "# Mocks v2\n")
+            elapsed = (time.perf_counter() - started) * 1000
+
+            # An editor saving through a temporary file and a rename
+            tmp_path = root / "context" / "design" / ".modules.md.swp"
+            tmp_path.write_text("# Modules v2\n", encoding="utf-8")
+            os.replace(tmp_path, root / "context" / "design" / "modules.md")
+            assert wait_for(lambda: store.read_text("context/design/modules.md") == "# Modules v2\n")
+
+            (root / "context" / "new").mkdir()
+            (root / "context" / "new" / "doc.md").write_text("# New\n", encoding="utf-8")
+            manifest = json.loads((root / "context" / "manifest.json").read_text(encoding="utf-8"))
+            manifest["docs"].append({"path": "context/new/doc.md", "when": ["new"]})
+            touch(root / "context" / "manifest.json", json.dumps(manifest))
+            assert wait_for(lambda: "context/new/doc.md" in store.live.texts)
+        finally:
+            watcher.stop()
+    return elapsed
+
+
+def test_poll_backend():
+    elapsed = check_backend("poll")
+    print(f"✓ Polling picks up edits ({elapsed:.0f} ms)")
+
+
+def test_inotify_backend():
+    if not inotify_available():
+        print("- inotify not available, skipped")
+        return
+    elapsed = check_backend("inotify")
+    print(f"✓ inotify picks up edits ({elapsed:.0f} ms)")
+
+
+def main():
+    """Run all tests"""
+    test_snapshot_reuses_unchanged_files()
+    test_publish_serves_without_stat()
+    test_pinned_request_sees_one_version()
+    test_swap_is_atomic_under_load()
+    test_ranking_is_atomic_under_load()
+    test_broken_manifest_keeps_previous()
+    test_poll_backend()
+    test_inotify_backend()
+    print("✓ ALL CONTEXT WATCHER TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
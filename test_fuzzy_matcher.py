@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Tests for typo-tolerant fuzzy matching
+"""
+
+import random
+import string
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from context_store import DocumentStore
+from fuzzy_matcher import MIN_SIMILARITY, FuzzyMatcher, bigrams
+from routing import rank_docs, rank_docs_batch
+from test_context_store import make_corpus
+
+
+def test_typos_select_documents():
+    """Misspelled keywords and titles still select the right document"""
+    from mcp_server import select_relevant_docs
+
+    for prompt, expected in [("how do I gmok a method", "context/testing/GTest_Mock.md"),
+                             ("expect call twice", "context/testing/GTest_Mock.md"),
+                             ("the architechture overview", "context/design/Design.md"),
+                             ("gtest exeucte options", "context/testing/GTest_Execute.md")]:
+        docs = select_relevant_docs(prompt)
+        assert docs and docs[0]["path"] == expected, (prompt, docs)
+        assert docs[0]["keyword_hits"] == 0 and docs[0]["fuzzy_score"] >= MIN_SIMILARITY
+    assert select_relevant_docs("qqqq zzzz") == []
+    print("✓ Typos in keywords and titles are matched")
+
+
+def test_exact_hits_skip_fuzzy():
+    """The fuzzy stage only runs when no keyword matches verbatim"""
+    from mcp_server import select_relevant_docs
+
+    docs = select_relevant_docs("write a gmock test for the desing")
+    assert [doc["path"] for doc in docs] == ["context/testing/GTest_Mock.md"]
+    assert docs[0]["fuzzy_score"] == 0.0
+    print("✓ Exact keyword hits take precedence")
+
+
+def test_batch_matches_single():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, {"context/Mock_Guide.md": "# Mocks\n", "context/Runner.md": "# Runner\n"},
+                    {"context/Mock_Guide.md": ["gmock", "expect_call"], "context/Runner.md": ["ctest"]})
+        store = DocumentStore(root)
+        manifest = store.manifest()
+        prompts = ["gmok please", "expect call", "ctset", "mock guide", "gmock", "nothing here"]
+        assert rank_docs_batch(store, manifest, prompts) == \
+            [rank_docs(store, manifest, prompt) for prompt in prompts]
+        assert rank_docs(store, manifest, "gmok please", fuzzy=False) == []
+    print("✓ Batch ranking applies the same fuzzy fallback")
+
+
+def test_near_matches_add_up():
+    """Each near match adds its similarity (below one hit), so several can exceed one"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, {"context/Mock_Guide.md": "# Mocks\n"},
+                    {"context/Mock_Guide.md": ["gmock", "expect_call"]})
+        store = DocumentStore(root)
+        manifest = store.manifest()
+        (one,) = rank_docs(store, manifest, "gmok", use_content=False)
+        (two,) = rank_docs(store, manifest, "gmok expect cal", use_content=False)
+        assert MIN_SIMILARITY <= one["fuzzy_score"] < 1 < two["fuzzy_score"], (one, two)
+        assert one["score"] == one["fuzzy_score"] and two["score"] == two["fuzzy_score"]
+    print("✓ Near matches add up per document")
+
+
+def test_lsh_finds_near_duplicates_quickly():
+    """LSH candidates agree with brute force, and lookups stay fast on a large manifest"""
+    rng = random.Random(7)
+    keywords = list({"".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 10)))
+                     for _ in range(20000)})
+    matcher = FuzzyMatcher([{"path": f"context/{i}.md", "when": [keyword]}
+                            for i, keyword in enumerate(keywords)], titles=False)
+
+    typos = []
+    for keyword in rng.sample(keywords, 100):
+        i = rng.randrange(len(keyword))
+        typos.append(keyword[:i] + keyword[i + 1:] if rng.random() < 0.5 else
+                     keyword[:i] + rng.choice(string.ascii_lowercase) + keyword[i + 1:])
+
+    missed, phrase_bigrams = 0, [bigrams(phrase) for phrase in matcher.phrases]
+    for typo in typos:
+        grams = bigrams(typo)
+        expected = {i for i, phrase_grams in enumerate(phrase_bigrams)
+                    if len(grams & phrase_grams) / len(grams | phrase_grams) >= MIN_SIMILARITY}
+        missed += len(expected - set(matcher.matched_phrases(typo)))
+    assert missed <= len(typos) // 20, missed
+
+    start = time.perf_counter()
+    for typo in typos:
+        matcher.match(f"how do I use {typo} here")
+    per_call = (time.perf_counter() - start) / len(typos) * 1000
+    assert per_call < 5, per_call
+    print(f"✓ {len(keywords)} keywords: {per_call:.3f} ms per lookup, {missed} near matches missed")
+
+
+def main():
+    """Run all tests"""
+    test_typos_select_documents()
+    test_exact_hits_skip_fuzzy()
+    test_batch_matches_single()
+    test_near_matches_add_up()
+    test_lsh_finds_near_duplicates_quickly()
+    print("✓ ALL FUZZY MATCHER TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
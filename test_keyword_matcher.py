@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests for the Aho-Corasick keyword matcher
+"""
+
+import random
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from keyword_matcher import AhoCorasick, KeywordMatcher, matcher_for
+
+
+def test_automaton_finds_all_occurrences():
+    """Overlapping and nested patterns are all reported"""
+    automaton = AhoCorasick(["he", "she", "his", "hers"])
+    found = sorted((start, automaton.patterns[i]) for start, _, i in automaton.iter_matches("ushers"))
+    assert found == [(1, "she"), (2, "he"), (2, "hers")]
+    print(f"✓ Matches in 'ushers': {found}")
+
+
+def test_agrees_with_substring_search():
+    """Without word boundaries the counts equal the naive `keyword in prompt` scan"""
+    rng = random.Random(7)
+    alphabet = "abc _"
+    docs = [{"path": f"d{i}", "when": ["".join(rng.choice("abc") for _ in range(rng.randint(1, 4)))
+                                       for _ in range(3)]} for i in range(20)]
+    matcher = KeywordMatcher(docs)
+    for _ in range(200):
+        prompt = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        expected = {}
+        for i, doc in enumerate(docs):
+            hits = sum(1 for k in doc["when"] if k in prompt)
+            if hits:
+                expected[i] = hits
+        assert matcher.match(prompt) == expected, prompt
+    print("✓ Automaton agrees with naive substring matching")
+
+
+def test_word_boundary():
+    """Word-boundary mode rejects keywords embedded inside other words"""
+    docs = [{"path": "execute.md", "when": ["run", "ctest"]}, {"path": "mock.md", "when": ["mock"]}]
+    loose = KeywordMatcher(docs)
+    strict = KeywordMatcher(docs, word_boundary=True)
+
+    assert loose.match("truncate the string") == {0: 1}
+    assert strict.match("truncate the string") == {}
+    assert strict.match("Running tests with CTest") == {0: 2}
+    assert strict.match("mocking a class") == {1: 1}
+    print("✓ 'run' no longer matches 'truncate' in word-boundary mode")
+
+
+def test_compiled_once_per_manifest():
+    """The same manifest object reuses its compiled automaton"""
+    manifest = {"word_boundary": True, "docs": [{"path": "a.md", "when": ["alpha"]}]}
+    first = matcher_for(manifest)
+    assert matcher_for(manifest) is first
+    assert first.word_boundary
+    assert matcher_for(dict(manifest)) is not first
+    print("✓ Matcher cached per manifest version")
+
+
+def main():
+    """Run all tests"""
+    test_automaton_finds_all_occurrences()
+    test_agrees_with_substring_search()
+    test_word_boundary()
+    test_compiled_once_per_manifest()
+    print("✓ ALL KEYWORD MATCHER TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Tests for the SSE load generator
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from loadgen import OPERATIONS, LocalServer, generate_load, percentile
+
+
+def test_percentile():
+    samples = [float(i) for i in range(1, 101)]
+    assert percentile(samples, 50) == 50.0
+    assert percentile(samples, 95) == 95.0
+    assert percentile(samples, 99) == 99.0
+    assert percentile([3.0], 99) == 3.0
+    print("✓ Nearest-rank percentiles")
+
+
+def test_load_against_local_server():
+    """Concurrent sessions all complete and every tool call is counted"""
+    with LocalServer() as server:
+        report = asyncio.run(generate_load(server.url, clients=4, rounds=3))
+    assert report["failed_clients"] == 0, report["failures"]
+    ops = report["operations"]
+    assert set(ops) == set(OPERATIONS)
+    assert ops["initialize"]["count"] == 4 and ops["list_tools"]["count"] == 4
+    assert ops["load_context"]["count"] == 12 and ops["get_context_file"]["count"] == 12
+    assert all(stats["errors"] == 0 for stats in ops.values())
+    assert report["requests"] == 32 and report["requests_per_second"] > 0
+    print(f"✓ Load generator: {report['requests_per_second']} req/s over {report['clients']} sessions")
+
+
+def main():
+    """Run all tests"""
+    test_percentile()
+    test_load_against_local_server()
+    print("✓ ALL LOAD GENERATOR TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Tests for sharded manifests: routing, lazy shard loading and packing
+"""
+
+import asyncio
+import json
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from context_builder import prefetch_context
+from context_pack import attach_pack, build_pack
+from context_store import DocumentStore
+from manifest_shards import build_routes
+from routing import rank_docs
+from test_context_store import make_corpus, touch
+
+SHARDS = {
+    "context/testing/manifest.json": {
+        "context/testing/mock.md": (["mock", "gmock"], "# Mocks\nEXPECT_CALL sets expectations.\n"),
+        "context/testing/runner.md": (["ctest", "test runner"], "# Runner\nRun ctest to run tests.\n"),
+    },
+    "context/design/manifest.json": {
+        "context/design/modules.md": (["module", "design"], "# Modules\nOne module per feature.\n"),
+    },
+}
+
+
+def make_sharded(root: Path):
+    """Write a root manifest with one document of its own plus two shards"""
+    make_corpus(root, {"context/style.md": "# Style\nFormat with clang-format.\n"},
+                {"context/style.md": ["style", "format"]})
+    manifest = json.loads((root / "context" / "manifest.json").read_text(encoding="utf-8"))
+    manifest["include"] = list(SHARDS)
+    (root / "context" / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+    for shard_path, docs in SHARDS.items():
+        shard = {"docs": []}
+        for rel, (when, text) in docs.items():
+            (root / rel).parent.mkdir(parents=True, exist_ok=True)
+            (root / rel).write_text(text, encoding="utf-8")
+            shard["docs"].append({"path": rel, "when": when})
+        (root / shard_path).write_text(json.dumps(shard), encoding="utf-8")
+
+
+def make_flat(root: Path):
+    """The same corpus with every document listed in one manifest"""
+    docs, when = {"context/style.md": "# Style\nFormat with clang-format.\n"}, {"context/style.md": ["style", "format"]}
+    for shard in SHARDS.values():
+        for rel, (keywords, text) in shard.items():
+            docs[rel], when[rel] = text, keywords
+    make_corpus(root, docs, when)
+
+
+def test_routes_load_matching_shards():
+    """Only the shards a prompt can match are loaded"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_sharded(root)
+        build_routes(root, "context/manifest.json")
+        store = DocumentStore(root)
+
+        assert [doc["path"] for doc in store.manifest()["docs"]] == ["context/style.md"]
+        docs = [doc["path"] for doc in store.manifest_for("write a gmock test")["docs"]]
+        assert docs == ["context/style.md", "context/testing/mock.md", "context/testing/runner.md"]
+        assert "context/design/manifest.json" not in store._shards
+        assert "include" not in store.manifest_for("fix the style")
+        assert "context/design/manifest.json" not in store._shards
+        docs = [doc["path"] for doc in store.manifest_for("add a new modul")["docs"]]
+        assert docs[-1] == "context/design/modules.md"
+
+        assert len(store.manifest_all()["docs"]) == 4
+        assert set(store._shards) == set(SHARDS)
+    print("✓ Prompts only load the shards they can match")
+
+
+def test_prefetch_loads_routed_shards():
+    """prefetch_context loads the shards a prompt routes to, and their documents, in the I/O pool"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_sharded(root)
+        build_routes(root, "context/manifest.json")
+        store = DocumentStore(root, revalidate_interval=60)
+
+        threads = []
+        for name in ("_load_shard", "_stat"):
+            method = getattr(store, name)
+            setattr(store, name, lambda *args, method=method:
+                    threads.append(threading.current_thread()) or method(*args))
+        asyncio.run(prefetch_context(store, ["write a gmock test"]))
+        assert "context/testing/manifest.json" in store._shards
+        assert "context/design/manifest.json" not in store._shards
+        assert threads and threading.main_thread() not in threads
+        assert not store.needs_io("context/testing/mock.md")
+
+        # Selection afterwards runs from memory
+        threads.clear()
+        ranked = rank_docs(store, store.manifest_for("write a gmock test"), "write a gmock test")
+        assert ranked[0]["path"] == "context/testing/mock.md" and threads == []
+    print("✓ Prefetch loads routed shards and their documents off the event loop")
+
+
+def test_stale_routes_load_eagerly():
+    """Shards changed since the routing table was built (or missing from it) are always loaded"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_sharded(root)
+        store = DocumentStore(root)
+        assert len(store.manifest_for("zzzz")["docs"]) == 4
+
+        build_routes(root, "context/manifest.json")
+        shard = root / "context" / "design" / "manifest.json"
+        data = json.loads(shard.read_text(encoding="utf-8"))
+        data["docs"][0]["when"].append("architecture")
+        touch(shard, json.dumps(data))
+        store = DocumentStore(root)
+        docs = [doc["path"] for doc in store.manifest_for("architecture")["docs"]]
+        assert docs == ["context/style.md", "context/design/modules.md"]
+    print("✓ Stale shards are loaded without consulting the routing table")
+
+
+def test_ranking_matches_flat_manifest():
+    """Keyword matches rank exactly as they would with one flat manifest"""
+    prompts = ["write a gmock test", "run ctest", "design a module", "format the style", "zzzz"]
+    with tempfile.TemporaryDirectory() as sharded_tmp, tempfile.TemporaryDirectory() as flat_tmp:
+        make_sharded(Path(sharded_tmp))
+        build_routes(Path(sharded_tmp), "context/manifest.json")
+        make_flat(Path(flat_tmp))
+        for prompt in prompts:
+            sharded, flat = DocumentStore(Path(sharded_tmp)), DocumentStore(Path(flat_tmp))
+            ranked = [(doc["path"], doc["score"]) for doc in
+                      rank_docs(sharded, sharded.manifest_for(prompt), prompt, use_content=False)]
+            expected = [(doc["path"], doc["score"]) for doc in
+                        rank_docs(flat, flat.manifest(), prompt, use_content=False)]
+            assert ranked == expected, prompt
+    print("✓ Sharded ranking matches the flat manifest")
+
+
+def test_shard_edits_are_picked_up():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_sharded(root)
+        build_routes(root, "context/manifest.json")
+        store = DocumentStore(root, revalidate_interval=0)
+        store.manifest_for("gmock")
+        version = store.version
+
+        shard = root / "context" / "testing" / "manifest.json"
+        data = json.loads(shard.read_text(encoding="utf-8"))
+        data["docs"].pop()
+        touch(shard, json.dumps(data))
+        assert store.refresh() > version
+        docs = [doc["path"] for doc in store.manifest_for("gmock")["docs"]]
+        assert docs == ["context/style.md", "context/testing/mock.md"]
+    print("✓ Edited shards are reloaded")
+
+
+def test_pack_records_shards():
+    """A pack flattens the shards, and goes stale when one of them changes"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_sharded(root)
+        build_routes(root, "context/manifest.json")
+        pack_path = build_pack(root / "context.pack", root)
+        store = DocumentStore(root)
+        pack = attach_pack(store, pack_path)
+        assert pack is not None and pack.sharded
+        assert len(pack.manifest_doc_paths()) == 4
+        assert len(store.manifest_all()["docs"]) == 4
+        assert store.read_text("context/design/modules.md").startswith("# Modules")
+
+        touch(root / "context" / "design" / "manifest.json", json.dumps({"docs": []}))
+        assert attach_pack(DocumentStore(root), pack_path) is None
+    print("✓ Packs cover every shard and notice shard edits")
+
+
+def main():
+    """Run all tests"""
+    test_routes_load_matching_shards()
+    test_prefetch_loads_routed_shards()
+    test_stale_routes_load_eagerly()
+    test_ranking_matches_flat_manifest()
+    test_shard_edits_are_picked_up()
+    test_pack_records_shards()
+    print("✓ ALL MANIFEST SHARD TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for the Prometheus metrics of the HTTP server
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from metrics import Registry, text_size
+from starlette.testclient import TestClient
+
+
+def test_exposition_format():
+    registry = Registry()
+    calls = registry.counter("calls_total", "Calls", ("tool",))
+    latency = registry.histogram("latency_seconds", "Latency", (0.1, 1.0), ("tool",))
+    calls.inc("load_context")
+    calls.inc("load_context")
+    latency.observe(0.05, "load_context")
+    latency.observe(0.5, "load_context")
+    latency.observe(5, "load_context")
+
+    text = registry.render()
+    assert "# TYPE calls_total counter" in text
+    assert 'calls_total{tool="load_context"} 2' in text
+    assert 'latency_seconds_bucket{tool="load_context",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{tool="load_context",le="1"} 2' in text
+    assert 'latency_seconds_bucket{tool="load_context",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{tool="load_context"} 3' in text
+    assert text_size("héllo") == 6 and text_size("hello") == 5
+    print("✓ Prometheus text format")
+
+
+def test_metrics_endpoint():
+    """Tool calls show up on /metrics"""
+    import mcp_server_http as server
+
+    # Other tests in the same process may already have called tools
+    before = dict(server.TOOL_CALLS._values)
+    matched_before = sum(server.MATCHED_DOCS._series.get((), [[], 0])[0])
+
+    async def calls():
+        await server.call_tool("load_context", {"prompt": "write a gmock test"})
+        await server.call_tool("load_context", {"prompt": "write a gmock test"})
+        await server.call_tool("load_context", {})
+        await server.call_tool("no_such_tool", {})
+    asyncio.run(calls())
+
+    with TestClient(server.app) as client:
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    text = response.text
+
+    def calls_total(tool, status):
+        return int(before.get((tool, status), 0))
+
+    assert f'mcp_tool_calls_total{{tool="load_context",status="ok"}} {calls_total("load_context", "ok") + 2}' in text
+    assert (f'mcp_tool_calls_total{{tool="load_context",status="error"}} '
+            f'{calls_total("load_context", "error") + 1}') in text
+    assert f'mcp_tool_calls_total{{tool="unknown",status="error"}} {calls_total("unknown", "error") + 1}' in text
+    assert f"mcp_load_context_matched_docs_count {matched_before + 2}" in text
+    assert 'mcp_cache_hits_total{cache="plan"}' in text
+    assert "\nmcp_sse_sessions 0\n" in text
+    print("✓ /metrics reports tool calls and cache stats")
+
+
+def main():
+    """Run all tests"""
+    test_exposition_format()
+    test_metrics_endpoint()
+    print("✓ ALL METRICS TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
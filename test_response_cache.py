@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for the load_context response cache
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from context_builder import plan_context, render_context
+from context_store import DocumentStore
+from response_cache import DEFAULT_MAX_ENTRIES, DEFAULT_TTL, LRUCache, ResponseCache, normalize_prompt
+from routing import rank_docs
+from test_context_store import make_corpus, touch
+
+
+def build(cache, store, prompt):
+    return cache.build(
+        store, prompt, select_options=(3, True), render_options=(True, None),
+        plan=lambda: plan_context(store, rank_docs(store, store.manifest(), prompt)[:3], prompt),
+        render=lambda plan: render_context(store, plan),
+    )
+
+
+def test_normalize_prompt():
+    assert normalize_prompt("  Write a  GMOCK\ttest ") == "write a gmock test"
+    print("✓ Prompt normalization")
+
+
+def test_hits_and_shared_responses():
+    """Repeated prompts hit the plan cache, and prompts with the same docs share a response"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, {"context/mock.md": "Mocks.", "context/design.md": "Design."},
+                    when={"context/mock.md": ["gmock"], "context/design.md": ["design"]})
+        store = DocumentStore(root, revalidate_interval=0)
+        store.warm()
+        cache = ResponseCache(max_entries=16, ttl=60)
+
+        first = build(cache, store, "write a gmock test for Foo")
+        assert build(cache, store, "Write a GMOCK test for  Foo") is first
+        assert build(cache, store, "write a gmock test for Bar") is first
+
+        stats = cache.stats()
+        assert stats["plan_hits"] == 1
+        assert stats["response_hits"] == 2
+        print(f"✓ Cache stats: {stats}")
+
+
+def test_invalidated_by_doc_change():
+    """Editing a matched document invalidates the cached response"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, {"context/mock.md": "Mocks v1."}, when={"context/mock.md": ["gmock"]})
+        store = DocumentStore(root, revalidate_interval=0)
+        store.warm()
+        cache = ResponseCache(max_entries=16, ttl=60)
+
+        assert "Mocks v1." in build(cache, store, "gmock")
+        touch(root / "context" / "mock.md", "Mocks v2.")
+        assert "Mocks v2." in build(cache, store, "gmock")
+        print("✓ Changed documents invalidate cached responses")
+
+
+def test_ttl_and_lru():
+    cache = LRUCache(max_entries=2, ttl=0.05)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.put("c", 3)
+    assert cache.get("a") is None and cache.get("c") == 3
+    time.sleep(0.06)
+    assert cache.get("c") is None
+    print("✓ LRU eviction and TTL expiry")
+
+
+def test_malformed_env_falls_back():
+    saved = {k: os.environ.get(k) for k in ("CONTEXT_RESPONSE_CACHE_SIZE", "CONTEXT_RESPONSE_CACHE_TTL")}
+    os.environ["CONTEXT_RESPONSE_CACHE_SIZE"] = "lots"
+    os.environ["CONTEXT_RESPONSE_CACHE_TTL"] = "5m"
+    try:
+        cache = ResponseCache()
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+    assert cache.plans.max_entries == DEFAULT_MAX_ENTRIES
+    assert cache.plans.ttl == DEFAULT_TTL
+    print("✓ Malformed cache settings fall back to the defaults")
+
+
+def main():
+    """Run all tests"""
+    test_normalize_prompt()
+    test_hits_and_shared_responses()
+    test_invalidated_by_doc_change()
+    test_ttl_and_lru()
+    test_malformed_env_falls_back()
+    print("✓ ALL RESPONSE CACHE TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Tests for the BM25 content index and blended document ranking
+"""
+
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from context_store import DocumentStore
+from routing import rank_docs
+from search_index import BM25Index, stem, tokenize
+from test_context_store import make_corpus, touch
+
+
+def test_tokenize_and_stem():
+    """Stopwords are dropped and simple inflections share a stem"""
+    assert tokenize("How do I run the Running tests?") == ["run", "run", "test"]
+    assert stem("matches") == stem("match")
+    assert stem("mocking") == "mock"
+    assert tokenize("EXPECT_CALL(mock_db, query)") == ["expect_call", "mock_db", "query"]
+    print("✓ Tokenizer and stemmer")
+
+
+def test_incremental_matches_rebuild():
+    """Adding, replacing and removing documents gives the same scores as a fresh build"""
+    rng = random.Random(3)
+    words = ["mock", "test", "design", "module", "filter", "run", "call", "return", "value", "class"]
+    texts = {f"d{i}": " ".join(rng.choice(words) for _ in range(rng.randint(5, 40))) for i in range(30)}
+
+    incremental = BM25Index()
+    for doc_id, text in texts.items():
+        incremental.add(doc_id, text)
+    texts["d3"] = "design module architecture"
+    incremental.add("d3", texts["d3"])
+    del texts["d7"]
+    incremental.remove("d7")
+
+    fresh = BM25Index()
+    for doc_id, text in texts.items():
+        fresh.add(doc_id, text)
+
+    for query in ["mock test", "design architecture", "run filter value"]:
+        a, b = incremental.scores(query), fresh.scores(query)
+        assert a.keys() == b.keys()
+        assert all(abs(a[k] - b[k]) < 1e-9 for k in a)
+    print("✓ Incremental updates equal a full rebuild")
+
+
+def test_query_latency_10k_docs():
+    """Queries against a 10k-document corpus stay well under a millisecond"""
+    rng = random.Random(11)
+    vocabulary = [f"term{i}" for i in range(20000)]
+    index = BM25Index()
+    for i in range(10000):
+        index.add(f"doc{i}", " ".join(rng.choice(vocabulary) for _ in range(100)))
+
+    queries = [" ".join(rng.choice(vocabulary) for _ in range(6)) for _ in range(200)]
+    index.scores(queries[0])
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query)
+    per_query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    print(f"✓ Average query time over 10k docs: {per_query_ms:.3f} ms")
+    assert per_query_ms < 1.0
+
+
+def test_content_blended_into_ranking():
+    """Untagged documents are found by content, and edits are re-indexed"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        docs = {f"context/filler{i}.md": f"Unrelated notes number {i} about builds." for i in range(8)}
+        docs["context/mock.md"] = "Mocks record calls. Use WillOnce to return values from a mock call."
+        docs["context/design.md"] = "Layered architecture and module boundaries."
+        when = {path: [f"filler{i}"] for i, path in enumerate(docs)}
+        when.update({"context/mock.md": ["gmock"], "context/design.md": ["design"]})
+        make_corpus(root, docs, when=when)
+        store = DocumentStore(root, revalidate_interval=0)
+
+        ranked = rank_docs(store, store.manifest(), "return values with WillOnce")
+        assert [d["path"] for d in ranked] == ["context/mock.md"]
+        assert ranked[0]["keyword_hits"] == 0
+
+        ranked = rank_docs(store, store.manifest(), "gmock design")
+        assert {d["path"] for d in ranked} == {"context/mock.md", "context/design.md"}
+
+        touch(root / "context" / "design.md", "Use WillOnce to return values, WillOnce again.")
+        ranked = rank_docs(store, store.manifest(), "return values with WillOnce")
+        assert ranked[0]["path"] == "context/design.md"
+        print("✓ Content scores blended with keyword hits")
+
+
+def test_resync_reads_only_changed_documents():
+    """A resync is driven by the store's version and re-reads only the edited documents"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, {f"context/d{i}.md": f"notes {i} about builds" for i in range(50)},
+                    when={"context/d0.md": ["builds"]})
+        store = DocumentStore(root, revalidate_interval=0)
+        rank_docs(store, store.manifest(), "notes")
+
+        reads = []
+        read_text = store.read_text
+        store.read_text = lambda rel_path: reads.append(rel_path) or read_text(rel_path)
+        rank_docs(store, store.manifest(), "notes")
+        assert reads == []
+
+        touch(root / "context" / "d7.md", "zebra crossing notes")
+        ranked = rank_docs(store, store.manifest(), "zebra crossing")
+        assert reads == ["context/d7.md"], reads
+        assert ranked[0]["path"] == "context/d7.md"
+    print("✓ Resync re-reads only the documents that changed")
+
+
+def main():
+    """Run all tests"""
+    test_tokenize_and_stem()
+    test_incremental_matches_rebuild()
+    test_query_latency_10k_docs()
+    test_content_blended_into_ranking()
+    test_resync_reads_only_changed_documents()
+    print("✓ ALL SEARCH INDEX TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Tests for per-session incremental load_context output over SSE
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+
+from context_builder import ALREADY_SENT_MARKER
+from loadgen import LocalServer
+
+PROMPT = "write a gmock test"
+
+
+async def load(session, **arguments):
+    result = await session.call_tool("load_context", {"prompt": PROMPT, **arguments})
+    return result.content[0].text
+
+
+def test_sessions_receive_documents_once():
+    """Repeated load_context calls in one session only reference what was already sent"""
+    async def run(url):
+        async with sse_client(f"{url}/sse") as streams, ClientSession(*streams) as first:
+            await first.initialize()
+            full = await load(first)
+            repeat = await load(first)
+            forced = await load(first, full=True)
+            async with sse_client(f"{url}/sse") as streams, ClientSession(*streams) as second:
+                await second.initialize()
+                other = await load(second)
+        return full, repeat, forced, other
+
+    with LocalServer() as server:
+        full, repeat, forced, other = asyncio.run(run(server.url))
+    assert ALREADY_SENT_MARKER not in full and "GTest_Mock.md" in full
+    assert repeat.count(ALREADY_SENT_MARKER) >= 2 and "--- context/testing/GTest_Mock.md" in repeat
+    assert len(repeat) < len(full)
+    assert forced == full and other == full
+    print(f"✓ Repeat in session: {len(full)} -> {len(repeat)} characters")
+
+
+def main():
+    """Run all tests"""
+    test_sessions_receive_documents_once()
+    print("✓ ALL SESSION DELIVERY TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
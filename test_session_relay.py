@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for the cross-worker session relay used by the HTTP server's --workers mode
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from session_relay import SessionRelay
+from starlette.responses import PlainTextResponse
+
+
+def test_relay_forwards_to_owner():
+    """A POST for another worker's session is answered by that worker"""
+    async def run(run_dir):
+        def handler(name):
+            async def app(scope, receive, send):
+                body = (await receive())["body"]
+                query = scope["query_string"].decode()
+                await PlainTextResponse(f"{name}:{query}:{body.decode()}", status_code=202)(
+                    scope, receive, send)
+            return app
+
+        first = SessionRelay(run_dir, "101", handler("first"))
+        second = SessionRelay(run_dir, "202", handler("second"))
+        await first.start()
+        await second.start()
+        try:
+            sent = []
+
+            async def receive():
+                return {"type": "http.request", "body": b"ping", "more_body": False}
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {"type": "http", "path": "/messages/202/", "query_string": b"session_id=abc",
+                     "headers": [(b"content-type", b"application/json")], "client": ("127.0.0.1", 1)}
+            await first.forward("202", scope, receive, send)
+            assert sent[0]["status"] == 202
+            assert sent[1]["body"] == b"second:session_id=abc:ping"
+
+            sent.clear()
+            await first.forward("303", scope, receive, send)
+            assert sent[0]["status"] == 404
+        finally:
+            await first.stop()
+            await second.stop()
+        assert not list(Path(run_dir).iterdir())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(tmp))
+    print("✓ Session relay forwards to the owning worker")
+
+
+def test_malformed_worker_count():
+    """A bad MCP_HTTP_WORKERS falls back to one worker instead of failing the import"""
+    code = "import mcp_server_http; print(mcp_server_http.WORKERS)"
+    env = {**os.environ, "MCP_HTTP_WORKERS": "four"}
+    result = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).parent, env=env,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == "1", result.stdout
+    print("✓ Malformed worker count falls back to one worker")
+
+
+def main():
+    """Run all tests"""
+    test_relay_forwards_to_owner()
+    test_malformed_worker_count()
+    print("✓ ALL SESSION RELAY TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Tests for the skills CLI: lazy imports, the cached name index, the editor launch
+and the resident daemon
+"""
+
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import skills
+from context_store import DocumentStore
+from skills import SkillsManager, daemon_request, make_server
+from test_context_store import make_corpus, touch
+
+DOCS = {"context/testing/GTest_Mock.md": "# Mock\n", "context/design/Design.md": "# Design\n"}
+
+
+def test_startup_imports():
+    """Importing skills.py loads none of the modules only some commands need"""
+    code = ("import sys, skills; print(sorted(name for name in ('pyperclip', 'subprocess', "
+            "'context_pack', 'context_store', 'manifest_shards', 'numpy') if name in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).parent,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]", result.stdout
+    print("✓ No heavy imports at startup")
+
+
+def test_name_index_is_cached():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, DOCS)
+        first = SkillsManager(base_dir=root)
+        assert first.skill_path("gtest_mock") == "context/testing/GTest_Mock.md"
+        assert first.names_path.exists()
+
+        second = SkillsManager(base_dir=root)
+        assert second.skill_path("DESIGN") == "context/design/Design.md"
+        assert second.skill_path("missing") is None
+        assert second._manifest is None
+        # The manifest entry itself, as before the name index
+        assert second.get_skill_by_name("DESIGN") == {"path": "context/design/Design.md", "when": ["design"]}
+        assert second.get_skill_by_name("missing") is None
+
+        manifest = json.loads(first.manifest_path.read_text(encoding="utf-8"))
+        manifest["docs"].pop()
+        touch(first.manifest_path, json.dumps(manifest))
+        third = SkillsManager(base_dir=root)
+        assert third.get_skill_by_name("design") is None and third._manifest is not None
+    print("✓ The name index is reused until the manifest changes")
+
+
+def test_name_index_covers_shards():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, DOCS)
+        shard = root / "context" / "extra.json"
+        (root / "context" / "Extra.md").write_text("# Extra\n", encoding="utf-8")
+        shard.write_text(json.dumps({"docs": [{"path": "context/Extra.md", "when": ["extra"]}]}),
+                         encoding="utf-8")
+        manifest_path = root / "context" / "manifest.json"
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        manifest["include"] = ["context/extra.json"]
+        manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+
+        assert SkillsManager(base_dir=root).get_skill_by_name("extra") == \
+            {"path": "context/Extra.md", "when": ["extra"]}
+        touch(shard, json.dumps({"docs": []}))
+        assert SkillsManager(base_dir=root).get_skill_by_name("extra") is None
+    print("✓ Shard edits invalidate the name index")
+
+
+def test_copilot_output_does_not_wait_for_editor():
+    """The editor is started in the background; a slow `code` launcher does not block"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, DOCS)
+        launcher = root / "bin" / "code"
+        launcher.parent.mkdir()
+        launcher.write_text("#!/bin/sh\nsleep 3\n", encoding="utf-8")
+        launcher.chmod(0o755)
+
+        path = os.environ.get("PATH", "")
+        os.environ["PATH"] = f"{launcher.parent}{os.pathsep}{path}"
+        try:
+            started = time.perf_counter()
+            content = SkillsManager(base_dir=root).load_skill("gtest_mock", output="copilot")
+            elapsed = time.perf_counter() - started
+        finally:
+            os.environ["PATH"] = path
+        assert content == "# Mock\n"
+        assert (root / ".copilot_context.md").read_text(encoding="utf-8").endswith("# Mock\n")
+        assert elapsed < 1, elapsed
+    print(f"✓ Editor launched without waiting ({elapsed * 1000:.1f} ms)")
+
+
+def run_cli(*argv):
+    """skills.main() with captured stdout, stderr and exit status"""
+    out, err = io.StringIO(), io.StringIO()
+    status = 0
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        try:
+            skills.main(list(argv))
+        except SystemExit as e:
+            status = e.code
+    return status, out.getvalue(), err.getvalue()
+
+
+@contextlib.contextmanager
+def running_daemon(root, store):
+    server = make_server(root, root / ".skills.sock", store)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield root / ".skills.sock"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_daemon_serves_from_memory():
+    """With a daemon running, list/show/load are answered from its memory"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, DOCS)
+        local = {command: run_cli("--base-dir", tmp, "--no-daemon", *command)
+                 for command in (("list",), ("show", "Design"), ("show", "missing"))}
+
+        store = DocumentStore(root, revalidate_interval=3600)
+        store.warm()
+        with running_daemon(root, store) as socket_path:
+            assert daemon_request(socket_path, "ping") == (True, "")
+            started = time.perf_counter()
+            assert daemon_request(socket_path, "show gtest_mock") == (True, "# Mock\n")
+            elapsed = (time.perf_counter() - started) * 1000
+
+            # Same output as in-process, even for a file that is gone from disk meanwhile
+            (root / "context" / "design" / "Design.md").unlink()
+            for command, expected in local.items():
+                assert run_cli("--base-dir", tmp, *command) == expected, command
+            status, out, _ = run_cli("--base-dir", tmp, "load", "design", "--output", "file")
+            assert status == 0 and (root / ".skill_temp.md").read_text(encoding="utf-8") == "# Design\n"
+            assert daemon_request(socket_path, "bogus")[0] is False
+    print(f"✓ Daemon answers like the CLI ({elapsed:.2f} ms per request)")
+
+
+def test_client_falls_back_without_daemon():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_corpus(root, DOCS)
+        assert daemon_request(root / ".skills.sock", "ping") is None
+        # A socket file left behind by a daemon that is gone
+        (root / ".skills.sock").write_text("", encoding="utf-8")
+        assert daemon_request(root / ".skills.sock", "ping") is None
+        assert run_cli("--base-dir", tmp, "show", "design") == (0, "# Design\n\n", "")
+    print("✓ Commands run in-process when no daemon answers")
+
+
+def main():
+    """Run all tests"""
+    test_startup_imports()
+    test_name_index_is_cached()
+    test_name_index_covers_shards()
+    if os.name != "nt":
+        test_copilot_output_does_not_wait_for_editor()
+        test_daemon_serves_from_memory()
+        test_client_falls_back_without_daemon()
+    print("✓ ALL SKILLS TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
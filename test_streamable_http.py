@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests for the stateless streamable-HTTP endpoint (/mcp)
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import httpx
+from mcp import ClientSession
+from mcp.client.streamable_http import streamable_http_client
+
+from context_builder import ALREADY_SENT_MARKER
+from loadgen import LocalServer
+
+PROMPT = "write a gmock test"
+HEADERS = {"Accept": "application/json, text/event-stream"}
+
+
+def rpc(request_id: int, method: str, params: dict | None = None) -> dict:
+    return {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}}
+
+
+def test_client_session():
+    """The SDK client works against /mcp like against /sse"""
+    async def run(url):
+        async with streamable_http_client(f"{url}/mcp") as (read, write, _), \
+                ClientSession(read, write) as session:
+            await session.initialize()
+            tools = await session.list_tools()
+            first = await session.call_tool("load_context", {"prompt": PROMPT})
+            second = await session.call_tool("load_context", {"prompt": PROMPT})
+        return [tool.name for tool in tools.tools], first.content[0].text, second.content[0].text
+
+    with LocalServer() as server:
+        names, first, second = asyncio.run(run(server.url))
+    assert "load_context" in names and "GTest_Mock.md" in first
+    # No session state: every call gets the full documents
+    assert second == first and ALREADY_SENT_MARKER not in second
+    print("✓ Streamable HTTP client session works")
+
+
+def test_single_request_exchanges():
+    """Each POST is answered on its own, in plain JSON, by any replica"""
+    with LocalServer() as first, LocalServer() as second:
+        with httpx.Client(headers=HEADERS, timeout=10) as client:
+            responses = [client.post(f"{server.url}/mcp", json=rpc(i, method, params))
+                         for i, (server, method, params) in enumerate([
+                             (first, "tools/list", None),
+                             (second, "tools/call", {"name": "load_context", "arguments": {"prompt": PROMPT}}),
+                             (first, "tools/call", {"name": "load_context", "arguments": {"prompt": PROMPT}}),
+                         ])]
+    for i, response in enumerate(responses):
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"].startswith("application/json")
+        assert "mcp-session-id" not in response.headers
+        assert response.json()["id"] == i
+    assert responses[1].json()["result"] == responses[2].json()["result"]
+    assert "GTest_Mock.md" in responses[1].json()["result"]["content"][0]["text"]
+    print("✓ tools/list and tools/call are single request/response exchanges")
+
+
+def main():
+    """Run all tests"""
+    test_client_session()
+    test_single_request_exchanges()
+    print("✓ ALL STREAMABLE HTTP TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Tests for per-request tracing: stage spans, the JSON-lines trace file, slow
+request profiles and the cost of tracing when it is off
+"""
+
+import asyncio
+import json
+import sys
+import tempfile
+import threading
+import time
+import types
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mcp.server.lowlevel.server import request_ctx
+from mcp.shared.context import RequestContext
+
+import mcp_server
+import mcp_server_http
+import tracing
+
+
+def read_trace(path: Path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_disabled_is_nearly_free():
+    tracing.configure("")
+    assert tracing.request("load_context") is tracing.span("match")
+
+    calls = 100_000
+    started = time.perf_counter()
+    for _ in range(calls):
+        with tracing.span("match"):
+            pass
+    per_call = (time.perf_counter() - started) / calls * 1e9
+    assert per_call < 2000, per_call
+    print(f"✓ Disabled tracing costs {per_call:.0f} ns per span")
+
+
+def test_spans_per_stage():
+    """Both servers trace the stages of a load_context call"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "trace.jsonl"
+        tracing.configure(path, slow_ms=float("inf"), profile_rate=0)
+        try:
+            for server in (mcp_server, mcp_server_http):
+                prompt = f"write a gmock test {server.__name__}"
+                asyncio.run(server.call_tool("load_context", {"prompt": prompt}))
+                asyncio.run(server.call_tool("load_context", {"prompt": prompt}))
+                asyncio.run(server.call_tool("load_context", {}))
+        finally:
+            tracing.configure("")
+
+        records = read_trace(path)
+        assert len(records) == 6
+        for first, cached, error in (records[:3], records[3:]):
+            assert first["name"] == "load_context" and first["status"] == "ok" and first["bytes"] > 0
+            stages = [span["name"] for span in first["spans"]]
+            # render is skipped when an earlier prompt planned the same documents
+            assert stages in (["prefetch", "match", "plan", "render"], ["prefetch", "match", "plan"]), stages
+            assert all(span["start_ms"] + span["duration_ms"] <= first["duration_ms"] + 0.01
+                       for span in first["spans"])
+            # A repeated prompt is served from the response cache
+            assert [span["name"] for span in cached["spans"]] == ["prefetch"]
+            assert error["status"] == "error" and "slow" not in error and "profile" not in error
+    print("✓ Each stage of load_context is traced")
+
+
+def test_slow_requests_are_profiled():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "trace.jsonl"
+        tracing.configure(path, slow_ms=0, profile_rate=1)
+        try:
+            asyncio.run(mcp_server_http.call_tool("load_context", {"prompt": "profile a mock test"}))
+            tracing.configure(path, slow_ms=float("inf"), profile_rate=1)
+            asyncio.run(mcp_server_http.call_tool("load_context", {"prompt": "profile a design"}))
+        finally:
+            tracing.configure("")
+
+        slow, fast = read_trace(path)
+        assert slow["slow"] and Path(slow["profile"]["path"]).exists()
+        functions = [entry["function"] for entry in slow["profile"]["top"]]
+        assert any("(plan_context)" in function for function in functions), functions
+        assert "profile" not in fast and "slow" not in fast
+        assert len(list(Path(tmp, "trace.jsonl.profiles").iterdir())) == 1
+    print("✓ Sampled requests over the threshold keep their cProfile breakdown")
+
+
+def request_work():
+    return sum(range(20_000))
+
+
+def unrelated_busy_work():
+    return sum(range(20_000))
+
+
+def test_profile_covers_only_the_request():
+    """Coroutines that run while a profiled request awaits stay out of its profile"""
+    async def request():
+        with tracing.request("load_context"):
+            with tracing.span("prefetch", profile=False):
+                await asyncio.sleep(0.05)
+            with tracing.span("plan"):
+                request_work()
+
+    async def other_client():
+        for _ in range(50):
+            unrelated_busy_work()
+            await asyncio.sleep(0)
+
+    async def concurrently():
+        await asyncio.gather(request(), other_client())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "trace.jsonl"
+        tracing.configure(path, slow_ms=0, profile_rate=1)
+        try:
+            asyncio.run(concurrently())
+        finally:
+            tracing.configure("")
+
+        (record,) = read_trace(path)
+        functions = [entry["function"] for entry in record["profile"]["top"]]
+        assert any("(request_work)" in function for function in functions), functions
+        assert not any("(unrelated_busy_work)" in function for function in functions), functions
+    print("✓ Profiles cover the request's synchronous stages only")
+
+
+def test_slow_request_arms_profiling():
+    """A slow request that was not sampled has the next call of that tool profiled"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "trace.jsonl"
+        tracing.configure(path, slow_ms=0, profile_rate=1e-12)
+        try:
+            for prompt in ("arm a mock test", "arm a design", "arm a fixture"):
+                asyncio.run(mcp_server_http.call_tool("load_context", {"prompt": prompt}))
+        finally:
+            tracing.configure("")
+
+        first, second, third = read_trace(path)
+        assert first["slow"] and "profile" not in first
+        assert second["slow"] and Path(second["profile"]["path"]).exists()
+        # Profiled once, the trigger is spent until another slow call goes unprofiled
+        assert "profile" not in third
+    print("✓ A slow request arms profiling of the next call")
+
+
+def test_writes_leave_the_request_thread():
+    """Trace lines and profiles are written by the writer thread, not the event loop"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "trace.jsonl"
+        active = tracing.configure(path, slow_ms=0, profile_rate=1)
+        threads = []
+        for name in ("_save_profile", "_write_line"):
+            def spy(*args, _original=getattr(active, name)):
+                threads.append(threading.current_thread())
+                return _original(*args)
+            setattr(active, name, spy)
+        try:
+            asyncio.run(mcp_server_http.call_tool("load_context", {"prompt": "write out a mock test"}))
+        finally:
+            tracing.configure("")
+
+        (record,) = read_trace(path)
+        assert Path(record["profile"]["path"]).exists()
+        assert len(threads) == 2 and threading.main_thread() not in threads, threads
+        assert not active._profiling
+    print("✓ Trace lines and profiles are written off the request thread")
+
+
+def test_sse_writes_are_traced():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "trace.jsonl"
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        assert tracing.wrap_send(send) is send
+        tracing.configure(path)
+        try:
+            traced = tracing.wrap_send(send)
+            asyncio.run(traced({"type": "http.response.start", "status": 200}))
+            asyncio.run(traced({"type": "http.response.body", "body": b"data: {}\r\n\r\n"}))
+            asyncio.run(traced({"type": "http.response.body", "body":
+                                b"event: endpoint\r\ndata: /messages/?session_id=ab12\r\n\r\n"}))
+            asyncio.run(traced({"type": "http.response.body", "body":
+                                b'event: message\r\ndata: {"jsonrpc":"2.0","id":7,"result":{}}\r\n\r\n'}))
+        finally:
+            tracing.configure("")
+        assert len(sent) == 4
+        plain, endpoint, response = read_trace(path)
+        assert plain["name"] == "sse_write" and plain["bytes"] == 12
+        assert endpoint["session"] == "ab12" and "request_id" not in endpoint
+        assert response["session"] == "ab12" and response["request_id"] == 7
+    print("✓ SSE write-out is traced with its session and request id")
+
+
+def test_calls_carry_request_ids():
+    """A call's trace line has the ids its sse_write record carries"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "trace.jsonl"
+        tracing.configure(path, slow_ms=float("inf"), profile_rate=0)
+        request = types.SimpleNamespace(query_params={"session_id": "ab12"})
+        token = request_ctx.set(RequestContext(request_id=7, meta=None, session=None,
+                                               lifespan_context=None, request=request))
+        try:
+            asyncio.run(mcp_server_http.call_tool("list_contexts", {}))
+        finally:
+            request_ctx.reset(token)
+            tracing.configure("")
+        (record,) = read_trace(path)
+        assert record["session"] == "ab12" and record["request_id"] == 7
+    print("✓ Tool call traces carry the session and request id")
+
+
+def main():
+    """Run all tests"""
+    test_disabled_is_nearly_free()
+    test_spans_per_stage()
+    test_slow_requests_are_profiled()
+    test_profile_covers_only_the_request()
+    test_slow_request_arms_profiling()
+    test_writes_leave_the_request_thread()
+    test_sse_writes_are_traced()
+    test_calls_carry_request_ids()
+    print("✓ ALL TRACING TESTS PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
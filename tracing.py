@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Per-request tracing for the context servers
+Times each stage of a tool call, writes one JSON line per request to a trace
+file and profiles the synchronous stages of a sample of requests with cProfile,
+keeping the profiles of slow ones. Off (and close to free) unless CONTEXT_TRACE
+names a trace file
+"""
+
+import contextlib
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import queue
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from context_store import _env_number
+
+# JSON-lines trace file; unset or empty disables tracing
+TRACE_ENV = "CONTEXT_TRACE"
+
+# Requests slower than this are marked slow, and their profile (if sampled) is
+# kept (override with CONTEXT_TRACE_SLOW_MS)
+DEFAULT_SLOW_MS = 250.0
+
+# Fraction of requests run under cProfile (override with CONTEXT_TRACE_PROFILE_RATE,
+# 0 = never). Profiling slows a request down, so only a sample pays for it. A slow
+# request that was not sampled has the next request of the same name profiled
+DEFAULT_PROFILE_RATE = 0.1
+
+# Functions listed (by cumulative time) in a slow request's trace line
+PROFILE_TOP = 15
+
+_NULL = contextlib.nullcontext()
+_current: contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    """The spans recorded for one request"""
+    __slots__ = ("name", "attrs", "spans", "started", "wall", "profiler", "_profiling")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.spans: list[tuple] = []
+        self.started = time.perf_counter()
+        self.wall = time.time()
+        self.profiler: cProfile.Profile | None = None
+        self._profiling = 0
+
+    @contextlib.contextmanager
+    def span(self, name: str, profile: bool = True):
+        # The profiler only runs inside synchronous stages: across an await it
+        # would also record whatever else the event loop runs meanwhile
+        profiler = self.profiler if profile else None
+        if profiler is not None:
+            self._profiling += 1
+            if self._profiling == 1:
+                profiler.enable()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            ended = time.perf_counter()
+            if profiler is not None:
+                self._profiling -= 1
+                if self._profiling == 0:
+                    profiler.disable()
+            self.spans.append((name, started - self.started, ended - started))
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class Tracer:
+    """
+    Writes request traces to a JSON-lines file. Each line holds the request
+    name, start time, duration, attributes and its spans (stage, start offset and
+    duration in ms). Profiled requests over `slow_ms` also get a .prof file
+    (readable with pstats or snakeviz) and their top functions in the line; the
+    profile covers the request's synchronous spans only. Lines and profiles are
+    written by a background thread, never by the request (or event loop) itself.
+    """
+
+    def __init__(self, path: str | Path, slow_ms: float | None = None,
+                 profile_rate: float | None = None):
+        self.path = Path(path)
+        self.slow_ms = slow_ms if slow_ms is not None else \
+            _env_number("CONTEXT_TRACE_SLOW_MS", DEFAULT_SLOW_MS, float)
+        self.profile_rate = profile_rate if profile_rate is not None else \
+            _env_number("CONTEXT_TRACE_PROFILE_RATE", DEFAULT_PROFILE_RATE, float)
+        self.profile_dir = self.path.with_name(self.path.name + ".profiles")
+        self._lock = threading.Lock()
+        self._file = None
+        # (record, trace, profiler to save) items for the writer thread; None stops it
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._writer: threading.Thread | None = None
+        # One profiler at a time, so concurrent requests never share one
+        self._profiling = False
+        # Names of requests seen slow without a profile: the next one is profiled
+        self._armed: set[str] = set()
+
+    def _start_profile(self, name: str) -> cProfile.Profile | None:
+        if self.profile_rate <= 0:
+            return None
+        with self._lock:
+            if self._profiling:
+                return None
+            if name in self._armed:
+                self._armed.discard(name)
+            elif random.random() >= self.profile_rate:
+                return None
+            self._profiling = True
+        return cProfile.Profile()
+
+    @contextlib.contextmanager
+    def request(self, name: str, **attrs):
+        trace = Trace(name, attrs)
+        token = _current.set(trace)
+        trace.profiler = self._start_profile(name)
+        try:
+            yield trace
+        except BaseException as e:
+            trace.attrs.setdefault("status", "error")
+            trace.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            _current.reset(token)
+            self._finish(trace, time.perf_counter() - trace.started, trace.profiler)
+
+    def _finish(self, trace: Trace, duration: float, profiler: cProfile.Profile | None):
+        duration_ms = duration * 1000
+        record = {"ts": round(trace.wall, 6), "name": trace.name, "duration_ms": round(duration_ms, 3),
+                  **trace.attrs,
+                  "spans": [{"name": name, "start_ms": round(start * 1000, 3),
+                             "duration_ms": round(length * 1000, 3)}
+                            for name, start, length in trace.spans]}
+        if duration_ms >= self.slow_ms:
+            record["slow"] = True
+        if profiler is not None:
+            with self._lock:
+                self._profiling = False
+            if duration_ms < self.slow_ms:
+                profiler = None
+        elif duration_ms >= self.slow_ms and self.profile_rate > 0:
+            with self._lock:
+                self._armed.add(trace.name)
+        self._submit((record, trace, profiler))
+
+    def _save_profile(self, trace: Trace, profiler: cProfile.Profile) -> dict:
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        path = self.profile_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{trace.name}-" \
+                                  f"{int(trace.wall * 1e6) % 1_000_000:06d}.prof"
+        profiler.dump_stats(path)
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP]
+        return {"path": str(path),
+                "top": [{"function": f"{Path(file).name}:{line}({func})", "calls": calls,
+                         "self_ms": round(tottime * 1000, 3), "cumulative_ms": round(cumtime * 1000, 3)}
+                        for (file, line, func), (_, calls, tottime, cumtime, _) in top]}
+
+    def write(self, record: dict):
+        """Queue one line for the trace file"""
+        self._submit((record, None, None))
+
+    def _submit(self, item: tuple):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._drain, name="trace-writer", daemon=True)
+                self._writer.start()
+        self._queue.put(item)
+
+    def _drain(self):
+        while (item := self._queue.get()) is not None:
+            record, trace, profiler = item
+            if profiler is not None:
+                try:
+                    record["profile"] = self._save_profile(trace, profiler)
+                except OSError as e:
+                    record["profile"] = {"error": str(e)}
+            self._write_line(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+
+    def _write_line(self, line: str):
+        try:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+        except OSError as e:
+            # Tracing never fails a request
+            print(f"Could not write trace to {self.path}: {e}", file=sys.stderr)
+
+    def wrap_send(self, send, **attrs):
+        """
+        ASGI send that records the size and duration of each SSE event written.
+        Records carry the stream's session id (from its endpoint event) and the
+        JSON-RPC id of the response they carry, which the server also puts in
+        the tool call's trace line, so a write can be joined with its call.
+        """
+        attrs = dict(attrs)
+
+        async def traced_send(message):
+            if message.get("type") != "http.response.body" or not message.get("body"):
+                return await send(message)
+            started = time.perf_counter()
+            try:
+                return await send(message)
+            finally:
+                record = {"ts": round(time.time(), 6), "name": "sse_write", **attrs}
+                event, data = _sse_event(message["body"])
+                if event == "endpoint":
+                    session = parse_qs(urlsplit(data).query).get("session_id")
+                    if session:
+                        record["session"] = attrs["session"] = session[0]
+                elif event == "message":
+                    request_id = _response_id(data)
+                    if request_id is not None:
+                        record["request_id"] = request_id
+                record["bytes"] = len(message["body"])
+                record["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+                self.write(record)
+        return traced_send
+
+    def close(self):
+        """Write out everything queued so far, then close the trace file"""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(None)
+            writer.join()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _sse_event(body: bytes) -> tuple[str | None, str]:
+    """(event type, data) of one server-sent event"""
+    event, data = None, []
+    for line in body.decode("utf-8", "replace").splitlines():
+        if line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].removeprefix(" "))
+    return event, "\n".join(data)
+
+
+def _response_id(data: str):
+    try:
+        message = json.loads(data)
+    except ValueError:
+        return None
+    return message.get("id") if isinstance(message, dict) else None
+
+
+_tracer: Tracer | None = None
+
+
+def configure(path: str | Path | None = None, slow_ms: float | None = None,
+              profile_rate: float | None = None) -> Tracer | None:
+    """
+    (Re)configure tracing for this process: `path` defaults to $CONTEXT_TRACE,
+    and an empty path turns tracing off. Returns the active tracer, if any.
+    """
+    global _tracer
+    if path is None:
+        path = os.environ.get(TRACE_ENV, "")
+    old, _tracer = _tracer, (Tracer(path, slow_ms, profile_rate) if str(path) else None)
+    if old is not None:
+        old.close()
+    return _tracer
+
+
+def tracer() -> Tracer | None:
+    return _tracer
+
+
+def request(name: str, **attrs):
+    """Context manager tracing one request (yields its Trace, or None when tracing is off)"""
+    active = _tracer
+    if active is None:
+        return _NULL
+    return active.request(name, **attrs)
+
+
+def span(name: str, profile: bool = True):
+    """
+    Context manager timing one stage of the current request (a no-op outside one).
+    A stage that awaits passes profile=False, keeping the profiler off meanwhile.
+    """
+    trace = _current.get()
+    if trace is None:
+        return _NULL
+    return trace.span(name, profile)
+
+
+def wrap_send(send, **attrs):
+    """`send`, instrumented to trace response writes when tracing is on"""
+    active = _tracer
+    if active is None:
+        return send
+    return active.wrap_send(send, **attrs)
+
+
+configure()